@@ -0,0 +1,183 @@
+"""
+Awards achievements retroactively: evaluates every achievement rule for every
+user with set-based SQL, one user-id shard at a time, across a process pool.
+
+Each shard is written in one short write transaction together with its
+checkpoint row, so an interrupted run resumes where it stopped. The job key
+covers the rule set and shard size: adding or editing an achievement starts
+a fresh job automatically.
+"""
+import hashlib
+import json
+import multiprocessing
+import sqlite3
+import time
+from datetime import datetime
+
+from catalog_cache import load_catalog
+from xp_ledger import award_xp_bulk, achievement_key
+
+DEFAULT_SHARD_SIZE = 10000
+DEFAULT_WORKERS = 4
+BUSY_TIMEOUT_SECONDS = 60
+
+# Candidate queries: (user_id) rows in the shard [?, ?] that meet a rule,
+# followed by the rule's own parameters.
+COURSES_COMPLETED_CANDIDATES_SQL = """
+    SELECT user_id FROM UserProgress
+    WHERE user_id BETWEEN ? AND ? AND status = 'completed' AND course_id IN (SELECT value FROM json_each(?))
+    GROUP BY user_id
+    HAVING COUNT(*) = ?
+"""
+COURSE_COUNT_CANDIDATES_SQL = """
+    SELECT user_id FROM UserTrackSummary
+    WHERE user_id BETWEEN ? AND ?
+    GROUP BY user_id
+    HAVING SUM(completed_count) >= ?
+"""
+TRACK_COMPLETED_CANDIDATES_SQL = """
+    SELECT DISTINCT s.user_id FROM UserTrackSummary s
+    WHERE s.user_id BETWEEN ? AND ? AND s.completed_count > 0
+      AND s.completed_count >= (SELECT COUNT(*) FROM Courses c WHERE c.track_id = s.track_id)
+"""
+TRACK_PROGRESS_CANDIDATES_SQL = """
+    SELECT DISTINCT s.user_id FROM UserTrackSummary s
+    WHERE s.user_id BETWEEN ? AND ? AND s.completed_count >= ?
+      AND (SELECT COUNT(*) FROM Courses c WHERE c.track_id = s.track_id) >= ?
+"""
+QUIZ_SCORE_CANDIDATES_SQL = """
+    SELECT DISTINCT user_id FROM UserQuizAttempts
+    WHERE user_id BETWEEN ? AND ? AND completed_at IS NOT NULL AND max_score > 0
+      AND score * 100.0 / max_score >= ?
+"""
+FORUM_POST_CANDIDATES_SQL = """
+    SELECT user_id FROM ForumPosts
+    WHERE user_id BETWEEN ? AND ?
+    GROUP BY user_id
+    HAVING COUNT(*) >= ?
+"""
+
+INSERT_AWARDS_SQL = """
+    INSERT INTO UserAchievements (user_id, achievement_id, unlocked_at)
+    SELECT json_extract(value, '$[0]'), json_extract(value, '$[1]'), ? FROM json_each(?) WHERE true
+    ON CONFLICT (user_id, achievement_id) DO NOTHING
+    RETURNING user_id, achievement_id
+"""
+
+
+def candidate_query(rule):
+    """(sql, rule parameters) finding the users in a shard that meet the rule."""
+    criteria = rule.criteria
+    if rule.trigger == 'course_completed':
+        return COURSES_COMPLETED_CANDIDATES_SQL, (json.dumps(sorted(rule.course_ids)), len(rule.course_ids))
+    if rule.trigger == 'course_count':
+        return COURSE_COUNT_CANDIDATES_SQL, (criteria.get('min_completed', 1),)
+    if rule.trigger == 'track_completed':
+        return TRACK_COMPLETED_CANDIDATES_SQL, ()
+    if rule.trigger == 'track_progress':
+        return TRACK_PROGRESS_CANDIDATES_SQL, (criteria.get('min_completed', 1), criteria.get('min_track_courses', 0))
+    if rule.trigger == 'quiz_score':
+        return QUIZ_SCORE_CANDIDATES_SQL, (criteria.get('min_percentage', 100),)
+    if rule.trigger == 'forum_post':
+        return FORUM_POST_CANDIDATES_SQL, (criteria.get('min_posts', 1),)
+    return None, ()
+
+
+def job_key(rules, shard_size):
+    spec = json.dumps([(r.achievement_id, r.trigger, dict(r.criteria)) for r in rules], sort_keys=True)
+    return f"award-backfill:{hashlib.sha1(spec.encode()).hexdigest()[:12]}:{shard_size}"
+
+
+def connect(db_path):
+    conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT_SECONDS, isolation_level=None)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    return conn
+
+
+def backfill_shard(conn, rules, job, shard_start, shard_end):
+    """
+    Evaluates every rule for the users in [shard_start, shard_end] and writes
+    the new awards, their XP and the shard's checkpoint in one transaction.
+    Returns the number of achievements awarded.
+    """
+    # Read phase: no write lock held, so shards evaluate in parallel.
+    candidates = []
+    for rule in rules:
+        sql, params = candidate_query(rule)
+        if sql is None:
+            continue
+        for (user_id,) in conn.execute(sql, (shard_start, shard_end) + params):
+            candidates.append((user_id, rule.achievement_id))
+
+    xp_bonus = {rule.achievement_id: rule.xp_bonus for rule in rules}
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        awarded = []
+        if candidates:
+            awarded = conn.execute(INSERT_AWARDS_SQL, (datetime.utcnow(), json.dumps(candidates))).fetchall()
+        award_xp_bulk(conn, [
+            (user_id, xp_bonus[achievement_id], 'achievement', achievement_id, achievement_key(user_id, achievement_id))
+            for user_id, achievement_id in awarded if xp_bonus[achievement_id]
+        ])
+        conn.execute(
+            "INSERT INTO BackfillCheckpoints (job, shard_start, shard_end, awards) VALUES (?, ?, ?, ?)",
+            (job, shard_start, shard_end, len(awarded))
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return len(awarded)
+
+
+# --- Process pool plumbing: one connection and one catalog per worker ---
+_worker = {}
+
+
+def _init_worker(db_path, job):
+    conn = connect(db_path)
+    _worker.update(conn=conn, rules=load_catalog(conn).achievements.rules, job=job)
+
+
+def _run_shard(shard):
+    shard_start, shard_end = shard
+    return shard_start, shard_end, backfill_shard(_worker['conn'], _worker['rules'], _worker['job'], shard_start, shard_end)
+
+
+def run_backfill(db_path, workers=DEFAULT_WORKERS, shard_size=DEFAULT_SHARD_SIZE, restart=False, log=print):
+    """
+    Runs (or resumes) the backfill. Returns a dict with users, shards,
+    awards and seconds for this run.
+    """
+    conn = connect(db_path)
+    rules = load_catalog(conn).achievements.rules
+    job = job_key(rules, shard_size)
+    if restart:
+        conn.execute("DELETE FROM BackfillCheckpoints WHERE job = ?", (job,))
+    low, high = conn.execute("SELECT MIN(user_id), MAX(user_id) FROM Users").fetchone()
+    done = {row[0] for row in conn.execute("SELECT shard_start FROM BackfillCheckpoints WHERE job = ?", (job,))}
+    conn.close()
+
+    result = {'job': job, 'users': 0, 'shards': 0, 'skipped': 0, 'awards': 0, 'seconds': 0.0}
+    if low is None or not rules:
+        log("Nothing to backfill (no users or no achievement rules).")
+        return result
+    shards = [(start, min(start + shard_size - 1, high)) for start in range(low, high + 1, shard_size)]
+    pending = [shard for shard in shards if shard[0] not in done]
+    result['skipped'] = len(shards) - len(pending)
+    if result['skipped']:
+        log(f"Resuming {job}: {result['skipped']} of {len(shards)} shard(s) already done.")
+
+    started = time.perf_counter()
+    with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(db_path, job)) as pool:
+        for shard_start, shard_end, awards in pool.imap_unordered(_run_shard, pending):
+            result['shards'] += 1
+            result['awards'] += awards
+            result['users'] += shard_end - shard_start + 1
+            if result['shards'] % max(1, len(pending) // 10) == 0:
+                elapsed = time.perf_counter() - started
+                log(f"  {result['shards']}/{len(pending)} shards, {result['awards']} awards, "
+                    f"{result['users'] / elapsed:,.0f} users/s")
+    result['seconds'] = time.perf_counter() - started
+    return result
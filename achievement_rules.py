@@ -0,0 +1,175 @@
+import json
+from collections import namedtuple
+from datetime import datetime
+from types import MappingProxyType
+
+from xp_ledger import award_xp_batch, achievement_key
+
+# Which rule triggers each app event can satisfy. Only the rules whose
+# trigger belongs to the event are evaluated.
+EVENT_TRIGGERS = {
+    'course_completed': ('course_completed', 'course_count', 'track_completed', 'track_progress'),
+    'quiz_submitted': ('quiz_score',),
+    'forum_post': ('forum_post',),
+}
+
+# Achievements.rule is a JSON object whose keys depend on trigger_event:
+#   course_completed  {"courses": [course names]}       all listed courses completed
+#   course_count      {"min_completed": n}              n courses completed anywhere
+#   track_completed   {}                                every course of the event's track completed
+#   track_progress    {"min_completed": n, "min_track_courses": m}
+#                                                       n courses of the event's track (of at least m) completed
+#   quiz_score        {"min_percentage": p}             the submitted quiz scored at least p%
+#   forum_post        {"min_posts": n}                  n forum posts written
+AchievementRule = namedtuple('AchievementRule', ['achievement_id', 'name', 'xp_bonus', 'trigger', 'criteria', 'course_ids'])
+
+# Everything any rule needs about a user, in one statement; course counts come
+# from UserTrackSummary (track_summary.py). Parameters:
+# user_id, user_id, track_id, user_id, JSON list of course ids, user_id, user_id.
+USER_STATS_SQL = """
+    SELECT
+        (SELECT COALESCE(SUM(completed_count), 0) FROM UserTrackSummary WHERE user_id = ?) AS completed_courses,
+        (SELECT COALESCE(MAX(completed_count), 0) FROM UserTrackSummary WHERE user_id = ? AND track_id = ?) AS completed_in_track,
+        (SELECT json_group_array(course_id) FROM UserProgress
+          WHERE user_id = ? AND status = 'completed' AND course_id IN (SELECT value FROM json_each(?))) AS completed_listed,
+        (SELECT json_group_array(achievement_id) FROM UserAchievements WHERE user_id = ?) AS owned,
+        (SELECT COUNT(*) FROM ForumPosts WHERE user_id = ?) AS forum_posts
+"""
+
+
+def parse_rule(row, course_ids_by_name):
+    """Builds an AchievementRule from an Achievements row, or None if it has no usable rule."""
+    achievement_id, name, xp_bonus, trigger, rule_json = row
+    if not trigger:
+        return None
+    try:
+        criteria = json.loads(rule_json or '{}')
+    except ValueError:
+        print(f"Warning: achievement '{name}' has an invalid rule ({rule_json!r}); ignoring it.")
+        return None
+    course_ids = []
+    for course_name in criteria.get('courses', ()):
+        if course_name not in course_ids_by_name:
+            print(f"Warning: achievement '{name}' refers to unknown course '{course_name}'; ignoring it.")
+            return None
+        course_ids.append(course_ids_by_name[course_name])
+    return AchievementRule(achievement_id, name, xp_bonus or 0, trigger, MappingProxyType(criteria), frozenset(course_ids))
+
+
+class AchievementRules:
+    """
+    Achievement rules indexed by event. course_completed rules are further
+    indexed by the courses they mention, so completing a course only looks
+    at the rules that name it.
+    """
+
+    def __init__(self, rules):
+        self.rules = tuple(rules)
+        by_trigger = {}
+        by_course = {}
+        for rule in self.rules:
+            if rule.trigger == 'course_completed':
+                for course_id in rule.course_ids:
+                    by_course.setdefault(course_id, []).append(rule)
+            else:
+                by_trigger.setdefault(rule.trigger, []).append(rule)
+        self.by_trigger = MappingProxyType({k: tuple(v) for k, v in by_trigger.items()})
+        self.by_course = MappingProxyType({k: tuple(v) for k, v in by_course.items()})
+
+    def rules_for(self, event, course_id=None):
+        """The rules an event can satisfy."""
+        rules = []
+        for trigger in EVENT_TRIGGERS.get(event, ()):
+            if trigger == 'course_completed':
+                rules.extend(self.by_course.get(course_id, ()))
+            else:
+                rules.extend(self.by_trigger.get(trigger, ()))
+        return rules
+
+
+def load_user_stats(db, user_id, track_id=None, course_ids=()):
+    row = db.execute(
+        USER_STATS_SQL,
+        (user_id, user_id, track_id, user_id, json.dumps(sorted(course_ids)), user_id, user_id)
+    ).fetchone()
+    return {
+        'completed_courses': row[0],
+        'completed_in_track': row[1],
+        'completed_listed': set(json.loads(row[2])),
+        'owned': set(json.loads(row[3])),
+        'forum_posts': row[4],
+    }
+
+
+def rule_met(rule, stats):
+    """
+    stats is load_user_stats() output plus 'track_courses' (size of the
+    event's track) and 'quiz_percentage' (for quiz events).
+    """
+    criteria = rule.criteria
+    if rule.trigger == 'course_completed':
+        return rule.course_ids <= stats['completed_listed']
+    if rule.trigger == 'course_count':
+        return stats['completed_courses'] >= criteria.get('min_completed', 1)
+    if rule.trigger == 'track_completed':
+        return stats['track_courses'] > 0 and stats['completed_in_track'] >= stats['track_courses']
+    if rule.trigger == 'track_progress':
+        return (stats['track_courses'] >= criteria.get('min_track_courses', 0)
+                and stats['completed_in_track'] >= criteria.get('min_completed', 1))
+    if rule.trigger == 'quiz_score':
+        return stats.get('quiz_percentage') is not None and stats['quiz_percentage'] >= criteria.get('min_percentage', 100)
+    if rule.trigger == 'forum_post':
+        return stats['forum_posts'] >= criteria.get('min_posts', 1)
+    return False
+
+
+def earned_rules(rules, stats):
+    """Rules the user meets and does not own yet."""
+    return [rule for rule in rules if rule.achievement_id not in stats['owned'] and rule_met(rule, stats)]
+
+
+def award_achievements(db, user_id, rules):
+    """
+    Writes the given awards in one batch: one INSERT for the UserAchievements
+    rows and one XP ledger batch for their bonuses. Achievements the user
+    already has are skipped. Returns (awarded rules, new xp_points or None).
+    Does not commit.
+    """
+    if not rules:
+        return [], None
+    inserted = db.execute(
+        """INSERT INTO UserAchievements (user_id, achievement_id, unlocked_at)
+           SELECT ?, value, ? FROM json_each(?) WHERE true
+           ON CONFLICT (user_id, achievement_id) DO NOTHING
+           RETURNING achievement_id""",
+        (user_id, datetime.utcnow(), json.dumps([rule.achievement_id for rule in rules]))
+    ).fetchall()
+    inserted_ids = {row[0] for row in inserted}
+    awarded = [rule for rule in rules if rule.achievement_id in inserted_ids]
+    new_xp = award_xp_batch(db, user_id, [
+        (rule.xp_bonus, 'achievement', rule.achievement_id, achievement_key(user_id, rule.achievement_id))
+        for rule in awarded if rule.xp_bonus
+    ])
+    return awarded, new_xp
+
+
+def evaluate_event(db, catalog, user_id, event, course_id=None, quiz_percentage=None):
+    """
+    Evaluates the rules an event can satisfy and awards the ones the user now
+    meets: one stats query and one batched write, and nothing at all if no
+    rule listens to the event. Returns (awarded rules, new xp_points or None).
+    Does not commit.
+    """
+    rules = catalog.achievements.rules_for(event, course_id)
+    if not rules:
+        return [], None
+    course = catalog.courses_by_id.get(course_id)
+    track_id = course.track_id if course else None
+    course_ids = set()
+    for rule in rules:
+        course_ids.update(rule.course_ids)
+
+    stats = load_user_stats(db, user_id, track_id, course_ids)
+    stats['track_courses'] = len(catalog.courses_for_track(track_id))
+    stats['quiz_percentage'] = quiz_percentage
+    return award_achievements(db, user_id, earned_rules(rules, stats))
@@ -1,33 +1,274 @@
 import sqlite3
-from flask import Flask, render_template, request, redirect, url_for, session, g, flash
+import click
+from flask import Flask, render_template, request, redirect, url_for, session, g, flash, abort, jsonify, Response
 from werkzeug.security import generate_password_hash, check_password_hash
 import os
+import json
+import atexit
+import threading
 from datetime import datetime
 
+from db_pool import ConnectionPool, READ_LANE, WRITE_LANE
+from update_schema import migrate, current_version, MIGRATIONS
+from catalog_cache import CatalogCache, DEFAULT_CHECK_INTERVAL
+from quiz_cache import QuizCache
+from sql_profiler import ProfiledConnection, ProfileStore, QueryProfile, read_profile_log, format_profile
+from achievement_rules import evaluate_event
+from achievement_backfill import run_backfill, DEFAULT_SHARD_SIZE, DEFAULT_WORKERS as DEFAULT_BACKFILL_WORKERS
+from xp_ledger import reconcile, compact, DEFAULT_COMPACT_AFTER_DAYS
+from course_events import completed_course_ids, unlock_courses, publish_course_completed, COURSE_COMPLETION_XP, HANDLERS as EVENT_HANDLERS
+from dashboard_summary import DashboardCache, bump_dashboard_version, next_course, DEFAULT_CACHE_SIZE as DEFAULT_DASHBOARD_CACHE_SIZE, DEFAULT_RANK_TTL
+from track_summary import load_user_summaries, reconcile as reconcile_track_summaries, rebuild as rebuild_track_summaries
+from leaderboard import Leaderboard, load_standings, DEFAULT_SYNC_INTERVAL as DEFAULT_LEADERBOARD_SYNC_INTERVAL, DEFAULT_SEED_RETRY_SECONDS as DEFAULT_LEADERBOARD_SEED_RETRY_SECONDS
+from xp_windows import WINDOW_LABELS, stale_windows, roll_windows, load_window_standings
+from scope_leaderboard import load_page as load_scope_page, load_rank as load_scope_rank, RANK_LIMIT as SCOPE_RANK_LIMIT
+from forum_pages import encode_cursor as encode_forum_cursor, load_posts_page, load_threads_page
+from forum_search import search as search_forum, rebuild as rebuild_forum_search, optimize as optimize_forum_search, document_counts as forum_search_counts
+from forum_live import ForumHub, replay as replay_forum_posts, stream as stream_forum_posts, DEFAULT_MAX_SUBSCRIBERS as DEFAULT_FORUM_LIVE_MAX_SUBSCRIBERS, DEFAULT_POLL_SECONDS as DEFAULT_FORUM_LIVE_POLL_SECONDS, DEFAULT_HEARTBEAT_SECONDS as DEFAULT_FORUM_LIVE_HEARTBEAT_SECONDS
+from forum_markdown import render as render_markdown, post_html, has_stale_posts, rerender as rerender_forum_posts, start_rerender as start_forum_rerender, RENDERER_VERSION, DEFAULT_BATCH_SIZE as DEFAULT_RERENDER_BATCH_SIZE
+from forum_unread import unread_counts, category_unread, unread_threads, last_read, mark_thread_read, mark_category_read, UNREAD_LIMIT
+from forum_stats import CATEGORIES_SQL, backfill as backfill_forum_stats, find_drift as find_forum_drift, DEFAULT_BATCH_SIZE as DEFAULT_FORUM_BATCH_SIZE
+from view_counter import ViewCounter, DEFAULT_FLUSH_SECONDS as DEFAULT_VIEW_FLUSH_SECONDS
+from event_outbox import OutboxWorker, process_pending, outbox_status, requeue_dead, prune as prune_outbox, DEFAULT_PRUNE_AFTER_DAYS
+
 # Configuration
 DATABASE = 'kodefun.db'
-kodefun-initial-build
 # TODO: For production, use a fixed, strong SECRET_KEY set as an environment variable.
-main
 SECRET_KEY = os.urandom(24) # In a real app, use a fixed, secure key. For development, this is fine.
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = SECRET_KEY
 app.config['DATABASE'] = DATABASE # For convenience if we need app.config['DATABASE'] later
+# Per-request SQL profiling (statement counts, DB time, N+1 detection). See sql_profiler.py for thresholds.
+app.config['SQL_PROFILING'] = True
+app.config['SQL_PROFILE_LOG'] = os.environ.get('KODEFUN_SQL_PROFILE_LOG') # JSON-lines file read by `flask sql-profiles`
+app.config['CATALOG_CHECK_INTERVAL'] = DEFAULT_CHECK_INTERVAL # Seconds between CatalogVersion checks
+# Who runs the outbox event handlers (event_outbox.py): 'thread' (a worker thread in this process),
+# 'process' (a separate `flask outbox-worker`) or 'inline' (the request itself, right after its commit).
+app.config['EVENT_DELIVERY'] = os.environ.get('KODEFUN_EVENT_DELIVERY', 'thread')
+app.config['DASHBOARD_CACHE_SIZE'] = DEFAULT_DASHBOARD_CACHE_SIZE # Users whose dashboard summary is cached per process
+app.config['DASHBOARD_RANK_TTL'] = DEFAULT_RANK_TTL # Seconds a cached leaderboard rank may be stale
+app.config['LEADERBOARD_IN_MEMORY'] = True # False serves every leaderboard query from SQL
+app.config['LEADERBOARD_SYNC_INTERVAL'] = DEFAULT_LEADERBOARD_SYNC_INTERVAL # Seconds between XpLedger catch-ups
+app.config['LEADERBOARD_SEED_RETRY_SECONDS'] = DEFAULT_LEADERBOARD_SEED_RETRY_SECONDS # Backoff after a failed seed
+# Live forum streams (forum_live.py): open streams per process, seconds between polls for
+# other processes' posts, seconds between heartbeats on an idle stream.
+app.config['FORUM_LIVE_MAX_SUBSCRIBERS'] = DEFAULT_FORUM_LIVE_MAX_SUBSCRIBERS
+app.config['FORUM_LIVE_POLL_SECONDS'] = DEFAULT_FORUM_LIVE_POLL_SECONDS
+app.config['FORUM_LIVE_HEARTBEAT_SECONDS'] = DEFAULT_FORUM_LIVE_HEARTBEAT_SECONDS
+# Thread and course page views are buffered in memory and written this often (view_counter.py)
+app.config['VIEW_FLUSH_SECONDS'] = DEFAULT_VIEW_FLUSH_SECONDS
 
 # --- Database Helper Functions ---
+def get_db_pool():
+    """Returns the process-wide connection pool, creating it on first use."""
+    pool = app.extensions.get('db_pool')
+    if pool is None or pool.database != app.config['DATABASE']:
+        if pool is not None:
+            counter = app.extensions.pop('view_counter', None) # Buffered views go to the old database first
+            if counter is not None:
+                counter.stop(timeout=5)
+            pool.close_all()
+            app.extensions.pop('catalog_cache', None) # Cached catalog belongs to the old database
+            app.extensions.pop('quiz_cache', None)
+            app.extensions.pop('dashboard_cache', None)
+            app.extensions.pop('leaderboard', None)
+            worker = app.extensions.pop('outbox_worker', None) # So does the worker's connection
+            if worker is not None:
+                worker.stop(timeout=5)
+            hub = app.extensions.pop('forum_hub', None)
+            if hub is not None:
+                hub.stop(timeout=5)
+            app.extensions.pop('forum_rerender', None)
+        factory = ProfiledConnection if app.config.get('SQL_PROFILING') else sqlite3.Connection
+        pool = app.extensions['db_pool'] = ConnectionPool.from_config(app.config, factory=factory)
+    return pool
+
+def _catalog_cache():
+    cache = app.extensions.get('catalog_cache')
+    if cache is None:
+        cache = app.extensions['catalog_cache'] = CatalogCache(app.config['CATALOG_CHECK_INTERVAL'])
+    return cache
+
+def get_catalog():
+    """Cached snapshot of LearningPaths/Tracks/Courses/Assessments and the achievement rules (see catalog_cache.py)."""
+    return _catalog_cache().get(get_read_db)
+
+def get_catalog_for(conn):
+    """get_catalog() for code running outside a request, on its own connection."""
+    return _catalog_cache().get(lambda: conn)
+
+def get_quiz(assessment):
+    """The compiled quiz of a catalog Assessment (see quiz_cache.py): no statement unless its quiz_version moved."""
+    cache = app.extensions.get('quiz_cache')
+    if cache is None:
+        cache = app.extensions['quiz_cache'] = QuizCache()
+    return cache.get(assessment, get_read_db)
+
+def get_dashboard_cache():
+    """Per-user dashboard summaries, invalidated through Users.dashboard_version (see dashboard_summary.py)."""
+    cache = app.extensions.get('dashboard_cache')
+    if cache is None:
+        cache = app.extensions['dashboard_cache'] = DashboardCache(app.config['DASHBOARD_CACHE_SIZE'], app.config['DASHBOARD_RANK_TTL'])
+    return cache
+
+def get_leaderboard():
+    """
+    The process's in-memory XP standings (see leaderboard.py), seeded on a
+    background thread on first use. Not ready until then: load_standings()
+    falls back to SQL. A failed seed is retried on the same board after
+    LEADERBOARD_SEED_RETRY_SECONDS. None when LEADERBOARD_IN_MEMORY is off.
+    """
+    if not app.config.get('LEADERBOARD_IN_MEMORY'):
+        return None
+    board = app.extensions.get('leaderboard')
+    if board is None:
+        board = app.extensions.setdefault('leaderboard', Leaderboard(app.config['LEADERBOARD_SYNC_INTERVAL']))
+    elif not board.seed_due(app.config['LEADERBOARD_SEED_RETRY_SECONDS']):
+        return board # Ready, seeding, or backing off after a failed seed (SQL answers meanwhile)
+    pool = get_db_pool()
+    return board.start_seeding(lambda: pool.acquire(READ_LANE), lambda conn: pool.release(conn, READ_LANE))
+
+def get_outbox_worker():
+    """The process's outbox worker thread, started on first use (and again in a forked child)."""
+    worker = app.extensions.get('outbox_worker')
+    if worker is None or not worker.is_alive():
+        worker = app.extensions['outbox_worker'] = OutboxWorker(
+            lambda: get_db_pool().acquire(WRITE_LANE), get_catalog_for, EVENT_HANDLERS
+        ).start()
+    return worker
+
+_forum_hub_lock = threading.Lock()
+
+def get_forum_hub():
+    """The process's live forum pub/sub (see forum_live.py), started on first use (and again in a forked child)."""
+    hub = app.extensions.get('forum_hub')
+    if hub is None or not hub.is_alive():
+        with _forum_hub_lock: # Streams opening at once must share one hub, or some would subscribe to a discarded one
+            hub = app.extensions.get('forum_hub')
+            if hub is None or not hub.is_alive():
+                pool = get_db_pool()
+                hub = app.extensions['forum_hub'] = ForumHub(
+                    lambda: pool.acquire(READ_LANE), app.config['FORUM_LIVE_MAX_SUBSCRIBERS'], app.config['FORUM_LIVE_POLL_SECONDS']
+                ).start()
+    return hub
+
+def wake_forum_hub():
+    """Call after committing a post: streams in this process get it without waiting for the next poll."""
+    hub = app.extensions.get('forum_hub')
+    if hub is not None:
+        hub.wake()
+
+_view_counter_lock = threading.Lock()
+
+def get_view_counter():
+    """The process's buffered thread/course view counts (see view_counter.py), flushed by a thread started on first use."""
+    counter = app.extensions.get('view_counter')
+    if counter is None or not counter.is_alive():
+        with _view_counter_lock:
+            counter = app.extensions.get('view_counter')
+            if counter is None or not counter.is_alive():
+                pool = get_db_pool() # Bound here, so a final flush after DATABASE changes still goes to this database
+                counter = app.extensions['view_counter'] = ViewCounter(
+                    lambda: pool.acquire(WRITE_LANE), app.config['VIEW_FLUSH_SECONDS']
+                ).start()
+                atexit.register(counter.stop, 5) # What is still buffered at shutdown is written too
+    return counter
+
+def deliver_events(db):
+    """Call after committing outbox events: hands them to whoever runs the handlers."""
+    delivery = app.config.get('EVENT_DELIVERY')
+    if delivery == 'inline':
+        process_pending(db, get_catalog, EVENT_HANDLERS)
+    elif delivery == 'thread':
+        get_outbox_worker().wake()
+
+def get_profile_store():
+    store = app.extensions.get('sql_profiles')
+    if store is None:
+        store = app.extensions['sql_profiles'] = ProfileStore.from_config(app.config, app.logger)
+    return store
+
+def _attach_profile(db):
+    if isinstance(db, ProfiledConnection):
+        db.profile = g.get('_sql_profile')
+    return db
+
 def get_db():
+    """Write-lane connection for the current request (also fine for reads that must see its own writes)."""
     db = getattr(g, '_database', None)
     if db is None:
-        db = g._database = sqlite3.connect(app.config['DATABASE'])
-        db.row_factory = sqlite3.Row # Access columns by name
+        db = g._database = _attach_profile(get_db_pool().acquire(WRITE_LANE))
     return db
 
+def get_read_db():
+    """Read-only connection for routes that never write; does not wait on the writer under WAL."""
+    db = getattr(g, '_read_database', None)
+    if db is None:
+        db = g._read_database = _attach_profile(get_db_pool().acquire(READ_LANE))
+    return db
+
+@app.before_request
+def ensure_schema_current():
+    # Once per database: the routes need every migration, so an old schema fails fast instead of mid-request
+    if app.extensions.get('schema_checked') == app.config['DATABASE']:
+        return None
+    try:
+        version = current_version(get_read_db())
+    except sqlite3.OperationalError: # No schema_version table: a database from before the migrations
+        version = 0
+    latest = MIGRATIONS[-1].version
+    if version < latest:
+        message = (f"Database schema is at version {version}, this app needs {latest}. "
+                   f"Run `python update_schema.py` (or `flask migrate-db`) and retry.")
+        if app.extensions.get('schema_warned') != (app.config['DATABASE'], version): # Logged once, not per request
+            app.extensions['schema_warned'] = (app.config['DATABASE'], version)
+            app.logger.error(message)
+        return Response(message + "\n", status=503, mimetype='text/plain')
+    app.extensions['schema_checked'] = app.config['DATABASE']
+    return None
+
+@app.before_request
+def start_sql_profile():
+    if app.config.get('SQL_PROFILING'):
+        g._sql_profile = QueryProfile(request.method, request.path, request.endpoint)
+
+@app.before_request
+def ensure_forum_rendered():
+    # Once per process: posts from before migration 0017 or an older renderer are re-rendered in the background
+    if 'forum_rerender' not in app.extensions:
+        app.extensions['forum_rerender'] = None
+        if has_stale_posts(get_read_db()):
+            pool = get_db_pool()
+            app.extensions['forum_rerender'] = start_forum_rerender(
+                lambda: pool.acquire(WRITE_LANE), lambda conn: pool.release(conn, WRITE_LANE)
+            )
+
+@app.before_request
+def ensure_outbox_worker():
+    # Events left pending by a previous run are picked up without waiting for a new one
+    if app.config.get('EVENT_DELIVERY') == 'thread':
+        get_outbox_worker()
+
+@app.before_request
+def ensure_leaderboard():
+    get_leaderboard() # Starts seeding with the first request, so the board is warm by the first leaderboard view
+
+@app.teardown_request
+def finish_sql_profile(exception):
+    profile = g.pop('_sql_profile', None)
+    if profile is not None:
+        get_profile_store().add(profile)
+
 @app.teardown_appcontext
 def close_connection(exception):
-    db = getattr(g, '_database', None)
-    if db is not None:
-        db.close()
+    pool = get_db_pool()
+    for attr, lane in (('_database', WRITE_LANE), ('_read_database', READ_LANE)):
+        db = g.pop(attr, None)
+        if db is not None:
+            if isinstance(db, ProfiledConnection):
+                db.profile = None
+            pool.release(db, lane)
 
 def init_db(force_recreate=False):
     """Initializes the database using schema.sql."""
@@ -35,8 +276,12 @@ def init_db(force_recreate=False):
     db_exists = os.path.exists(db_path)
 
     if force_recreate and db_exists:
+        get_db_pool().close_all() # Pooled connections must not outlive the file they point at
         try:
             os.remove(db_path)
+            for suffix in ('-wal', '-shm'): # WAL side files would otherwise be replayed into the new DB
+                if os.path.exists(db_path + suffix):
+                    os.remove(db_path + suffix)
             print(f"Removed existing database {db_path}.")
             db_exists = False
         except OSError as e:
@@ -50,12 +295,16 @@ def init_db(force_recreate=False):
                 with app.open_resource('schema.sql', mode='r') as f:
                     db.cursor().executescript(f.read())
                 db.commit()
+                migrate(db, verbose=False) # Indexes and later changes live in the numbered migrations
                 print(f"Initialized the database {db_path} from schema.sql.")
         except Exception as e:
             print(f"Error initializing database: {e}")
             # Potentially re-raise or handle more gracefully
     else:
-        print(f"Database {db_path} already exists. Skipping initialization.")
+        with app.app_context():
+            applied = migrate(get_db(), verbose=False) # An existing database gets any migrations it is missing
+        print(f"Database {db_path} already exists. Skipping initialization"
+              + (f"; applied {len(applied)} pending migration(s)." if applied else "."))
 
 # --- Routes ---
 @app.route('/')
@@ -144,9 +393,31 @@ def dashboard():
     if 'user_id' not in session:
         flash('Please log in to access the dashboard.', 'info')
         return redirect(url_for('login'))
-    # Fetch fresh user data if needed, or use session data
-    # For now, session data is fine for username and xp_points
-    return render_template('dashboard.html')
+    user_id = session['user_id']
+    cached = get_dashboard_cache().get(get_read_db(), user_id)
+    if cached is None:
+        session.clear()
+        flash('Your account could not be found. Please log in again.', 'warning')
+        return redirect(url_for('login'))
+    xp_points, summary = cached
+    session['xp_points'] = xp_points # XP also changes outside this session (outbox worker)
+    rank = summary['rank']
+    board = get_leaderboard()
+    if board is not None and board.ready:
+        board.sync(get_read_db())
+        rank = board.rank(user_id) or rank # Live rank; the cached one may be rank_ttl old
+
+    # Tracks the user has started, most recently active first
+    catalog = get_catalog()
+    track_progress = [
+        {'track': catalog.tracks_by_id[s['track_id']], 'summary': s, 'course_count': len(catalog.courses_for_track(s['track_id']))}
+        for s in sorted(summary['tracks'], key=lambda s: s['last_activity_at'] or '', reverse=True)
+        if s['track_id'] in catalog.tracks_by_id
+    ]
+    return render_template(
+        'dashboard.html', track_progress=track_progress, rank=rank,
+        recent_achievements=summary['achievements'], next_course=next_course(catalog, summary)
+    )
 
 @app.route('/logout')
 def logout():
@@ -162,8 +433,7 @@ def learning_paths():
         flash('Please log in to view learning paths.', 'info')
         return redirect(url_for('login'))
     
-    db = get_db()
-    paths = db.execute('SELECT path_id, path_name, path_description FROM LearningPaths').fetchall()
+    paths = get_catalog().paths
     return render_template('learning_paths.html', paths=paths)
 
 @app.route('/learning_paths/<int:path_id>/tracks')
@@ -172,16 +442,66 @@ def learning_path_tracks(path_id):
         flash('Please log in to view tracks.', 'info')
         return redirect(url_for('login'))
 
-    db = get_db()
-    current_path = db.execute('SELECT path_id, path_name FROM LearningPaths WHERE path_id = ?', (path_id,)).fetchone()
+    catalog = get_catalog()
+    current_path = catalog.paths_by_id.get(path_id)
     if not current_path:
         flash('Learning path not found.', 'danger')
         return redirect(url_for('learning_paths'))
         
-    tracks = db.execute(
-        'SELECT track_id, track_name, track_description, total_duration_weeks FROM Tracks WHERE path_id = ? ORDER BY track_name', (path_id,)
-    ).fetchall()
-    return render_template('tracks.html', current_path=current_path, tracks=tracks)
+    tracks = catalog.tracks_for_path(path_id) # Ordered by track_name
+    summaries = load_user_summaries(get_read_db(), session['user_id'])
+    course_counts = {track.track_id: len(catalog.courses_for_track(track.track_id)) for track in tracks}
+    return render_template('tracks.html', current_path=current_path, tracks=tracks, summaries=summaries, course_counts=course_counts)
+
+@app.route('/learning_paths/<int:path_id>/leaderboard')
+def learning_path_leaderboard(path_id):
+    if 'user_id' not in session:
+        flash('Please log in to view the leaderboard.', 'info')
+        return redirect(url_for('login'))
+
+    current_path = get_catalog().paths_by_id.get(path_id)
+    if not current_path:
+        flash('Learning path not found.', 'danger')
+        return redirect(url_for('learning_paths'))
+    return render_scope_leaderboard('path', path_id, current_path.path_name, url_for('learning_path_tracks', path_id=path_id))
+
+def render_scope_leaderboard(scope, scope_id, title, back_url):
+    """Shared body of the per-track and per-path leaderboards (see scope_leaderboard.py)."""
+    db = get_read_db()
+    page = load_scope_page(db, scope, scope_id, request.args.get('after'))
+    mine = load_scope_rank(db, scope, scope_id, session['user_id'])
+    return render_template('scope_leaderboard.html', title=title, entries=page['entries'], next_cursor=page['next'],
+                           mine=mine, rank_limit=SCOPE_RANK_LIMIT, back_url=back_url)
+
+TRACK_PROGRESS_SQL = """
+    SELECT up.course_id, up.progress_id, up.status, up.total_score
+    FROM UserProgress up
+    JOIN Courses c ON up.course_id = c.course_id
+    WHERE up.user_id = ? AND c.track_id = ?
+"""
+
+def initialize_track_progress(db, user_id, track_id, catalog):
+    """
+    Creates the missing UserProgress rows for every course in a track in one
+    INSERT ... SELECT, all 'locked', then unlocks the courses whose
+    prerequisites are met (normally just the first one; a course with
+    cross-track prerequisites stays locked until those are completed).
+    Safe against concurrent requests thanks to the UNIQUE (user_id, course_id)
+    index. Does not commit.
+    """
+    db.execute("""
+        INSERT INTO UserProgress
+            (user_id, course_id, status, current_score_theory, current_score_practice, current_score_project, current_score_live_coding, total_score, attempts)
+        SELECT ?, c.course_id, 'locked', 0, 0, 0, 0, 0, 0
+        FROM Courses c
+        WHERE c.track_id = ?
+          AND NOT EXISTS (SELECT 1 FROM UserProgress up WHERE up.user_id = ? AND up.course_id = c.course_id)
+        ON CONFLICT (user_id, course_id) DO NOTHING
+    """, (user_id, track_id, user_id))
+    graph = catalog.prerequisites
+    course_ids = [c.course_id for c in catalog.courses_for_track(track_id)]
+    completed = completed_course_ids(db, user_id, graph.external_prerequisites(course_ids))
+    unlock_courses(db, user_id, graph.unlockable(course_ids, completed))
 
 @app.route('/tracks/<int:track_id>/courses')
 def track_courses(track_id):
@@ -189,58 +509,107 @@ def track_courses(track_id):
         flash('Please log in to view courses.', 'info')
         return redirect(url_for('login'))
 
-    db = get_db()
-    current_track = db.execute('SELECT track_id, track_name, path_id FROM Tracks WHERE track_id = ?', (track_id,)).fetchone()
+    catalog = get_catalog()
+    current_track = catalog.tracks_by_id.get(track_id)
     if not current_track:
         flash('Track not found.', 'danger')
         return redirect(url_for('learning_paths'))
 
     user_id = session['user_id']
     db = get_db()
+    track_courses_list = catalog.courses_for_track(track_id) # Ordered by order_in_track
 
-    # Fetch all courses for the track
-    track_courses_list = db.execute(
-        'SELECT course_id, course_name, course_level_number, duration_days, order_in_track FROM Courses WHERE track_id = ? ORDER BY order_in_track', (track_id,)
-    ).fetchall()
+    # Map course_id -> progress for easier lookup in the template
+    progress_map = {row['course_id']: row for row in db.execute(TRACK_PROGRESS_SQL, (user_id, track_id)).fetchall()}
 
-    # Initialize UserProgress if it doesn't exist for this user and track
-    for course in track_courses_list:
-        progress = db.execute(
-            'SELECT progress_id FROM UserProgress WHERE user_id = ? AND course_id = ?', (user_id, course['course_id'])
-        ).fetchone()
-        if not progress:
-            status = 'unlocked' if course['order_in_track'] == 1 else 'locked'
-            unlocked_time = datetime.utcnow() if status == 'unlocked' else None
-            try:
-                db.execute(
-                    """INSERT INTO UserProgress 
-                       (user_id, course_id, status, unlocked_at, current_score_theory, current_score_practice, current_score_project, current_score_live_coding, total_score, attempts) 
-                       VALUES (?, ?, ?, ?, 0, 0, 0, 0, 0, 0)""",
-                    (user_id, course['course_id'], status, unlocked_time)
-                )
-                db.commit()
-                print(f"Initialized progress for user {user_id}, course {course['course_id']} with status {status}")
-            except sqlite3.IntegrityError: # Should not happen if previous check is robust
-                db.rollback()
-                print(f"Error initializing progress for user {user_id}, course {course['course_id']}. Might be a race condition or other issue.")
-            except Exception as e:
-                db.rollback()
-                print(f"Generic error initializing progress: {e}")
+    # First visit to this track: materialise all missing progress rows with a single statement
+    if len(progress_map) < len(track_courses_list):
+        try:
+            initialize_track_progress(db, user_id, track_id, catalog)
+            bump_dashboard_version(db, user_id)
+            db.commit()
+        except sqlite3.Error as e:
+            db.rollback()
+            flash(f"Error initializing course progress: {e}", 'danger')
+        progress_map = {row['course_id']: row for row in db.execute(TRACK_PROGRESS_SQL, (user_id, track_id)).fetchall()}
 
+    return render_template('courses.html', current_track=current_track, courses=track_courses_list, progress_map=progress_map)
 
-    # Fetch UserProgress for all courses in the track for the current user
-    user_progress_data = db.execute(
-        """SELECT up.course_id, up.status, up.total_score 
-           FROM UserProgress up
-           JOIN Courses c ON up.course_id = c.course_id
-           WHERE up.user_id = ? AND c.track_id = ?""",
-        (user_id, track_id)
-    ).fetchall()
-    
-    # Convert user_progress_data to a dict for easier lookup in the template
-    progress_map = {item['course_id']: item for item in user_progress_data}
+@app.route('/tracks/<int:track_id>/leaderboard')
+def track_leaderboard(track_id):
+    if 'user_id' not in session:
+        flash('Please log in to view the leaderboard.', 'info')
+        return redirect(url_for('login'))
 
-    return render_template('courses.html', current_track=current_track, courses=track_courses_list, progress_map=progress_map)
+    current_track = get_catalog().tracks_by_id.get(track_id)
+    if not current_track:
+        flash('Track not found.', 'danger')
+        return redirect(url_for('learning_paths'))
+    return render_scope_leaderboard('track', track_id, current_track.track_name, url_for('track_courses', track_id=track_id))
+
+QUIZ_AVAILABILITY_SQL = """
+    SELECT DISTINCT q.assessment_id
+    FROM Assessments a
+    JOIN QuizQuestions q ON q.assessment_id = a.assessment_id
+    WHERE a.course_id = ? AND a.assessment_type = 'Theory'
+      AND EXISTS (SELECT 1 FROM QuizChoices qc WHERE qc.question_id = q.question_id)
+"""
+
+PROGRESS_TIMESTAMP_FIELDS = ('unlocked_at', 'last_attempt_at', 'completed_at')
+
+def parse_timestamp(value):
+    """UserProgress timestamps come back from SQLite as ISO strings."""
+    if value is None or isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+def load_course_page(db, catalog, user_id, course_id):
+    """
+    Builds the course_detail page model: the course, its track and path (for
+    the breadcrumbs), the user's progress and the assessments, each with its
+    coding_exercise_id and whether its quiz has questions.
+
+    The course structure comes from the catalog cache, so at most two
+    statements run no matter how many assessments the course has: the
+    UserProgress row and, for courses with a Theory assessment the user can
+    open, the quiz availability lookup. Returns None if the course does not
+    exist; user_progress is None if it has not been initialised yet.
+    """
+    course = catalog.courses_by_id.get(course_id)
+    if course is None:
+        return None
+    track = catalog.tracks_by_id[course.track_id]
+    page = {
+        'current_course': course,
+        'track_info': { # Breadcrumbs
+            'track_id': track.track_id,
+            'track_name': track.track_name,
+            'path_id': track.path_id,
+            'path_name': catalog.paths_by_id[track.path_id].path_name,
+        },
+        'user_progress': None,
+        'assessments': [],
+    }
+
+    row = db.execute('SELECT * FROM UserProgress WHERE user_id = ? AND course_id = ?', (user_id, course_id)).fetchone()
+    if row is None:
+        return page
+    user_progress = dict(row)
+    for field in PROGRESS_TIMESTAMP_FIELDS:
+        user_progress[field] = parse_timestamp(user_progress[field])
+    page['user_progress'] = user_progress
+    if user_progress['status'] == 'locked':
+        return page
+
+    assessments = catalog.assessments_for_course(course_id)
+    quiz_ids = set()
+    if any(a.assessment_type == 'Theory' for a in assessments):
+        quiz_ids = {r['assessment_id'] for r in db.execute(QUIZ_AVAILABILITY_SQL, (course_id,)).fetchall()}
+    page['assessments'] = [dict(a._asdict(), quiz_available=a.assessment_id in quiz_ids) for a in assessments]
+    return page
 
 @app.route('/courses/<int:course_id>')
 def course_detail(course_id):
@@ -248,66 +617,25 @@ def course_detail(course_id):
         flash('Please log in to view course details.', 'info')
         return redirect(url_for('login'))
 
-    user_id = session['user_id']
-    db = get_db()
-
-    # Check UserProgress status for this course
-    user_progress = db.execute(
-        'SELECT * FROM UserProgress WHERE user_id = ? AND course_id = ?', (user_id, course_id)
-    ).fetchone()
-    
-    current_course = db.execute(
-        'SELECT c.*, t.track_name, lp.path_id, lp.path_name FROM Courses c JOIN Tracks t ON c.track_id = t.track_id JOIN LearningPaths lp ON t.path_id = lp.path_id WHERE c.course_id = ?', (course_id,)
-    ).fetchone()
-
-    if not current_course:
+    page = load_course_page(get_read_db(), get_catalog(), session['user_id'], course_id)
+    if page is None:
         flash('Course not found.', 'danger')
         return redirect(url_for('learning_paths'))
 
-    if not user_progress:
+    track_id = page['current_course'].track_id
+    if page['user_progress'] is None:
         # This case should ideally be handled by the track_courses initialization.
         # If reached, means UserProgress was not initialized for this course.
         # Redirect to track page to trigger initialization.
         flash('Course progress not initialized. Please visit the track page first.', 'warning')
-        return redirect(url_for('track_courses', track_id=current_course['track_id']))
+        return redirect(url_for('track_courses', track_id=track_id))
 
-    if user_progress['status'] == 'locked':
+    if page['user_progress']['status'] == 'locked':
         flash('This course is currently locked. Complete previous courses to unlock.', 'warning')
-        return redirect(url_for('track_courses', track_id=current_course['track_id']))
-
-kodefun-initial-build
-    assessments_raw = db.execute(
-        'SELECT assessment_id, assessment_type, description, weight_percentage FROM Assessments WHERE course_id = ? ORDER BY assessment_id', (course_id,)
-    ).fetchall()
-
-    assessments = []
-    for assessment_raw in assessments_raw:
-        assessment_dict = dict(assessment_raw) # Convert Row object to dict to allow modification
-        if assessment_dict['assessment_type'] == 'Practice':
-            # Fetch the first coding exercise linked to this practice assessment
-            first_exercise = db.execute(
-                "SELECT exercise_id FROM CodingExercises WHERE assessment_id = ? ORDER BY exercise_id LIMIT 1",
-                (assessment_dict['assessment_id'],)
-            ).fetchone()
-            if first_exercise:
-                assessment_dict['coding_exercise_id'] = first_exercise['exercise_id']
-            else:
-                assessment_dict['coding_exercise_id'] = None # No exercise found for this practice assessment
-        assessments.append(assessment_dict)
-    assessments = db.execute(
-        'SELECT assessment_id, assessment_type, description, weight_percentage FROM Assessments WHERE course_id = ? ORDER BY assessment_id', (course_id,)
-    ).fetchall()
-main
-    
-    # Track info for breadcrumbs is now part of current_course query
-    track_info = { # Reconstruct track_info for template compatibility if needed, or update template
-        'track_id': current_course['track_id'],
-        'track_name': current_course['track_name'],
-        'path_id': current_course['path_id'],
-        'path_name': current_course['path_name']
-    }
+        return redirect(url_for('track_courses', track_id=track_id))
 
-    return render_template('course_detail.html', current_course=current_course, assessments=assessments, track_info=track_info, user_progress=user_progress)
+    get_view_counter().add('course', course_id) # In memory only: the page's statement budget is unchanged
+    return render_template('course_detail.html', **page)
 
 # --- End Learning Content Display Routes ---
 # --- Assessment Submission and Completion Routes ---
@@ -380,7 +708,7 @@ def submit_assessment(course_id, assessment_id):
             "UPDATE UserProgress SET total_score = ? WHERE progress_id = ?",
             (new_total_score, user_progress['progress_id'])
         )
-        
+        bump_dashboard_version(db, user_id)
         db.commit()
         flash(f"Mock submission for {assessment['assessment_type']} complete! Score: {score_earned}/{assessment['weight_percentage']}", 'success')
     except Exception as e:
@@ -415,106 +743,13 @@ def evaluate_course_completion(course_id):
     new_attempts = (user_progress['attempts'] or 0) + 1
     
     new_status = user_progress['status']
-    xp_awarded = 0
     course_completed_successfully = False
 
     if current_total_score >= 70 and new_attempts <= 3:
         new_status = 'completed'
         course_completed_successfully = True
-        # Award XP
-        current_xp = db.execute('SELECT xp_points FROM Users WHERE user_id = ?', (user_id,)).fetchone()['xp_points']
-        xp_to_add = 100 # Fixed XP for completing a course
-        new_xp = (current_xp or 0) + xp_to_add
-        db.execute('UPDATE Users SET xp_points = ? WHERE user_id = ?', (new_xp, user_id))
-        session['xp_points'] = new_xp # Update session
-        xp_awarded = xp_to_add
-        flash(f'Congratulations! Course passed with {current_total_score} points. You earned {xp_awarded} XP!', 'success')
-
-        # --- Achievement Awarding Logic ---
-        # Helper function will be defined above this route or imported
-        
-        # 1. Course-Specific Achievements
-        completed_course_details = db.execute('SELECT course_name, track_id FROM Courses WHERE course_id = ?', (course_id,)).fetchone()
-        if completed_course_details:
-            # JS Novice (assuming JS Level 1 course name contains "JavaScript Fundamentals" or similar)
-            if "javascript fundamentals" in completed_course_details['course_name'].lower() or completed_course_details['course_name'] == "LEVEL 1: JavaScript Fundamentals":
-                check_and_award_achievement(user_id, "JavaScript Novice", db)
-            # PHP Beginner (assuming PHP Level 1 course name contains "PHP Fundamentals")
-            elif "php fundamentals" in completed_course_details['course_name'].lower() or completed_course_details['course_name'] == "LEVEL 1: PHP Fundamentals":
-                check_and_award_achievement(user_id, "PHP Beginner", db)
-            # Web Dev Starter (assuming Web Dev Level 1 course name)
-            elif "html5 semantics & accessibility" in completed_course_details['course_name'].lower() or completed_course_details['course_name'] == "L1: Frontend - HTML5 Semantics & Accessibility":
-                check_and_award_achievement(user_id, "Web Dev Starter", db)
-            # JS Functions Pro
-            elif "functions & scope" in completed_course_details['course_name'].lower() and "javascript" in completed_course_details['course_name'].lower(): # A bit more specific
-                 check_and_award_achievement(user_id, "JS Functions Pro", db)
-            # DOM Manipulator
-            elif "dom manipulation" in completed_course_details['course_name'].lower() and "javascript" in completed_course_details['course_name'].lower():
-                 check_and_award_achievement(user_id, "DOM Manipulator", db)
-            # PHP OOP Basics
-            elif "oop in php (basic)" in completed_course_details['course_name'].lower():
-                 check_and_award_achievement(user_id, "PHP OOP Basics", db)
-            # Full-Stack Foundation (check for L3 JS and L6 Web Dev Stack completion)
-            # This one is more complex as it depends on TWO courses. Simpler to check on completion of L6 if L3 is also done.
-            if completed_course_details['course_name'] == "L6: Backend - MySQL & Full-Stack Integration":
-                # Check if L3 "L3: Frontend - JavaScript DOM & Events" is also completed by this user
-                l3_js_course = db.execute("SELECT course_id FROM Courses WHERE course_name = 'L3: Frontend - JavaScript DOM & Events'").fetchone()
-                if l3_js_course:
-                    l3_js_progress = db.execute("SELECT status FROM UserProgress WHERE user_id = ? AND course_id = ?", (user_id, l3_js_course['course_id'])).fetchone()
-                    if l3_js_progress and l3_js_progress['status'] == 'completed':
-                        check_and_award_achievement(user_id, "Full-Stack Foundation", db)
-
-
-        # 2. General Achievements
-        # Count completed courses for the user
-        completed_courses_count = db.execute(
-            "SELECT COUNT(*) as count FROM UserProgress WHERE user_id = ? AND status = 'completed'", (user_id,)
-        ).fetchone()['count']
-
-        if completed_courses_count >= 5:
-            check_and_award_achievement(user_id, "Five Courses Down!", db)
-
-        # Check for "First Track Completed!" and "Halfway There!"
-        current_track_id = completed_course_details['track_id']
-        courses_in_track = db.execute("SELECT course_id FROM Courses WHERE track_id = ?", (current_track_id,)).fetchall()
-        total_courses_in_track = len(courses_in_track)
-        
-        completed_in_track_count = 0
-        for course_in_track_item in courses_in_track:
-            progress = db.execute("SELECT status FROM UserProgress WHERE user_id = ? AND course_id = ?", (user_id, course_in_track_item['course_id'])).fetchone()
-            if progress and progress['status'] == 'completed':
-                completed_in_track_count += 1
-        
-        if completed_in_track_count == total_courses_in_track and total_courses_in_track > 0 : # Ensure track is not empty
-            check_and_award_achievement(user_id, "First Track Completed!", db)
-        
-        # "Halfway There!" (for tracks with at least, say, 10-12 courses typically)
-        # Let's assume a track length of 12 for this achievement for simplicity, or check total_courses_in_track
-        if total_courses_in_track >= 10 and completed_in_track_count >= 6: # Check for 6 completed in a substantial track
-             check_and_award_achievement(user_id, "Halfway There!", db)
-        
-        # --- End Achievement Awarding Logic ---
-
-        # Unlock next course
-        current_course_order = db.execute('SELECT order_in_track, track_id FROM Courses WHERE course_id = ?', (course_id,)).fetchone()
-        if current_course_order:
-            next_course = db.execute(
-                'SELECT course_id FROM Courses WHERE track_id = ? AND order_in_track = ?',
-                (current_course_order['track_id'], current_course_order['order_in_track'] + 1)
-            ).fetchone()
-            if next_course:
-                # Ensure UserProgress exists for next course (should have been batch-created as 'locked')
-                next_progress = db.execute('SELECT progress_id, status FROM UserProgress WHERE user_id = ? AND course_id = ?', (user_id, next_course['course_id'])).fetchone()
-                if next_progress and next_progress['status'] == 'locked':
-                     db.execute('UPDATE UserProgress SET status = ?, unlocked_at = ? WHERE progress_id = ?', ('unlocked', datetime.utcnow(), next_progress['progress_id']))
-                     flash(f'Next course unlocked!', 'info')
-                elif not next_progress: # Should not happen if batch creation is robust
-                    db.execute(
-                        """INSERT INTO UserProgress (user_id, course_id, status, unlocked_at) VALUES (?, ?, ?, ?)""",
-                        (user_id, next_course['course_id'], 'unlocked', datetime.utcnow())
-                    ) # other fields default to 0/null
-                    flash(f'Next course unlocked (new progress created)!', 'info')
-
+        # XP, unlocking the next courses and achievements run on the outbox worker (course_events.py)
+        flash(f'Congratulations! Course passed with {current_total_score} points. You earned {COURSE_COMPLETION_XP} XP!', 'success')
 
     elif new_attempts <= 3:
         new_status = 'in_progress' # Or a more specific 'failed_attempt' if desired
@@ -528,67 +763,36 @@ def evaluate_course_completion(course_id):
             'UPDATE UserProgress SET status = ?, attempts = ?, last_attempt_at = ?, completed_at = ? WHERE progress_id = ?',
             (new_status, new_attempts, datetime.utcnow(), datetime.utcnow() if course_completed_successfully else user_progress['completed_at'], user_progress['progress_id'])
         )
+        if course_completed_successfully:
+            # Same transaction as the status change: the event exists exactly when the completion does
+            publish_course_completed(db, user_id, course_id, current_total_score)
+        bump_dashboard_version(db, user_id)
         db.commit()
     except Exception as e:
         db.rollback()
         flash(f"Error updating course completion status: {e}", 'danger')
+    else:
+        if course_completed_successfully:
+            deliver_events(db)
 
     return redirect(url_for('course_detail', course_id=course_id))
 
 # --- End Assessment Submission and Completion Routes ---
 
 # --- Achievement Helper Function ---
-def check_and_award_achievement(user_id, achievement_name, db):
+def award_event_achievements(db, user_id, event, course_id=None, quiz_percentage=None):
     """
-    Checks if a user should be awarded an achievement and processes it.
-    Assumes 'db' is an active database connection.
-    Does not commit; commit should be handled by the calling route.
+    Awards the achievements an event earns right away (see
+    achievement_rules.evaluate_event) and flashes each one. Does not commit.
     """
-    try:
-        achievement = db.execute("SELECT achievement_id, xp_bonus FROM Achievements WHERE achievement_name = ?", (achievement_name,)).fetchone()
-        if not achievement:
-            print(f"Achievement '{achievement_name}' not found in database.")
-            return
-
-        achievement_id = achievement['achievement_id']
-        xp_bonus = achievement['xp_bonus']
-
-        # Check if user already has this achievement
-        existing_user_achievement = db.execute(
-            "SELECT user_achievement_id FROM UserAchievements WHERE user_id = ? AND achievement_id = ?",
-            (user_id, achievement_id)
-        ).fetchone()
-
-        if existing_user_achievement:
-            # print(f"User {user_id} already has achievement '{achievement_name}'.")
-            return
-
-        # Award achievement
-        db.execute(
-            "INSERT INTO UserAchievements (user_id, achievement_id, unlocked_at) VALUES (?, ?, ?)",
-            (user_id, achievement_id, datetime.utcnow())
-        )
-        
-        # Update user's XP
-        current_xp = db.execute("SELECT xp_points FROM Users WHERE user_id = ?", (user_id,)).fetchone()['xp_points']
-        new_xp = (current_xp or 0) + (xp_bonus or 0)
-        db.execute("UPDATE Users SET xp_points = ? WHERE user_id = ?", (new_xp, user_id))
-        
-        # Update session XP if the current user is the one getting the achievement
-        if 'user_id' in session and session['user_id'] == user_id:
-            session['xp_points'] = new_xp
-        
-        flash(f"Achievement Unlocked: {achievement_name}! +{xp_bonus} XP", 'success')
-        print(f"Awarded achievement '{achievement_name}' to user {user_id}. XP Bonus: {xp_bonus}")
-
-    except sqlite3.Error as e:
-        # Handle potential database errors during the process
-        # It's important this function doesn't crash the main flow.
-        # The calling function should handle commit/rollback.
-        print(f"Database error in check_and_award_achievement for '{achievement_name}': {e}")
-        # Consider re-raising if the calling function should handle rollback db.rollback()
-    except Exception as ex:
-        print(f"Generic error in check_and_award_achievement for '{achievement_name}': {ex}")
+    awarded, new_xp = evaluate_event(db, get_catalog(), user_id, event, course_id, quiz_percentage)
+    if awarded:
+        bump_dashboard_version(db, user_id)
+    for rule in awarded:
+        flash(f"Achievement Unlocked: {rule.name}! +{rule.xp_bonus} XP", 'success')
+    # Update session XP if the current user is the one getting the achievement
+    if new_xp is not None and session.get('user_id') == user_id:
+        session['xp_points'] = new_xp
 
 # --- Leaderboard and User Achievements Routes ---
 @app.route('/leaderboard')
@@ -597,12 +801,21 @@ def leaderboard():
         flash('Please log in to view the leaderboard.', 'info')
         return redirect(url_for('login'))
     
-    db = get_db()
-    # Fetch top 20 users by XP points
-    top_users = db.execute(
-        "SELECT username, xp_points FROM Users ORDER BY xp_points DESC, user_id ASC LIMIT 20"
-    ).fetchall()
-    return render_template('leaderboard.html', users=top_users)
+    window = request.args.get('window', 'all')
+    if window == 'all':
+        # Top 20, the user's own rank and, outside the top, their neighbours
+        standings = load_standings(get_read_db(), get_leaderboard(), session['user_id'])
+    elif window in WINDOW_LABELS:
+        if stale_windows(get_read_db()): # First view of a new day moves the windows forward
+            try:
+                roll_windows(get_db())
+            except sqlite3.Error: # Writer busy: show the totals as they stand, a later view (or xp-windows-roll) rolls
+                pass
+        standings = load_window_standings(get_read_db(), window, session['user_id'])
+    else:
+        abort(404)
+    return render_template('leaderboard.html', users=standings['top'], rank=standings['rank'], around=standings['around'],
+                           window=window, window_labels=WINDOW_LABELS)
 
 @app.route('/my_achievements')
 def my_achievements():
@@ -611,7 +824,7 @@ def my_achievements():
         return redirect(url_for('login'))
     
     user_id = session['user_id']
-    db = get_db()
+    db = get_read_db()
     
     user_achievements = db.execute("""
         SELECT a.achievement_name, a.description, a.xp_bonus, ua.unlocked_at
@@ -636,7 +849,7 @@ def path_survey():
     if request.method == 'POST':
         interest = request.form.get('interest')
         learn_style = request.form.get('learn_style')
-        db = get_db()
+        catalog = get_catalog()
 
         # Default suggestion
         suggested_path_name = "Learning Paths"
@@ -645,38 +858,38 @@ def path_survey():
 
         if interest == 'websites' and learn_style == 'stack':
             # Suggest "Web Development Stack"
-            track = db.execute("SELECT track_id, track_name FROM Tracks WHERE track_name LIKE '%Web Development Stack%'").fetchone()
+            track = catalog.find_track('Web Development Stack')
             if track:
-                suggested_path_name = track['track_name']
-                suggested_url = url_for('track_courses', track_id=track['track_id'])
+                suggested_path_name = track.track_name
+                suggested_url = url_for('track_courses', track_id=track.track_id)
                 suggestion_message = f"We recommend the '{suggested_path_name}' track for you!"
             else: # Fallback if track name changes or not found
-                path = db.execute("SELECT path_id, path_name FROM LearningPaths WHERE path_name LIKE '%Multi Programming Path%'").fetchone()
+                path = catalog.find_path('Multi Programming Path')
                 if path:
-                    suggested_path_name = path['path_name']
-                    suggested_url = url_for('learning_path_tracks', path_id=path['path_id'])
+                    suggested_path_name = path.path_name
+                    suggested_url = url_for('learning_path_tracks', path_id=path.path_id)
                     suggestion_message = f"We recommend exploring our '{suggested_path_name}' for web development roles."
 
         elif interest == 'programming_logic' and learn_style == 'deep_dive':
             # Suggest "JavaScript Mastery Track" (as a default deep dive)
-            track = db.execute("SELECT track_id, track_name FROM Tracks WHERE track_name LIKE '%JavaScript Mastery Track%'").fetchone()
+            track = catalog.find_track('JavaScript Mastery Track')
             if track:
-                suggested_path_name = track['track_name']
-                suggested_url = url_for('track_courses', track_id=track['track_id'])
+                suggested_path_name = track.track_name
+                suggested_url = url_for('track_courses', track_id=track.track_id)
                 suggestion_message = f"The '{suggested_path_name}' track would be a great fit for a deep dive into programming fundamentals!"
             else: # Fallback
-                path = db.execute("SELECT path_id, path_name FROM LearningPaths WHERE path_name LIKE '%Single Programming Path%'").fetchone()
+                path = catalog.find_path('Single Programming Path')
                 if path:
-                    suggested_path_name = path['path_name']
-                    suggested_url = url_for('learning_path_tracks', path_id=path['path_id'])
+                    suggested_path_name = path.path_name
+                    suggested_url = url_for('learning_path_tracks', path_id=path.path_id)
                     suggestion_message = f"Consider our '{suggested_path_name}' for a deep dive into a specific language."
         
         elif interest == 'websites' and learn_style == 'deep_dive':
              # Could suggest JS or PHP path
-            path = db.execute("SELECT path_id, path_name FROM LearningPaths WHERE path_name LIKE '%Single Programming Path%'").fetchone()
+            path = catalog.find_path('Single Programming Path')
             if path:
-                suggested_path_name = path['path_name']
-                suggested_url = url_for('learning_path_tracks', path_id=path['path_id'])
+                suggested_path_name = path.path_name
+                suggested_url = url_for('learning_path_tracks', path_id=path.path_id)
                 suggestion_message = f"For building websites with a deep focus, check out our '{suggested_path_name}' and choose a language like JavaScript or PHP."
 
 
@@ -688,36 +901,124 @@ def path_survey():
 # --- End Adaptive Learning ---
 
 # --- Forum Routes ---
+FORUM_TIMESTAMP_FIELDS = ('created_at', 'last_post_time', 'thread_created_at')
+
+def parse_forum_timestamps(row):
+    """The row as a dict with its forum timestamps parsed, for the templates' strftime."""
+    item = dict(row)
+    for field in FORUM_TIMESTAMP_FIELDS:
+        if field in item:
+            item[field] = parse_timestamp(item[field])
+    return item
+
 @app.route('/forum')
 def forum_index():
+    if 'user_id' not in session:
+        flash('Please log in to access the forum.', 'info')
+        return redirect(url_for('login'))
+    db = get_read_db()
+    categories = db.execute(CATEGORIES_SQL).fetchall() # With their thread/post counters (forum_stats.py)
+    unread = unread_counts(db, session['user_id']) # One statement for every category (forum_unread.py)
+    return render_template('forum_index.html', categories=categories, unread=unread, unread_limit=UNREAD_LIMIT)
+
+@app.route('/forum/mark_read', methods=['POST'])
+def forum_mark_all_read():
     if 'user_id' not in session:
         flash('Please log in to access the forum.', 'info')
         return redirect(url_for('login'))
     db = get_db()
-    categories = db.execute("SELECT category_id, name, description FROM ForumCategories ORDER BY name").fetchall()
-    return render_template('forum_index.html', categories=categories)
+    try:
+        for category in db.execute("SELECT category_id FROM ForumCategories").fetchall():
+            mark_category_read(db, session['user_id'], category['category_id'])
+        db.commit()
+        flash('All threads marked as read.', 'success')
+    except sqlite3.Error as e:
+        db.rollback()
+        flash(f'Database error: {e}', 'danger')
+    return redirect(url_for('forum_index'))
+
+@app.route('/forum/search')
+def forum_search():
+    if 'user_id' not in session:
+        flash('Please log in to search the forum.', 'info')
+        return redirect(url_for('login'))
+    db = get_read_db()
+    query = request.args.get('q', '').strip()
+    category_id = request.args.get('category_id', type=int)
+    page_number = request.args.get('page', 1, type=int)
+    categories = db.execute(CATEGORIES_SQL).fetchall()
+    page = search_forum(db, query, category_id, page_number) # BM25-ranked over the FTS5 index (forum_search.py)
+    results = []
+    for row in page['results']:
+        result = parse_forum_timestamps(row)
+        if row['post_id'] is not None:
+            # The thread page that starts at this post: the cursor just before its (created_at, post_id)
+            result['url'] = url_for('forum_thread_view', thread_id=row['thread_id'],
+                                    after=encode_forum_cursor(row['created_at'], row['post_id'] - 1), _anchor=f"post-{row['post_id']}")
+        else:
+            result['url'] = url_for('forum_thread_view', thread_id=row['thread_id'])
+        results.append(result)
+    return render_template('forum_search.html', query=query, category_id=category_id, categories=categories,
+                           results=results, page_number=max(page_number, 1), has_next=page['has_next'])
 
 @app.route('/forum/category/<int:category_id>')
 def forum_category_threads(category_id):
     if 'user_id' not in session:
         flash('Please log in to view this category.', 'info')
         return redirect(url_for('login'))
-    db = get_db()
-    category = db.execute("SELECT category_id, name FROM ForumCategories WHERE category_id = ?", (category_id,)).fetchone()
+    db = get_read_db()
+    category = db.execute(
+        "SELECT category_id, name, thread_count, post_count FROM ForumCategories WHERE category_id = ?", (category_id,)
+    ).fetchone()
     if not category:
         flash('Forum category not found.', 'danger')
         return redirect(url_for('forum_index'))
-    
-    threads = db.execute("""
-        SELECT t.thread_id, t.title, t.created_at, u.username, COUNT(p.post_id) as post_count, MAX(p.created_at) as last_post_time
-        FROM ForumThreads t
-        JOIN Users u ON t.user_id = u.user_id
-        LEFT JOIN ForumPosts p ON t.thread_id = p.thread_id
-        WHERE t.category_id = ?
-        GROUP BY t.thread_id, t.title, t.created_at, u.username
-        ORDER BY last_post_time DESC, t.created_at DESC
-    """, (category_id,)).fetchall()
-    return render_template('forum_category_threads.html', category=category, threads=threads)
+
+    # Counters are maintained on ForumThreads, so a page is one index range in last-activity order
+    page = load_threads_page(db, category_id, after=request.args.get('after'), before=request.args.get('before'))
+    user_id = session['user_id']
+    watermark, unread_count, last_post_id = category_unread(db, user_id, category_id)
+    if unread_count == 0 and last_post_id > watermark:
+        # Nothing unread: move the watermark up so later counts start from here (forum_unread.py).
+        # Only an optimisation, so a busy writer just leaves it for a later view.
+        write_db = get_db()
+        try:
+            mark_category_read(write_db, user_id, category_id, last_post_id)
+            write_db.commit()
+        except sqlite3.Error:
+            write_db.rollback()
+    unread = unread_threads(db, user_id, [row['thread_id'] for row in page['rows']], watermark)
+    threads = []
+    for row in page['rows']:
+        thread = parse_forum_timestamps(row)
+        if row['thread_id'] in unread:
+            last_read_post = unread[row['thread_id']]
+            if last_read_post: # Resume on the page that starts right after the last post read
+                thread['unread_url'] = url_for('forum_thread_view', thread_id=row['thread_id'],
+                                               after=encode_forum_cursor(last_read_post[1], last_read_post[0]))
+            else:
+                thread['unread_url'] = url_for('forum_thread_view', thread_id=row['thread_id'])
+        threads.append(thread)
+    return render_template('forum_category_threads.html', category=category, threads=threads, page=page,
+                           unread_count=unread_count, unread_limit=UNREAD_LIMIT)
+
+@app.route('/forum/category/<int:category_id>/mark_read', methods=['POST'])
+def forum_mark_category_read(category_id):
+    if 'user_id' not in session:
+        flash('Please log in to view this category.', 'info')
+        return redirect(url_for('login'))
+    db = get_db()
+    if not db.execute("SELECT 1 FROM ForumCategories WHERE category_id = ?", (category_id,)).fetchone():
+        flash('Forum category not found.', 'danger')
+        return redirect(url_for('forum_index'))
+    try:
+        mark_category_read(db, session['user_id'], category_id)
+        db.commit()
+        flash('Category marked as read.', 'success')
+    except sqlite3.Error as e:
+        db.rollback()
+        flash(f'Database error: {e}', 'danger')
+    return redirect(url_for('forum_category_threads', category_id=category_id))
 
 @app.route('/forum/category/<int:category_id>/create_thread', methods=['GET', 'POST'])
 def forum_create_thread(category_id):
@@ -744,9 +1045,11 @@ def forum_create_thread(category_id):
                 cursor.execute("INSERT INTO ForumThreads (category_id, user_id, title) VALUES (?, ?, ?)",
                                (category_id, user_id, title))
                 thread_id = cursor.lastrowid
-                db.execute("INSERT INTO ForumPosts (thread_id, user_id, content) VALUES (?, ?, ?)",
-                           (thread_id, user_id, content))
+                db.execute("INSERT INTO ForumPosts (thread_id, user_id, content, content_html, content_renderer) VALUES (?, ?, ?, ?, ?)",
+                           (thread_id, user_id, content, render_markdown(content), RENDERER_VERSION))
+                award_event_achievements(db, user_id, 'forum_post')
                 db.commit()
+                wake_forum_hub()
                 flash('Thread created successfully!', 'success')
                 return redirect(url_for('forum_thread_view', thread_id=thread_id))
             except sqlite3.Error as e:
@@ -761,7 +1064,7 @@ def forum_thread_view(thread_id):
         flash('Please log in to view threads.', 'info')
         return redirect(url_for('login'))
     
-    db = get_db()
+    db = get_read_db()
     thread = db.execute("""
         SELECT t.thread_id, t.title, t.created_at as thread_created_at, u.username as thread_starter_username, c.category_id, c.name as category_name
         FROM ForumThreads t
@@ -774,15 +1077,26 @@ def forum_thread_view(thread_id):
         flash('Thread not found.', 'danger')
         return redirect(url_for('forum_index'))
         
-    posts = db.execute("""
-        SELECT p.post_id, p.content, p.created_at, u.username
-        FROM ForumPosts p
-        JOIN Users u ON p.user_id = u.user_id
-        WHERE p.thread_id = ?
-        ORDER BY p.created_at ASC
-    """, (thread_id,)).fetchall()
-    
-    return render_template('forum_thread_view.html', thread=thread, posts=posts)
+    # One page of posts per view (forum_pages.py); ?page=latest jumps to the newest replies
+    page = load_posts_page(db, thread_id, after=request.args.get('after'), before=request.args.get('before'),
+                           latest=request.args.get('page') == 'latest')
+    read_up_to = last_read(db, session['user_id'], thread_id)
+    posts = []
+    for row in page['rows']:
+        post = parse_forum_timestamps(row)
+        post['content_html'] = post_html(row)
+        post['unread'] = row['post_id'] > read_up_to
+        posts.append(post)
+    get_view_counter().add('thread', thread_id) # Buffered; written in batches (view_counter.py)
+    shown_up_to = max((row['post_id'] for row in page['rows']), default=0)
+    if shown_up_to > read_up_to: # Only written when the page shows something new
+        write_db = get_db()
+        try:
+            mark_thread_read(write_db, session['user_id'], thread_id, shown_up_to)
+            write_db.commit()
+        except sqlite3.Error: # The page still renders; the posts stay unread until the next view
+            write_db.rollback()
+    return render_template('forum_thread_view.html', thread=parse_forum_timestamps(thread), posts=posts, page=page)
 
 @app.route('/forum/thread/<int:thread_id>/create_post', methods=['POST'])
 def forum_create_post(thread_id):
@@ -805,15 +1119,54 @@ def forum_create_post(thread_id):
         return redirect(url_for('forum_index'))
         
     try:
-        db.execute("INSERT INTO ForumPosts (thread_id, user_id, content) VALUES (?, ?, ?)",
-                   (thread_id, user_id, content))
+        # Rendered once here; every view serves the stored HTML (forum_markdown.py)
+        db.execute("INSERT INTO ForumPosts (thread_id, user_id, content, content_html, content_renderer) VALUES (?, ?, ?, ?, ?)",
+                   (thread_id, user_id, content, render_markdown(content), RENDERER_VERSION))
+        award_event_achievements(db, user_id, 'forum_post')
         db.commit()
+        wake_forum_hub()
         flash('Reply posted successfully!', 'success')
     except sqlite3.Error as e:
         db.rollback()
         flash(f'Database error: {e}', 'danger')
         
-    return redirect(url_for('forum_thread_view', thread_id=thread_id))
+    return redirect(url_for('forum_thread_view', thread_id=thread_id, page='latest'))
+
+def forum_event_stream(kind, channel_id):
+    """
+    An SSE stream of the channel's new posts. A reconnecting browser's
+    Last-Event-ID (or ?after=<post_id> from the page) replays what it missed
+    first. 503 once the process has FORUM_LIVE_MAX_SUBSCRIBERS open streams;
+    the browser retries.
+    """
+    hub = get_forum_hub()
+    subscriber = hub.subscribe(kind, channel_id)
+    if subscriber is None:
+        return Response("Too many live connections, retrying shortly.\n", status=503, mimetype='text/plain',
+                        headers={'Retry-After': '10'})
+    after = request.headers.get('Last-Event-ID', type=int)
+    if after is None:
+        after = request.args.get('after', type=int)
+    try:
+        # Subscribed first, so a post is in the replay, the queue or both (the stream skips repeats)
+        replayed = replay_forum_posts(get_read_db(), kind, channel_id, after) if after is not None else []
+    except Exception:
+        hub.unsubscribe(subscriber)
+        raise
+    body = stream_forum_posts(hub, subscriber, replayed, app.config['FORUM_LIVE_HEARTBEAT_SECONDS'])
+    return Response(body, mimetype='text/event-stream', headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/forum/thread/<int:thread_id>/events')
+def forum_thread_events(thread_id):
+    if 'user_id' not in session:
+        abort(401)
+    return forum_event_stream('thread', thread_id)
+
+@app.route('/forum/category/<int:category_id>/events')
+def forum_category_events(category_id):
+    if 'user_id' not in session:
+        abort(401)
+    return forum_event_stream('category', category_id)
 
 # --- End Forum Routes ---
 
@@ -834,7 +1187,6 @@ def collaboration():
 
 # --- End Placeholder Routes ---
 
-kodefun-initial-build
 # --- Quiz System Routes ---
 @app.route('/courses/<int:course_id>/assessment/<int:assessment_id>/quiz', methods=['GET'])
 def take_quiz(course_id, assessment_id):
@@ -846,35 +1198,17 @@ def take_quiz(course_id, assessment_id):
     db = get_db()
 
     # Fetch assessment and course details
-    assessment = db.execute("SELECT assessment_id, course_id, assessment_type, weight_percentage FROM Assessments WHERE assessment_id = ? AND course_id = ?", 
-                            (assessment_id, course_id)).fetchone()
-    if not assessment or assessment['assessment_type'] != 'Theory':
+    assessment = get_catalog().assessments_by_id.get(assessment_id)
+    if not assessment or assessment.course_id != course_id or assessment.assessment_type != 'Theory':
         flash('Quiz not found or not a Theory assessment.', 'danger')
         return redirect(url_for('course_detail', course_id=course_id))
 
-    # Fetch questions and choices
-    questions_raw = db.execute("""
-        SELECT q.question_id, q.question_text, qc.choice_id, qc.choice_text
-        FROM QuizQuestions q
-        JOIN QuizChoices qc ON q.question_id = qc.question_id
-        WHERE q.assessment_id = ?
-        ORDER BY q.question_id, qc.choice_id
-    """, (assessment_id,)).fetchall()
-
-    if not questions_raw:
+    # Questions and choices come compiled from the quiz cache
+    quiz = get_quiz(assessment)
+    if not quiz.questions:
         flash('No questions found for this quiz.', 'warning')
         return redirect(url_for('course_detail', course_id=course_id))
 
-    questions = {}
-    for row in questions_raw:
-        if row['question_id'] not in questions:
-            questions[row['question_id']] = {
-                'question_id': row['question_id'],
-                'question_text': row['question_text'],
-                'choices': []
-            }
-        questions[row['question_id']]['choices'].append({'choice_id': row['choice_id'], 'choice_text': row['choice_text']})
-    
     # Determine current attempt number
     last_attempt = db.execute(
         "SELECT MAX(attempt_number) as max_attempt FROM UserQuizAttempts WHERE user_id = ? AND assessment_id = ?",
@@ -888,7 +1222,7 @@ def take_quiz(course_id, assessment_id):
         cursor.execute("""
             INSERT INTO UserQuizAttempts (user_id, assessment_id, course_id, attempt_number, max_score) 
             VALUES (?, ?, ?, ?, ?)
-        """, (user_id, assessment_id, course_id, current_attempt_number, len(questions)))
+        """, (user_id, assessment_id, course_id, current_attempt_number, len(quiz)))
         attempt_id = cursor.lastrowid
         db.commit()
         session['current_quiz_attempt_id'] = attempt_id # Store in session for submission
@@ -898,7 +1232,7 @@ def take_quiz(course_id, assessment_id):
         return redirect(url_for('course_detail', course_id=course_id))
 
     return render_template('take_quiz.html', course_id=course_id, assessment=assessment, 
-                           questions=list(questions.values()), attempt_id=attempt_id)
+                           questions=quiz.questions, attempt_id=attempt_id)
 
 
 @app.route('/submit_quiz/<int:attempt_id>', methods=['POST'])
@@ -935,29 +1269,23 @@ def submit_quiz(attempt_id):
     
     score = 0
     
-    # Get all questions for this assessment to iterate
-    questions_in_quiz = db.execute("SELECT question_id FROM QuizQuestions WHERE assessment_id = ?", (assessment_id,)).fetchall()
+    # Graded against the compiled quiz's answer key: no lookups per question
+    assessment = get_catalog().assessments_by_id.get(assessment_id)
+    quiz = get_quiz(assessment) if assessment else None
 
     try:
-        for q_row in questions_in_quiz:
-            question_id = q_row['question_id']
-            chosen_choice_id_str = request.form.get(f'question_{question_id}')
-            chosen_choice_id = int(chosen_choice_id_str) if chosen_choice_id_str else None
-            is_correct_answer = False
-
-            if chosen_choice_id:
-                correct_choice = db.execute(
-                    "SELECT is_correct FROM QuizChoices WHERE choice_id = ? AND question_id = ?",
-                    (chosen_choice_id, question_id)
-                ).fetchone()
-                if correct_choice and correct_choice['is_correct']:
-                    score += 1
-                    is_correct_answer = True
-            
-            db.execute("""
-                INSERT INTO UserQuizAnswers (attempt_id, question_id, chosen_choice_id, is_correct)
-                VALUES (?, ?, ?, ?)
-            """, (attempt_id, question_id, chosen_choice_id, is_correct_answer))
+        answers = []
+        for question in (quiz.questions if quiz else ()):
+            question_id = question.question_id
+            chosen_choice_id = request.form.get(f'question_{question_id}', type=int)
+            is_correct_answer = chosen_choice_id is not None and quiz.is_correct(question_id, chosen_choice_id)
+            if is_correct_answer:
+                score += 1
+            answers.append((attempt_id, question_id, chosen_choice_id, is_correct_answer))
+        db.executemany("""
+            INSERT INTO UserQuizAnswers (attempt_id, question_id, chosen_choice_id, is_correct)
+            VALUES (?, ?, ?, ?)
+        """, answers)
 
         # Update UserQuizAttempts
         db.execute("""
@@ -1000,6 +1328,9 @@ def submit_quiz(attempt_id):
                 (user_id, course_id, 'in_progress', theory_points, theory_points, datetime.utcnow())
             )
 
+        quiz_percentage = (score / max_score_for_quiz) * 100 if max_score_for_quiz > 0 else 0
+        award_event_achievements(db, user_id, 'quiz_submitted', course_id=course_id, quiz_percentage=quiz_percentage)
+        bump_dashboard_version(db, user_id)
         db.commit()
         flash(f'Quiz submitted! You scored {score}/{max_score_for_quiz}. Theory score contribution: {theory_points}/{assessment_weight}.', 'success')
         session.pop('current_quiz_attempt_id', None) # Clear from session
@@ -1152,7 +1483,7 @@ def save_coding_submission():
                    VALUES (?, ?, ?, ?, ?, ?)""",
                 (user_id, course_id, 'in_progress', practice_points, new_total_score, datetime.utcnow())
             )
-        
+        bump_dashboard_version(db, user_id)
         db.commit()
         flash(f'Submission saved! You passed {passed_tests}/{total_tests} tests. Practice score contribution: {practice_points}/{assessment_weight}.', 'success')
     except sqlite3.Error as e:
@@ -1165,7 +1496,16 @@ def save_coding_submission():
     return redirect(url_for('course_detail', course_id=course_id))
 
 # --- End Coding Exercise Routes ---
-main
+
+# --- Debug Routes ---
+@app.route('/debug/sql_profiles')
+def debug_sql_profiles():
+    if not app.debug: # Never exposed outside debug mode
+        abort(404)
+    limit = request.args.get('limit', default=20, type=int)
+    return jsonify(get_profile_store().recent(limit))
+
+# --- End Debug Routes ---
 
 # Command to initialize DB from CLI: flask init-db
 @app.cli.command('init-db') # The duplicate logout function that was here has been removed.
@@ -1174,13 +1514,197 @@ def init_db_command():
     init_db(force_recreate=True)
     print('Database initialized (or re-initialized).')
 
+# Command to apply pending schema migrations: flask migrate-db [--dry-run]
+@app.cli.command('migrate-db')
+@click.option('--dry-run', is_flag=True, help='Only print the pending migrations.')
+def migrate_db_command(dry_run):
+    """Apply pending numbered schema migrations."""
+    with app.app_context():
+        migrate(get_db(), dry_run=dry_run)
+
+# Command to dump recent request SQL profiles: flask sql-profiles [--last N]
+@app.cli.command('sql-profiles')
+@click.option('--last', default=20, help='Number of most recent profiles to show.')
+@click.option('--only-problems', is_flag=True, help='Only show requests that exceeded a threshold.')
+def sql_profiles_command(last, only_problems):
+    """Dump the last N request SQL profiles from SQL_PROFILE_LOG."""
+    log_path = app.config.get('SQL_PROFILE_LOG')
+    if not log_path or not os.path.exists(log_path):
+        print("No SQL profile log found. Set KODEFUN_SQL_PROFILE_LOG for the server process first.")
+        return
+    store = get_profile_store()
+    for entry in read_profile_log(log_path, last):
+        problems = store.problems(QueryProfile.from_dict(entry))
+        if only_problems and not problems:
+            continue
+        print(format_profile(entry))
+        for problem in problems:
+            print(f"    ! {problem}")
+
+# Command to check Users.xp_points against the XP ledger: flask xp-reconcile [--fix]
+@app.cli.command('xp-reconcile')
+@click.option('--fix', is_flag=True, help='Reset drifted balances to their ledger totals.')
+def xp_reconcile_command(fix):
+    """Report (and optionally fix) users whose xp_points disagree with XpLedger."""
+    with app.app_context():
+        drift = reconcile(get_db(), fix=fix)
+    for user_id, xp_points, ledger_total in drift:
+        print(f"User {user_id}: xp_points {xp_points}, ledger {ledger_total} ({ledger_total - xp_points:+d})")
+    if not drift:
+        print("All XP balances match the ledger.")
+    elif fix:
+        print(f"Fixed {len(drift)} balance(s).")
+
+# Command to fold old ledger entries into one row per user: flask xp-compact [--older-than-days N]
+@app.cli.command('xp-compact')
+@click.option('--older-than-days', default=DEFAULT_COMPACT_AFTER_DAYS, help='Only compact entries older than this.')
+def xp_compact_command(older_than_days):
+    """Compact old XpLedger entries without changing any balance."""
+    with app.app_context():
+        removed, users = compact(get_db(), older_than_days)
+    print(f"Compacted {removed} ledger entries for {users} user(s).")
+
+# Command to award achievements retroactively: flask award-backfill [--workers N] [--shard-size N] [--restart]
+@app.cli.command('award-backfill')
+@click.option('--workers', default=DEFAULT_BACKFILL_WORKERS, help='Worker processes, one connection each.')
+@click.option('--shard-size', default=DEFAULT_SHARD_SIZE, help='User ids per shard (and per write transaction).')
+@click.option('--restart', is_flag=True, help='Ignore the checkpoints of a previous run of the same job.')
+def award_backfill_command(workers, shard_size, restart):
+    """Evaluate every achievement for every user and award what they already earned."""
+    get_db_pool().close_all() # The workers open their own connections
+    result = run_backfill(app.config['DATABASE'], workers=workers, shard_size=shard_size, restart=restart)
+    if result['shards']:
+        print(f"{result['job']}: {result['awards']} achievement(s) awarded over {result['users']} user ids "
+              f"in {result['seconds']:.1f}s ({result['users'] / result['seconds']:,.0f} users/s).")
+    elif result['skipped']:
+        print(f"{result['job']}: already complete. Use --restart to run it again.")
+
+# Command to check UserTrackSummary/UserPathSummary against UserProgress: flask track-summary-check [--fix]
+@app.cli.command('track-summary-check')
+@click.option('--fix', is_flag=True, help='Rebuild the summaries of the users that drifted.')
+def track_summary_check_command(fix):
+    """Report (and optionally fix) UserTrackSummary/UserPathSummary rows that disagree with UserProgress."""
+    with app.app_context():
+        drift, path_drift = reconcile_track_summaries(get_db(), fix=fix)
+    for user_id, track_id, stored, actual in drift:
+        print(f"User {user_id}, track {track_id}: summary says {stored} completed, UserProgress {actual}")
+    for user_id, path_id, stored, actual in path_drift:
+        print(f"User {user_id}, path {path_id}: summary says {stored} completed, its tracks {actual}")
+    if not drift and not path_drift:
+        print("UserTrackSummary and UserPathSummary match UserProgress.")
+    elif fix:
+        print(f"Rebuilt the summaries of {len({row[0] for row in drift + path_drift})} user(s).")
+    else:
+        print(f"{len(drift) + len(path_drift)} summary row(s) drifted. Run with --fix to rebuild them.")
+
+@app.cli.command('track-summary-rebuild')
+def track_summary_rebuild_command():
+    """Recompute every UserTrackSummary row from UserProgress, and UserPathSummary from those."""
+    with app.app_context():
+        rows = rebuild_track_summaries(get_db())
+    print(f"Rebuilt UserTrackSummary ({rows} row(s)) and UserPathSummary.")
+
+# Outbox worker as a separate process (set KODEFUN_EVENT_DELIVERY=process for the web app): flask outbox-worker
+@app.cli.command('outbox-worker')
+@click.option('--once', is_flag=True, help='Process what is pending, then exit.')
+def outbox_worker_command(once):
+    """Run the outbox event handlers (course completion XP, unlocks, achievements)."""
+    worker = OutboxWorker(lambda: get_db_pool().acquire(WRITE_LANE), get_catalog_for, EVENT_HANDLERS)
+    if once:
+        while worker.run_once():
+            pass
+        print(f"Processed {worker.processed} event(s), {worker.failed} failure(s).")
+        return
+    print("Outbox worker running. Press Ctrl+C to stop.")
+    try:
+        worker.run_forever()
+    except KeyboardInterrupt:
+        print(f"Stopped after {worker.processed} event(s), {worker.failed} failure(s).")
+
+@app.cli.command('outbox-status')
+@click.option('--requeue-dead', 'requeue_dead_events', is_flag=True, help='Retry the events that ran out of attempts.')
+@click.option('--prune-older-than-days', type=int, default=None,
+              help=f'Delete processed events older than this (e.g. {DEFAULT_PRUNE_AFTER_DAYS}).')
+def outbox_status_command(requeue_dead_events, prune_older_than_days):
+    """Show outbox backlog and enqueue-to-processed lag."""
+    with app.app_context():
+        db = get_db()
+        if requeue_dead_events:
+            print(f"Requeued {requeue_dead(db)} dead event(s).")
+        if prune_older_than_days is not None:
+            print(f"Pruned {prune_outbox(db, prune_older_than_days)} processed event(s).")
+        status = outbox_status(db)
+    for name in ('pending', 'done', 'dead'):
+        counts = status['counts'].get(name, {'count': 0, 'oldest': None})
+        oldest = f", oldest {counts['oldest']}" if counts['oldest'] and name != 'done' else ''
+        print(f"{name}: {counts['count']}{oldest}")
+    lag = status['lag']
+    if lag:
+        print(f"Lag over the last {lag['samples']} event(s): p50 {lag['p50_ms']:.1f}ms, "
+              f"p95 {lag['p95_ms']:.1f}ms, max {lag['max_ms']:.1f}ms")
+
+@app.cli.command('forum-stats-backfill')
+@click.option('--batch-size', type=int, default=DEFAULT_FORUM_BATCH_SIZE, show_default=True, help='Threads recomputed per transaction.')
+@click.option('--check', is_flag=True, help='Only report threads whose counters disagree with ForumPosts.')
+def forum_stats_backfill_command(batch_size, check):
+    """Recompute the forum thread/category counters from ForumPosts."""
+    with app.app_context():
+        db = get_db()
+        drift = find_forum_drift(db)
+        for thread_id, stored, actual in drift:
+            print(f"Thread {thread_id}: counter says {stored} post(s), ForumPosts {actual}")
+        print(f"{len(drift)} thread(s) drifted.")
+        if not check:
+            updated = backfill_forum_stats(db, batch_size)
+            print(f"Recomputed the counters of {updated} thread(s) and every category.")
+
+
+@app.cli.command('forum-rerender')
+@click.option('--batch-size', type=int, default=DEFAULT_RERENDER_BATCH_SIZE, show_default=True, help='Posts re-rendered per transaction.')
+@click.option('--check', is_flag=True, help='Only report whether any post needs re-rendering.')
+def forum_rerender_command(batch_size, check):
+    """Re-render forum posts whose stored HTML is missing or from an older Markdown renderer."""
+    with app.app_context():
+        db = get_db()
+        if not has_stale_posts(db):
+            print(f"Every post is rendered with {RENDERER_VERSION}.")
+            return
+        print(f"Some posts are not rendered with {RENDERER_VERSION}.")
+        if not check:
+            updated = rerender_forum_posts(db, batch_size)
+            print(f"Re-rendered {updated} post(s).")
+
+@app.cli.command('forum-search-rebuild')
+@click.option('--optimize-only', is_flag=True, help='Only merge the index segments, without re-reading the forum tables.')
+def forum_search_rebuild_command(optimize_only):
+    """Rebuild (or just optimize) the forum full-text search index."""
+    with app.app_context():
+        db = get_db()
+        indexed, expected = forum_search_counts(db)
+        print(f"Search index holds {indexed} document(s) for {expected} thread(s) and post(s).")
+        if optimize_only:
+            optimize_forum_search(db)
+            print("Search index optimized.")
+        else:
+            indexed = rebuild_forum_search(db)
+            print(f"Search index rebuilt with {indexed} document(s) and optimized.")
+
+
+@app.cli.command('xp-windows-roll')
+def xp_windows_roll_command():
+    """Move the weekly/monthly leaderboard windows up to today (also done by the first view of a day)."""
+    with app.app_context():
+        rolled = roll_windows(get_db())
+    if not rolled:
+        print("Leaderboard windows are up to date.")
+    for period, days in rolled.items():
+        print(f"{period}: {days} day(s) expired.")
+
 if __name__ == '__main__':
     # Ensure DB is initialized before running the app for the first time
     # In a production environment, you might run `flask init-db` manually once.
     with app.app_context(): # Need app context for init_db if it uses get_db()
       init_db()
     # For now, Python will use the first definition of logout. # This comment also refers to the removed duplicate.
-kodefun-initial-build
     # TODO: In production, debug=True should be False. Use a WSGI server like Gunicorn instead of app.run().
-main
     app.run(debug=True, host='0.0.0.0', port=5001) # Running on a different port for clarity if needed
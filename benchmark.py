@@ -0,0 +1,1319 @@
+"""
+Load benchmarks for KodeFun's hot routes.
+
+Each scenario builds a throwaway SQLite database with a synthetic catalog and
+user base, drives the Flask app through its test client from several threads
+and prints requests/sec (or per-operation timings).
+
+Usage:
+    python benchmark.py                # run every scenario
+    python benchmark.py pool           # run selected scenarios
+"""
+import os
+import random
+import re
+import selectors
+import socket
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+from flask import g
+from werkzeug.security import generate_password_hash
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+import app as kodefun
+from db_pool import ConnectionPool
+from update_schema import migrate, ROWID_REBUILD_TABLES
+from achievement_backfill import run_backfill
+from catalog_cache import bump_catalog_version
+from dashboard_summary import DashboardCache, bump_dashboard_version
+from event_outbox import outbox_status
+from leaderboard import Leaderboard, sql_range, sql_rank
+from xp_windows import roll_windows
+from scope_leaderboard import TRACK_PAGE_SQL, PAGE_SIZE
+from forum_pages import encode_cursor, load_posts_page, load_threads_page
+from forum_search import search as search_forum
+from forum_markdown import render as render_markdown, RENDERER_VERSION
+from forum_unread import unread_counts, mark_category_read, mark_thread_read
+from view_counter import ViewCounter
+from xp_ledger import award_xp, reconcile
+
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'schema.sql')
+
+BENCH_THREADS = 8
+BENCH_SECONDS = 3.0
+
+
+# --- Fixture helpers ---
+def legacy_schema_sql():
+    """schema.sql as it was before migration 0003: core tables with MySQL-style, non-rowid ids."""
+    with open(SCHEMA_PATH) as f:
+        sql = f.read()
+    for table in ROWID_REBUILD_TABLES:
+        sql = re.sub(rf'(CREATE TABLE {table} \(\s+\w+) INTEGER PRIMARY KEY AUTOINCREMENT', r'\1 INT AUTO_INCREMENT PRIMARY KEY', sql)
+    return sql
+
+
+def build_fixture_db(db_path, users=1000, tracks=3, courses_per_track=12, progress_tracks=0, legacy_ids=False):
+    """
+    Creates a migrated database from schema.sql and fills it with a synthetic
+    catalog and users. progress_tracks gives every user a UserProgress row for
+    each course of that many tracks. legacy_ids stops before migration 0003.
+    """
+    conn = sqlite3.connect(db_path)
+    if legacy_ids:
+        conn.executescript(legacy_schema_sql())
+        migrate(conn, verbose=False, target=2)
+    else:
+        with open(SCHEMA_PATH) as f:
+            conn.executescript(f.read())
+        migrate(conn, verbose=False)
+
+    conn.execute("INSERT INTO LearningPaths (path_id, path_name, path_description) VALUES (1, 'Bench Path', 'Synthetic path')")
+    course_id = 0
+    assessment_id = 0
+    for track_id in range(1, tracks + 1):
+        conn.execute(
+            "INSERT INTO Tracks (track_id, track_name, track_description, path_id, total_duration_weeks) VALUES (?, ?, ?, 1, 16)",
+            (track_id, f'Bench Track {track_id}', 'Synthetic track')
+        )
+        for order in range(1, courses_per_track + 1):
+            course_id += 1
+            conn.execute(
+                """INSERT INTO Courses (course_id, track_id, course_name, course_level_number, duration_days, core_concepts, interactive_elements_description, order_in_track)
+                   VALUES (?, ?, ?, ?, 7, 'Concepts', 'Elements', ?)""",
+                (course_id, track_id, f'LEVEL {order}: Bench Course {course_id}', order, order)
+            )
+            for assessment_type, weight in (('Theory', 30), ('Practice', 30), ('Project', 25), ('Live Coding', 15)):
+                assessment_id += 1
+                conn.execute(
+                    "INSERT INTO Assessments (assessment_id, course_id, assessment_type, description, weight_percentage) VALUES (?, ?, ?, ?, ?)",
+                    (assessment_id, course_id, assessment_type, f'{assessment_type} {course_id}', weight)
+                )
+
+    password_hash = generate_password_hash('bench')
+    conn.executemany(
+        "INSERT INTO Users (user_id, username, email, password_hash, xp_points) VALUES (?, ?, ?, ?, ?)",
+        ((user_id, f'user{user_id}', f'user{user_id}@bench.local', password_hash, (user_id * 7919) % 5000)
+         for user_id in range(1, users + 1))
+    )
+    if not legacy_ids: # The legacy schema stops before migration 0006 creates XpLedger
+        conn.execute(
+            """INSERT INTO XpLedger (user_id, amount, reason, idempotency_key)
+               SELECT user_id, xp_points, 'opening_balance', 'opening_balance:' || user_id FROM Users WHERE xp_points <> 0"""
+        )
+    if progress_tracks:
+        conn.execute(
+            """INSERT INTO UserProgress (progress_id, user_id, course_id, status, total_score)
+               SELECT NULL, u.user_id, c.course_id, 'completed', 80 FROM Users u JOIN Courses c ON c.track_id <= ?""",
+            (progress_tracks,)
+        )
+        if legacy_ids:
+            conn.execute("UPDATE UserProgress SET progress_id = rowid")
+    conn.commit()
+    conn.close()
+
+
+def copy_db(src_path, dst_path):
+    """Copies a database file through the backup API so WAL contents are included."""
+    src = sqlite3.connect(src_path)
+    dst = sqlite3.connect(dst_path)
+    src.backup(dst)
+    src.close()
+    dst.close()
+
+
+def logged_in_client(user_id):
+    client = kodefun.app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = user_id
+        sess['username'] = f'user{user_id}'
+        sess['xp_points'] = 0
+    return client
+
+
+def run_load(urls, threads=BENCH_THREADS, seconds=BENCH_SECONDS):
+    """Hammers the given URLs from several threads and returns requests/sec."""
+    counts = [0] * threads
+    errors = []
+    deadline = time.perf_counter() + seconds
+
+    def worker(index):
+        client = logged_in_client(index + 1)
+        i = 0
+        while time.perf_counter() < deadline:
+            response = client.get(urls[i % len(urls)])
+            if response.status_code != 200:
+                errors.append(response.status_code)
+            i += 1
+        counts[index] = i
+
+    started = time.perf_counter()
+    workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - started
+    if errors:
+        print(f"  WARNING: {len(errors)} non-200 responses (first: {errors[0]})")
+    return sum(counts) / elapsed
+
+
+# --- Connection-per-request baseline used by the pool scenario ---
+def _legacy_get_db():
+    db = getattr(g, '_legacy_database', None)
+    if db is None:
+        db = g._legacy_database = sqlite3.connect(kodefun.app.config['DATABASE'])
+        db.row_factory = sqlite3.Row
+    return db
+
+
+def _legacy_close(exception):
+    db = g.pop('_legacy_database', None)
+    if db is not None:
+        db.close()
+
+
+# --- Scenarios ---
+def bench_pool(workdir):
+    """Connection pool (WAL, pragmas, statement cache) vs. a fresh connection per request."""
+    urls = ['/leaderboard', '/tracks/1/courses', '/tracks/2/courses']
+    base_path = os.path.join(workdir, 'pool_base.db')
+    build_fixture_db(base_path)
+    legacy_path = os.path.join(workdir, 'pool_legacy.db')
+    pooled_path = os.path.join(workdir, 'pool_pooled.db')
+    copy_db(base_path, legacy_path)
+    copy_db(base_path, pooled_path)
+
+    pooled_get_db, pooled_get_read_db = kodefun.get_db, kodefun.get_read_db
+    kodefun.app.teardown_appcontext(_legacy_close)
+    try:
+        kodefun.app.config['DATABASE'] = legacy_path
+        kodefun.get_db = kodefun.get_read_db = _legacy_get_db
+        run_load(urls, seconds=0.5)  # Warm up: initialises UserProgress rows
+        before = run_load(urls)
+    finally:
+        kodefun.get_db, kodefun.get_read_db = pooled_get_db, pooled_get_read_db
+
+    kodefun.app.config['DATABASE'] = pooled_path
+    run_load(urls, seconds=0.5)
+    after = run_load(urls)
+    kodefun.get_db_pool().close_all()
+
+    print(f"  connection per request : {before:8.1f} req/s")
+    print(f"  pooled WAL connections : {after:8.1f} req/s  ({after / before:.2f}x)")
+
+
+def time_point_lookups(conn, queries, lookups):
+    """Returns microseconds per lookup for each (label, sql, max_id) query."""
+    results = {}
+    for label, sql, max_id in queries:
+        ids = [random.randint(1, max_id) for _ in range(lookups)]
+        started = time.perf_counter()
+        for row_id in ids:
+            conn.execute(sql, (row_id,)).fetchone()
+        results[label] = (time.perf_counter() - started) / lookups * 1e6
+    return results
+
+
+def bench_rowid(workdir):
+    """Point lookups and row counts before/after the rowid-alias primary key rebuild (migration 0003)."""
+    users = 20000
+    db_path = os.path.join(workdir, 'rowid.db')
+    build_fixture_db(db_path, users=users, progress_tracks=1, legacy_ids=True)
+    conn = sqlite3.connect(db_path)
+    progress_rows = conn.execute("SELECT COUNT(*) FROM UserProgress").fetchone()[0]
+    queries = [
+        ('Users by user_id', "SELECT * FROM Users WHERE user_id = ?", users),
+        ('Courses by course_id', "SELECT * FROM Courses WHERE course_id = ?", 36),
+        ('UserProgress by progress_id', "SELECT * FROM UserProgress WHERE progress_id = ?", progress_rows),
+    ]
+    counts_before = {t: conn.execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0] for t in ROWID_REBUILD_TABLES}
+    before = time_point_lookups(conn, queries, 50000)
+
+    started = time.perf_counter()
+    migrate(conn, verbose=False)
+    rebuild_seconds = time.perf_counter() - started
+    counts_after = {t: conn.execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0] for t in ROWID_REBUILD_TABLES}
+    after = time_point_lookups(conn, queries, 50000)
+    conn.close()
+
+    print(f"  rebuild took {rebuild_seconds:.2f}s")
+    for table in ROWID_REBUILD_TABLES:
+        print(f"  {table:<18} rows before {counts_before[table]:>7}  after {counts_after[table]:>7}")
+    for label, _, _ in queries:
+        print(f"  {label:<28} {before[label]:6.2f} us -> {after[label]:6.2f} us")
+
+
+# Upper bound for course_detail's statements once the catalog is cached: the
+# UserProgress row plus the quiz availability lookup.
+COURSE_DETAIL_MAX_STATEMENTS = 2
+
+
+def add_course_assessments(db_path, course_id, count):
+    """Adds `count` Theory (with a quiz) and Practice (with an exercise) assessment pairs to a course."""
+    conn = sqlite3.connect(db_path)
+    for n in range(count):
+        theory_id = conn.execute(
+            "INSERT INTO Assessments (course_id, assessment_type, description, weight_percentage) VALUES (?, 'Theory', ?, 1)",
+            (course_id, f'Extra quiz {n}')
+        ).lastrowid
+        question_id = conn.execute(
+            "INSERT INTO QuizQuestions (assessment_id, question_text) VALUES (?, 'Question?')", (theory_id,)
+        ).lastrowid
+        conn.execute("INSERT INTO QuizChoices (question_id, choice_text, is_correct) VALUES (?, 'Answer', 1)", (question_id,))
+        practice_id = conn.execute(
+            "INSERT INTO Assessments (course_id, assessment_type, description, weight_percentage) VALUES (?, 'Practice', ?, 1)",
+            (course_id, f'Extra exercise {n}')
+        ).lastrowid
+        conn.execute(
+            "INSERT INTO CodingExercises (assessment_id, title, description) VALUES (?, 'Exercise', 'Synthetic exercise')",
+            (practice_id,)
+        )
+    conn.commit()
+    conn.close()
+
+
+def bench_course_detail(workdir):
+    """course_detail statement count and throughput as the number of assessments grows."""
+    for extra in (0, 50, 500):
+        db_path = os.path.join(workdir, f'course_detail_{extra}.db')
+        build_fixture_db(db_path, users=BENCH_THREADS)
+        add_course_assessments(db_path, 1, extra)
+        kodefun.app.config['DATABASE'] = db_path
+        run_load(['/tracks/1/courses'], seconds=0.2)  # Initialises UserProgress, course 1 unlocked
+
+        client = logged_in_client(1)
+        client.get('/courses/1')  # Loads the catalog
+        response = client.get('/courses/1')
+        statements = kodefun.get_profile_store().recent(1)[0]['statements']
+        if response.status_code != 200 or statements > COURSE_DETAIL_MAX_STATEMENTS:
+            raise AssertionError(
+                f"course_detail with {4 + 2 * extra} assessments: HTTP {response.status_code}, "
+                f"{statements} statements (limit {COURSE_DETAIL_MAX_STATEMENTS})"
+            )
+        rate = run_load(['/courses/1'])
+        kodefun.get_db_pool().close_all()
+        print(f"  {4 + 2 * extra:>5} assessments : {statements} statements, {rate:8.1f} req/s")
+
+
+def _legacy_award(conn, user_id, amount):
+    """The old read-modify-write on Users.xp_points."""
+    current = conn.execute("SELECT xp_points FROM Users WHERE user_id = ?", (user_id,)).fetchone()[0]
+    conn.execute("UPDATE Users SET xp_points = ? WHERE user_id = ?", ((current or 0) + amount, user_id))
+    conn.commit()
+
+
+def _ledger_award(conn, user_id, amount, key):
+    award_xp(conn, user_id, amount, 'stress', None, key)
+    conn.commit()
+
+
+def hammer_awards(db_path, award, threads=16, awards_per_thread=200, users=4):
+    """Runs award(conn, user_id, n) from many threads, each on its own pooled connection; returns elapsed seconds."""
+    pool = ConnectionPool(db_path, size=threads)
+
+    def worker(index):
+        conn = pool.acquire()
+        try:
+            for n in range(awards_per_thread):
+                award(conn, 1 + (index + n) % users, index * awards_per_thread + n)
+        finally:
+            pool.release(conn)
+
+    started = time.perf_counter()
+    workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - started
+    pool.close_all()
+    return elapsed
+
+
+def bench_xp_ledger(workdir):
+    """Concurrent XP awards: read-modify-write vs. the XpLedger with relative updates (must lose nothing)."""
+    threads, per_thread, users = 16, 200, 4
+    expected = threads * per_thread  # Every award is worth 1 XP
+    for label, make_award in (
+        ('read-modify-write', lambda conn, user_id, n: _legacy_award(conn, user_id, 1)),
+        ('XpLedger', lambda conn, user_id, n: _ledger_award(conn, user_id, 1, f'stress:{n}')),
+    ):
+        db_path = os.path.join(workdir, f'xp_{label}.db')
+        build_fixture_db(db_path, users=users, tracks=1, courses_per_track=1)
+        conn = sqlite3.connect(db_path)
+        conn.execute("UPDATE Users SET xp_points = 0")
+        conn.execute("DELETE FROM XpLedger")
+        conn.commit()
+        elapsed = hammer_awards(db_path, make_award, threads, per_thread, users)
+        total = conn.execute("SELECT SUM(xp_points) FROM Users").fetchone()[0]
+        drift = reconcile(conn) if label == 'XpLedger' else []
+        conn.close()
+        print(f"  {label:<18} {expected / elapsed:8.1f} awards/s, {total}/{expected} XP kept ({expected - total} lost)")
+        if label == 'XpLedger' and (total != expected or drift):
+            raise AssertionError(f"XpLedger lost updates: {total}/{expected} XP, {len(drift)} user(s) drifted from the ledger")
+
+    # Replaying the same idempotency keys must not award anything twice.
+    hammer_awards(db_path, lambda conn, user_id, n: _ledger_award(conn, user_id, 1, f'stress:{n}'), threads, per_thread, users)
+    conn = sqlite3.connect(db_path)
+    total = conn.execute("SELECT SUM(xp_points) FROM Users").fetchone()[0]
+    conn.close()
+    print(f"  replayed keys      {total}/{expected} XP after replay")
+    if total != expected:
+        raise AssertionError(f"Replayed idempotency keys changed the XP total ({total} != {expected})")
+
+
+BACKFILL_USERS = 1000000
+
+
+def add_fixture_achievements(conn):
+    """Achievements with one rule of each course-based trigger, over the synthetic catalog."""
+    conn.executemany(
+        "INSERT INTO Achievements (achievement_name, xp_bonus, trigger_event, rule) VALUES (?, ?, ?, ?)",
+        [
+            ('Bench First Steps', 25, 'course_completed', '{"courses": ["LEVEL 1: Bench Course 1"]}'),
+            ('Bench Pair', 40, 'course_completed', '{"courses": ["LEVEL 2: Bench Course 2", "LEVEL 3: Bench Course 3"]}'),
+            ('Bench Five', 50, 'course_count', '{"min_completed": 5}'),
+            ('Bench Halfway', 75, 'track_progress', '{"min_completed": 6, "min_track_courses": 10}'),
+            ('Bench Track', 200, 'track_completed', '{}'),
+        ]
+    )
+    bump_catalog_version(conn)
+    conn.commit()
+
+
+def bench_award_backfill(workdir):
+    """flask award-backfill over a synthetic million-user database (set-based shards, process pool, checkpoints)."""
+    db_path = os.path.join(workdir, 'backfill.db')
+    started = time.perf_counter()
+    build_fixture_db(db_path, users=BACKFILL_USERS, tracks=1, courses_per_track=12)
+    conn = sqlite3.connect(db_path)
+    # Every user completed the first (user_id % 13) courses of the track: 0 to 12, about 6 each
+    conn.execute(
+        """INSERT INTO UserProgress (user_id, course_id, status, total_score)
+           SELECT u.user_id, c.course_id, 'completed', 80
+           FROM Users u JOIN Courses c ON c.order_in_track <= u.user_id % 13"""
+    )
+    conn.commit()
+    add_fixture_achievements(conn)
+    progress_rows = conn.execute("SELECT COUNT(*) FROM UserProgress").fetchone()[0]
+    print(f"  fixture: {BACKFILL_USERS:,} users, {progress_rows:,} progress rows ({time.perf_counter() - started:.1f}s)")
+
+    for workers in (1, 4):
+        result = run_backfill(db_path, workers=workers, restart=True, log=lambda message: None)
+        print(f"  {workers} worker(s): {result['awards']:,} awards, {result['users'] / result['seconds']:,.0f} users/s")
+        if workers == 1:
+            first_awards = result['awards']
+            # Resetting the awards lets the next run do the same work again.
+            conn.execute("DELETE FROM UserAchievements")
+            conn.execute("DELETE FROM XpLedger WHERE reason = 'achievement'")
+            conn.execute("UPDATE Users SET xp_points = (SELECT COALESCE(SUM(amount), 0) FROM XpLedger l WHERE l.user_id = Users.user_id)")
+            conn.commit()
+        elif result['awards'] != first_awards:
+            raise AssertionError(f"Parallel backfill awarded {result['awards']} achievements, serial run {first_awards}")
+
+    resumed = run_backfill(db_path, workers=4, log=lambda message: None)
+    drift = reconcile(conn)
+    conn.close()
+    print(f"  rerun without --restart: {resumed['shards']} shard(s) processed, {resumed['skipped']} skipped")
+    if resumed['shards'] or drift:
+        raise AssertionError(f"Backfill rerun processed {resumed['shards']} shard(s); {len(drift)} user(s) drifted from the XP ledger")
+
+
+COMPLETION_USERS = 200
+
+
+def bench_course_completion(workdir):
+    """evaluate_course_completion with the handlers run in the request ('inline') vs. on the outbox worker thread."""
+    for delivery in ('inline', 'thread'):
+        db_path = os.path.join(workdir, f'completion_{delivery}.db')
+        build_fixture_db(db_path, users=COMPLETION_USERS, tracks=1, courses_per_track=12)
+        conn = sqlite3.connect(db_path)
+        add_fixture_achievements(conn)
+        conn.execute(
+            """INSERT INTO UserProgress (user_id, course_id, status, total_score)
+               SELECT user_id, 1, 'in_progress', 90 FROM Users"""
+        )
+        conn.commit()
+        kodefun.app.config['DATABASE'] = db_path
+        kodefun.app.config['EVENT_DELIVERY'] = delivery
+
+        timings = []
+        statements = []
+        for user_id in range(1, COMPLETION_USERS + 1):
+            client = logged_in_client(user_id)
+            started = time.perf_counter()
+            response = client.post('/evaluate_course_completion/1')
+            timings.append(time.perf_counter() - started)
+            statements.append(kodefun.get_profile_store().recent(1)[0]['statements'])
+            if response.status_code != 302:
+                raise AssertionError(f"evaluate_course_completion returned HTTP {response.status_code}")
+
+        deadline = time.perf_counter() + 30
+        while outbox_status(conn)['counts'].get('pending', {}).get('count') and time.perf_counter() < deadline:
+            time.sleep(0.05)
+        status = outbox_status(conn)
+        unlocked = conn.execute("SELECT COUNT(*) FROM UserProgress WHERE course_id = 2 AND status = 'unlocked'").fetchone()[0]
+        awarded = conn.execute("SELECT COUNT(*) FROM UserAchievements").fetchone()[0]
+        drift = reconcile(conn)
+        conn.close()
+        kodefun.get_db_pool().close_all()
+
+        timings.sort()
+        lag = status['lag']
+        print(f"  {delivery:<6}: {max(statements)} statements/request, p50 {timings[len(timings) // 2] * 1000:.2f}ms, "
+              f"p95 {timings[int(len(timings) * 0.95)] * 1000:.2f}ms; handler lag p50 {lag['p50_ms']:.1f}ms, p95 {lag['p95_ms']:.1f}ms")
+        done = status['counts'].get('done', {}).get('count', 0)
+        if done != COMPLETION_USERS or unlocked != COMPLETION_USERS or awarded != COMPLETION_USERS or drift:
+            raise AssertionError(
+                f"{delivery}: {done} events done, {unlocked} courses unlocked, {awarded} achievements, "
+                f"{len(drift)} user(s) drifted (expected {COMPLETION_USERS} each and no drift)"
+            )
+    kodefun.app.config['EVENT_DELIVERY'] = 'thread'
+
+
+DASHBOARD_USERS = 50000
+DASHBOARD_ACTIVE_USERS = 200
+DASHBOARD_REQUESTS = 3000
+DASHBOARD_WRITE_RATIO = 0.1  # Share of requests preceded by a write that invalidates the user's dashboard
+DASHBOARD_P99_BUDGET_MS = 15.0
+
+
+def bench_dashboard(workdir):
+    """Dashboard latency with the per-user summary cache vs. computing it on every request (p99 budget enforced)."""
+    db_path = os.path.join(workdir, 'dashboard.db')
+    build_fixture_db(db_path, users=DASHBOARD_USERS, tracks=3, courses_per_track=12)
+    conn = sqlite3.connect(db_path)
+    add_fixture_achievements(conn)
+    # Active users are halfway through track 1, with a couple of achievements
+    conn.execute(
+        """INSERT INTO UserProgress (user_id, course_id, status, total_score, last_attempt_at)
+           SELECT u.user_id, c.course_id, CASE WHEN c.order_in_track <= 6 THEN 'completed' ELSE 'unlocked' END, 80, '2026-01-01 10:00:00'
+           FROM Users u JOIN Courses c ON c.track_id = 1 WHERE u.user_id <= ?""",
+        (DASHBOARD_ACTIVE_USERS,)
+    )
+    conn.execute(
+        """INSERT INTO UserAchievements (user_id, achievement_id, unlocked_at)
+           SELECT u.user_id, a.achievement_id, '2026-01-01 10:00:00' FROM Users u JOIN Achievements a
+           WHERE u.user_id <= ? AND a.achievement_name IN ('Bench First Steps', 'Bench Five')""",
+        (DASHBOARD_ACTIVE_USERS,)
+    )
+    conn.commit()
+    kodefun.app.config['DATABASE'] = db_path
+
+    budget_failures = []
+    for label, cache_size in (('uncached', 0), ('cached', DASHBOARD_ACTIVE_USERS)):
+        kodefun.get_db_pool()  # Switching DATABASE resets the caches
+        kodefun.app.extensions['dashboard_cache'] = DashboardCache(cache_size, kodefun.app.config['DASHBOARD_RANK_TTL'])
+        clients = {}
+        rng = random.Random(14)
+        timings = []
+        statements = []
+        for _ in range(DASHBOARD_REQUESTS):
+            user_id = rng.randint(1, DASHBOARD_ACTIVE_USERS)
+            if rng.random() < DASHBOARD_WRITE_RATIO:
+                bump_dashboard_version(conn, user_id)
+                conn.commit()
+            client = clients.get(user_id) or clients.setdefault(user_id, logged_in_client(user_id))
+            started = time.perf_counter()
+            response = client.get('/dashboard')
+            timings.append(time.perf_counter() - started)
+            statements.append(kodefun.get_profile_store().recent(1)[0]['statements'])
+            if response.status_code != 200:
+                raise AssertionError(f"/dashboard returned HTTP {response.status_code}")
+        timings.sort()
+        p50, p99 = timings[len(timings) // 2] * 1000, timings[int(len(timings) * 0.99)] * 1000
+        cache = kodefun.get_dashboard_cache()
+        spread = ', '.join(f"{n} x{count}" for n, count in sorted(Counter(statements).items()))
+        print(f"  {label:<8}: p50 {p50:.2f}ms, p99 {p99:.2f}ms; {cache.hits} hits / {cache.misses} misses; "
+              f"statements per request: {spread}")
+        if label == 'cached' and p99 > DASHBOARD_P99_BUDGET_MS:
+            budget_failures.append(f"p99 {p99:.2f}ms")
+        kodefun.get_db_pool().close_all()
+    conn.close()
+    kodefun.app.extensions.pop('dashboard_cache', None)
+    if budget_failures:
+        raise AssertionError(f"Cached dashboard over its {DASHBOARD_P99_BUDGET_MS}ms p99 budget: {', '.join(budget_failures)}")
+
+
+LEADERBOARD_USERS = 1000000
+LEADERBOARD_LOOKUPS = 2000
+LEADERBOARD_SQL_LOOKUPS = 200  # SQL rank/around counts index entries: fewer samples keep the run short
+LEADERBOARD_AWARDS = 5000
+
+
+def time_per_op(operation, args):
+    started = time.perf_counter()
+    results = [operation(arg) for arg in args]
+    return (time.perf_counter() - started) / len(args) * 1000, results
+
+
+def bench_leaderboard(workdir):
+    """Top-N, rank-of-user and users-around-me at 1M users: in-memory order-statistic board vs. SQL."""
+    db_path = os.path.join(workdir, 'leaderboard.db')
+    started = time.perf_counter()
+    build_fixture_db(db_path, users=LEADERBOARD_USERS, tracks=1, courses_per_track=1)
+    print(f"  fixture: {LEADERBOARD_USERS:,} users ({time.perf_counter() - started:.1f}s)")
+    conn = sqlite3.connect(db_path)
+    board = Leaderboard(sync_interval=0)
+    board.seed(conn)
+    print(f"  seed: {board.seed_seconds:.2f}s for {len(board):,} users")
+
+    rng = random.Random(15)
+    users = [rng.randint(1, LEADERBOARD_USERS) for _ in range(LEADERBOARD_LOOKUPS)]
+    sql_users = users[:LEADERBOARD_SQL_LOOKUPS]
+    ops = [
+        ('top 20', lambda user_id: board.top(20), lambda user_id: sql_range(conn, 1, 20)),
+        ('rank', board.rank, lambda user_id: sql_rank(conn, user_id)),
+        ('around +-3', board.around, lambda user_id: sql_range(conn, sql_rank(conn, user_id) - 3, 7)),
+    ]
+    for label, memory_op, sql_op in ops:
+        memory_ms, memory_results = time_per_op(memory_op, users)
+        sql_ms, sql_results = time_per_op(sql_op, sql_users)
+        if memory_results[:LEADERBOARD_SQL_LOOKUPS] != sql_results:
+            raise AssertionError(f"{label}: in-memory results differ from SQL")
+        print(f"  {label:<10}: memory {memory_ms * 1000:.1f}us, SQL {sql_ms:.2f}ms per lookup ({sql_ms / memory_ms:,.0f}x)")
+
+    for i in range(LEADERBOARD_AWARDS):
+        award_xp(conn, rng.randint(1, LEADERBOARD_USERS), rng.choice((25, 100, 200)), 'bench', None, f'bench_lb:{i}')
+    conn.commit()
+    started = time.perf_counter()
+    applied = board.sync(conn)
+    print(f"  sync: {applied:,} ledger entries applied in {(time.perf_counter() - started) * 1000:.1f}ms")
+    mismatched = [user_id for user_id in sql_users if board.rank(user_id) != sql_rank(conn, user_id)]
+    conn.close()
+    if applied != LEADERBOARD_AWARDS or mismatched:
+        raise AssertionError(f"Sync applied {applied}/{LEADERBOARD_AWARDS} awards; {len(mismatched)} rank(s) differ from SQL")
+
+    kodefun.app.config['DATABASE'] = db_path
+    for label, in_memory in (('SQL', False), ('memory', True)):
+        kodefun.app.config['LEADERBOARD_IN_MEMORY'] = in_memory
+        kodefun.get_db_pool()
+        if in_memory:
+            kodefun.app.extensions['leaderboard'] = board
+        timings = []
+        for user_id in users[:LEADERBOARD_SQL_LOOKUPS]:
+            client = logged_in_client(user_id)
+            started = time.perf_counter()
+            response = client.get('/leaderboard')
+            timings.append(time.perf_counter() - started)
+            if response.status_code != 200:
+                raise AssertionError(f"/leaderboard returned HTTP {response.status_code}")
+        timings.sort()
+        print(f"  /leaderboard ({label:<6}): p50 {timings[len(timings) // 2] * 1000:.2f}ms, "
+              f"p99 {timings[int(len(timings) * 0.99)] * 1000:.2f}ms")
+        kodefun.get_db_pool().close_all()
+    kodefun.app.config['LEADERBOARD_IN_MEMORY'] = True
+    kodefun.app.extensions.pop('leaderboard', None)
+
+
+WINDOW_USERS = 20000
+WINDOW_EVENT_VOLUMES = (100000, 1000000)
+WINDOW_HISTORY_DAYS = 120
+WINDOW_REQUESTS = 300
+
+
+def bench_windowed_leaderboard(workdir):
+    """Weekly/monthly leaderboards from the rolling XpWindowTotals rollup as ledger history grows 10x."""
+    for volume in WINDOW_EVENT_VOLUMES:
+        db_path = os.path.join(workdir, f'windows_{volume}.db')
+        build_fixture_db(db_path, users=WINDOW_USERS, tracks=1, courses_per_track=1)
+        conn = sqlite3.connect(db_path)
+        rng = random.Random(16)
+        now = datetime.utcnow()
+        started = time.perf_counter()
+        conn.executemany(
+            "INSERT INTO XpLedger (user_id, amount, reason, created_at) VALUES (?, ?, 'bench', ?)",
+            ((rng.randint(1, WINDOW_USERS), rng.choice((10, 25, 100)), now - timedelta(seconds=rng.randint(0, WINDOW_HISTORY_DAYS * 86400)))
+             for _ in range(volume))
+        )
+        conn.commit()
+        insert_seconds = time.perf_counter() - started
+        started = time.perf_counter()
+        rolled = roll_windows(conn, (now + timedelta(days=1)).date())
+        roll_ms = (time.perf_counter() - started) * 1000
+        kodefun.app.config['DATABASE'] = db_path
+        results = []
+        for window in ('week', 'month'):
+            timings = []
+            statements = set()
+            for _ in range(WINDOW_REQUESTS):
+                client = logged_in_client(rng.randint(1, WINDOW_USERS))
+                started = time.perf_counter()
+                response = client.get(f'/leaderboard?window={window}')
+                timings.append(time.perf_counter() - started)
+                statements.add(kodefun.get_profile_store().recent(1)[0]['statements'])
+                if response.status_code != 200:
+                    raise AssertionError(f"/leaderboard?window={window} returned HTTP {response.status_code}")
+            timings.sort()
+            results.append(f"{window} p50 {timings[len(timings) // 2] * 1000:.2f}ms / p99 {timings[int(len(timings) * 0.99)] * 1000:.2f}ms "
+                           f"({'-'.join(str(n) for n in sorted(statements))} statements)")
+        kodefun.get_db_pool().close_all()
+        conn.close()
+        print(f"  {volume:>9,} events ({insert_seconds:.1f}s to insert through the trigger): "
+              f"roll {rolled} in {roll_ms:.1f}ms; " + '; '.join(results))
+
+
+TRACK_BOARD_USERS = 200000
+TRACK_BOARD_PAGES = (1, 100, 5000)
+TRACK_BOARD_REPEATS = 50
+# The same page through OFFSET, for comparison
+TRACK_OFFSET_SQL = """
+    SELECT user_id, completed_count, total_score FROM UserTrackSummary
+    WHERE track_id = ? AND (completed_count, total_score) > (0, 0)
+    ORDER BY completed_count DESC, total_score DESC, user_id DESC
+    LIMIT ? OFFSET ?
+"""
+
+
+def bench_track_leaderboard(workdir):
+    """Per-track leaderboard pages at increasing depth: keyset cursor vs. OFFSET."""
+    db_path = os.path.join(workdir, 'track_board.db')
+    build_fixture_db(db_path, users=TRACK_BOARD_USERS, tracks=1, courses_per_track=3)
+    conn = sqlite3.connect(db_path)
+    started = time.perf_counter()
+    conn.execute(
+        """INSERT INTO UserProgress (user_id, course_id, status, total_score)
+           SELECT u.user_id, c.course_id, CASE WHEN (u.user_id + c.course_id) % 3 THEN 'completed' ELSE 'in_progress' END,
+                  (u.user_id * 31 + c.course_id * 17) % 101
+           FROM Users u JOIN Courses c"""
+    )
+    conn.commit()
+    print(f"  fixture: {TRACK_BOARD_USERS:,} learners on one track, summaries built by the triggers in {time.perf_counter() - started:.1f}s")
+    for page in TRACK_BOARD_PAGES:
+        offset = (page - 1) * PAGE_SIZE
+        # The cursor a reader arriving at this page would hold: the previous page's last row
+        key = conn.execute(TRACK_OFFSET_SQL, (1, 1, offset - 1)).fetchone() if offset else None
+        cursor_key = (key[1], key[2], key[0]) if key else (2 ** 63 - 1,) * 3
+        timings = {}
+        results = {}
+        for label, sql, params in (('keyset', TRACK_PAGE_SQL, (1, *cursor_key, PAGE_SIZE)),
+                                   ('OFFSET', TRACK_OFFSET_SQL, (1, PAGE_SIZE, offset))):
+            started = time.perf_counter()
+            for _ in range(TRACK_BOARD_REPEATS):
+                results[label] = conn.execute(sql, params).fetchall()
+            timings[label] = (time.perf_counter() - started) / TRACK_BOARD_REPEATS * 1000
+        if results['keyset'] != results['OFFSET']:
+            raise AssertionError(f"Page {page}: keyset and OFFSET pages differ")
+        print(f"  page {page:>5,}: keyset {timings['keyset']:.3f}ms, OFFSET {timings['OFFSET']:.3f}ms")
+
+    kodefun.app.config['DATABASE'] = db_path
+    client = logged_in_client(TRACK_BOARD_USERS // 2)
+    url, pages, timings = '/tracks/1/leaderboard', 0, []
+    while url and pages < 50:
+        started = time.perf_counter()
+        response = client.get(url)
+        timings.append(time.perf_counter() - started)
+        if response.status_code != 200:
+            raise AssertionError(f"{url} returned HTTP {response.status_code}")
+        match = re.search(r'href="(/tracks/1/leaderboard\?after=[^"]+)"', response.get_data(as_text=True))
+        url = match.group(1) if match else None
+        pages += 1
+    timings.sort()
+    print(f"  /tracks/1/leaderboard: {pages} pages followed, p50 {timings[len(timings) // 2] * 1000:.2f}ms")
+    kodefun.get_db_pool().close_all()
+    conn.close()
+
+
+FORUM_THREADS = 2000
+FORUM_POST_VOLUMES = (20000, 200000)
+FORUM_REPEATS = 20
+# The category listing as it was before the thread counters
+LEGACY_CATEGORY_THREADS_SQL = """
+    SELECT t.thread_id, t.title, t.created_at, u.username, COUNT(p.post_id) as post_count, MAX(p.created_at) as last_post_time
+    FROM ForumThreads t
+    JOIN Users u ON t.user_id = u.user_id
+    LEFT JOIN ForumPosts p ON t.thread_id = p.thread_id
+    WHERE t.category_id = ?
+    GROUP BY t.thread_id, t.title, t.created_at, u.username
+    ORDER BY last_post_time DESC, t.created_at DESC
+"""
+
+
+def bench_forum_category(workdir):
+    """Forum category listing: a page from the denormalized thread counters vs. aggregating ForumPosts, as posts grow 10x."""
+    for posts in FORUM_POST_VOLUMES:
+        db_path = os.path.join(workdir, f'forum_{posts}.db')
+        build_fixture_db(db_path, users=1000, tracks=1, courses_per_track=1)
+        conn = sqlite3.connect(db_path)
+        rng = random.Random(18)
+        conn.execute("INSERT INTO ForumCategories (category_id, name, description) VALUES (1, 'Bench', 'Synthetic category')")
+        conn.executemany("INSERT INTO ForumThreads (thread_id, category_id, user_id, title) VALUES (?, 1, ?, ?)",
+                         ((thread_id, rng.randint(1, 1000), f'Thread {thread_id}') for thread_id in range(1, FORUM_THREADS + 1)))
+        started = time.perf_counter()
+        conn.executemany(
+            "INSERT INTO ForumPosts (thread_id, user_id, content, created_at) VALUES (?, ?, 'Synthetic post', ?)",
+            ((rng.randint(1, FORUM_THREADS), rng.randint(1, 1000), f"2026-01-{rng.randint(1, 28):02d} {rng.randint(0, 23):02d}:00:00")
+             for _ in range(posts))
+        )
+        conn.commit()
+        insert_seconds = time.perf_counter() - started
+        conn.row_factory = sqlite3.Row
+        started = time.perf_counter()
+        for _ in range(FORUM_REPEATS):
+            aggregate = conn.execute(LEGACY_CATEGORY_THREADS_SQL, (1,)).fetchall()
+        aggregate_ms = (time.perf_counter() - started) / FORUM_REPEATS * 1000
+        started = time.perf_counter()
+        for _ in range(FORUM_REPEATS):
+            load_threads_page(conn, 1)
+        page_ms = (time.perf_counter() - started) / FORUM_REPEATS * 1000
+        # Walking every page lists the same threads, counts and last-post times as the aggregate
+        listed, page = {}, {'next': None}
+        while True:
+            page = load_threads_page(conn, 1, after=page['next'])
+            listed.update((row['thread_id'], (row['post_count'], row['last_post_time'])) for row in page['rows'])
+            if not page['next']:
+                break
+        conn.close()
+        if listed != {row['thread_id']: (row['post_count'], row['last_post_time']) for row in aggregate}:
+            raise AssertionError(f"{posts} posts: counter listing differs from the aggregate")
+        print(f"  {posts:>7,} posts ({insert_seconds:.1f}s to insert through the triggers): "
+              f"aggregate {aggregate_ms:.2f}ms per listing, counters {page_ms:.2f}ms per page")
+
+
+FORUM_THREAD_SIZES = (1000, 10000, 100000)
+# The thread view as it was before keyset pages: every post at once
+LEGACY_THREAD_POSTS_SQL = """
+    SELECT p.post_id, p.content, p.created_at, u.username
+    FROM ForumPosts p
+    JOIN Users u ON p.user_id = u.user_id
+    WHERE p.thread_id = ?
+    ORDER BY p.created_at ASC
+"""
+
+
+def bench_forum_pagination(workdir):
+    """Forum thread view: one keyset page (first, middle, latest) vs. loading every post, as threads grow 100x."""
+    db_path = os.path.join(workdir, 'forum_pages.db')
+    build_fixture_db(db_path, users=1000, tracks=1, courses_per_track=1)
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    rng = random.Random(19)
+    start = datetime(2026, 1, 1)
+    conn.execute("INSERT INTO ForumCategories (category_id, name, description) VALUES (1, 'Bench', 'Synthetic category')")
+    for thread_id, size in enumerate(FORUM_THREAD_SIZES, 1):
+        conn.execute("INSERT INTO ForumThreads (thread_id, category_id, user_id, title) VALUES (?, 1, 1, ?)",
+                     (thread_id, f'{size} replies'))
+        conn.executemany(
+            "INSERT INTO ForumPosts (thread_id, user_id, content, created_at) VALUES (?, ?, ?, ?)",
+            ((thread_id, rng.randint(1, 1000), f'Synthetic reply {i} ' * 20, (start + timedelta(seconds=i // 3)).isoformat(' '))
+             for i in range(size))
+        )
+    conn.commit()
+    kodefun.app.config['DATABASE'] = db_path
+    client = logged_in_client(1)
+    for thread_id, size in enumerate(FORUM_THREAD_SIZES, 1):
+        middle = conn.execute("SELECT created_at, post_id FROM ForumPosts WHERE thread_id = ? ORDER BY created_at, post_id LIMIT 1 OFFSET ?",
+                              (thread_id, size // 2)).fetchone()
+        pages = {'first': {}, 'middle': {'after': encode_cursor(*middle)}, 'latest': {'latest': True}}
+        results = []
+        for label, args in pages.items():
+            started = time.perf_counter()
+            for _ in range(FORUM_REPEATS):
+                page = load_posts_page(conn, thread_id, **args)
+            results.append(f"{label} {(time.perf_counter() - started) / FORUM_REPEATS * 1000:.2f}ms")
+            if len(page['rows']) != 25:
+                raise AssertionError(f"{size} posts: {label} page has {len(page['rows'])} posts")
+        started = time.perf_counter()
+        every = conn.execute(LEGACY_THREAD_POSTS_SQL, (thread_id,)).fetchall()
+        every_ms = (time.perf_counter() - started) * 1000
+        # The last page is the tail of the full listing
+        if [row['post_id'] for row in page['rows']] != [row['post_id'] for row in every[-25:]]:
+            raise AssertionError(f"{size} posts: latest page is not the end of the thread")
+        timings, size_kb = [], 0
+        for url in (f'/forum/thread/{thread_id}', f'/forum/thread/{thread_id}?page=latest') * 10:
+            started = time.perf_counter()
+            response = client.get(url)
+            timings.append(time.perf_counter() - started)
+            if response.status_code != 200:
+                raise AssertionError(f"{url} returned HTTP {response.status_code}")
+            size_kb = len(response.get_data()) / 1024
+        timings.sort()
+        print(f"  {size:>7,} posts: page {', '.join(results)}; every post {every_ms:.1f}ms; "
+              f"route p50 {timings[len(timings) // 2] * 1000:.2f}ms, {size_kb:.0f}KB")
+    kodefun.get_db_pool().close_all()
+    conn.close()
+
+
+FORUM_SEARCH_VOLUMES = (20000, 200000)
+FORUM_SEARCH_WORDS = ('loop', 'array', 'function', 'recursion', 'class', 'variable', 'python', 'javascript', 'error', 'syntax',
+                      'index', 'string', 'return', 'object', 'module', 'import', 'closure', 'promise', 'lambda', 'generator')
+# What a search had to be without the index: a substring scan, unranked, stopping at the first page
+LIKE_SEARCH_SQL = """
+    SELECT p.post_id, p.thread_id FROM ForumPosts p JOIN ForumThreads t ON t.thread_id = p.thread_id
+    WHERE p.content LIKE ? OR t.title LIKE ?
+    LIMIT 21
+"""
+
+
+def bench_forum_search(workdir):
+    """Forum search through the FTS5 index (ranked, with snippets) vs. a LIKE scan, as posts grow 10x."""
+    for posts in FORUM_SEARCH_VOLUMES:
+        db_path = os.path.join(workdir, f'forum_search_{posts}.db')
+        build_fixture_db(db_path, users=1000, tracks=1, courses_per_track=1)
+        conn = sqlite3.connect(db_path)
+        conn.row_factory = sqlite3.Row
+        rng = random.Random(20)
+        conn.execute("INSERT INTO ForumCategories (category_id, name, description) VALUES (1, 'Bench', 'Synthetic category')")
+        conn.executemany("INSERT INTO ForumThreads (thread_id, category_id, user_id, title) VALUES (?, 1, ?, ?)",
+                         ((thread_id, rng.randint(1, 1000), ' '.join(rng.sample(FORUM_SEARCH_WORDS, 4)))
+                          for thread_id in range(1, FORUM_THREADS + 1)))
+        started = time.perf_counter()
+        conn.executemany(
+            "INSERT INTO ForumPosts (thread_id, user_id, content) VALUES (?, ?, ?)",
+            ((rng.randint(1, FORUM_THREADS), rng.randint(1, 1000),
+              ' '.join(rng.choices(FORUM_SEARCH_WORDS, k=2) + [f'word{rng.randint(1, 5000)}' for _ in range(30)]) + f' ticket{i}')
+             for i in range(posts))
+        )
+        conn.commit()
+        insert_seconds = time.perf_counter() - started
+        # A rare term (one post) and a two-word query matching about 1% of posts
+        queries = {'rare': f'ticket{posts // 2}', 'common': 'closure promise'}
+        results = []
+        for label, text in queries.items():
+            started = time.perf_counter()
+            for _ in range(FORUM_REPEATS):
+                page = search_forum(conn, text)
+            fts_ms = (time.perf_counter() - started) / FORUM_REPEATS * 1000
+            pattern = f"%{text.split()[0]}%"
+            started = time.perf_counter()
+            conn.execute(LIKE_SEARCH_SQL, (pattern, pattern)).fetchall()
+            like_ms = (time.perf_counter() - started) * 1000
+            if not page['results']:
+                raise AssertionError(f"{posts} posts: no results for {text!r}")
+            results.append(f"{label} fts {fts_ms:.2f}ms / like {like_ms:.2f}ms")
+        conn.close()
+        print(f"  {posts:>7,} posts ({insert_seconds:.1f}s to insert through the triggers): {', '.join(results)}")
+
+
+
+FORUM_LIVE_SUBSCRIBERS = 1000
+FORUM_LIVE_POSTS = 20
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+def open_event_streams(port, path, cookie, count):
+    """Opens `count` raw HTTP connections to an SSE endpoint and returns them once every response has started."""
+    streams = []
+    for _ in range(count):
+        sock = socket.create_connection(('127.0.0.1', port))
+        sock.sendall(f"GET {path} HTTP/1.1\r\nHost: localhost\r\nCookie: {cookie}\r\nAccept: text/event-stream\r\n\r\n".encode())
+        streams.append(sock)
+    buffers, _ = read_event_streams(streams, lambda data: b'retry:' in data, timeout=60)
+    return streams, buffers
+
+
+def read_event_streams(streams, done, timeout, buffers=None):
+    """Reads every stream until done(data) holds for each; returns {socket: data} and when each finished."""
+    buffers = buffers if buffers is not None else {sock: b'' for sock in streams}
+    finished = {}
+    selector = selectors.DefaultSelector()
+    for sock in streams:
+        if done(buffers[sock]):
+            finished[sock] = time.perf_counter()
+        else:
+            selector.register(sock, selectors.EVENT_READ)
+    deadline = time.perf_counter() + timeout
+    while len(finished) < len(streams) and time.perf_counter() < deadline:
+        for key, _ in selector.select(timeout=0.5):
+            data = key.fileobj.recv(65536)
+            buffers[key.fileobj] += data
+            if not data or done(buffers[key.fileobj]):
+                finished[key.fileobj] = time.perf_counter()
+                selector.unregister(key.fileobj)
+    selector.close()
+    if len(finished) < len(streams):
+        raise AssertionError(f"{len(streams) - len(finished)} of {len(streams)} streams timed out")
+    return buffers, finished
+
+
+def bench_forum_live(workdir):
+    """Live forum streams: 1,000 concurrent SSE subscribers on one thread, fan-out latency for replies here and from another process."""
+    db_path = os.path.join(workdir, 'forum_live.db')
+    build_fixture_db(db_path, users=1000, tracks=1, courses_per_track=1)
+    conn = sqlite3.connect(db_path)
+    conn.execute("INSERT INTO ForumCategories (category_id, name, description) VALUES (1, 'Bench', 'Synthetic category')")
+    conn.execute("INSERT INTO ForumThreads (thread_id, category_id, user_id, title) VALUES (1, 1, 1, 'Live thread')")
+    conn.execute("INSERT INTO ForumPosts (thread_id, user_id, content) VALUES (1, 1, 'First post')")
+    conn.commit()
+    kodefun.app.config['DATABASE'] = db_path
+    original_max = kodefun.app.config['FORUM_LIVE_MAX_SUBSCRIBERS']
+    kodefun.app.config['FORUM_LIVE_MAX_SUBSCRIBERS'] = FORUM_LIVE_SUBSCRIBERS
+    server = make_server('127.0.0.1', 0, kodefun.app, threaded=True, request_handler=QuietRequestHandler)
+    server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+    server_thread.start()
+    cookie = f"session={kodefun.app.session_interface.get_signing_serializer(kodefun.app).dumps({'user_id': 1})}"
+    streams = []
+    try:
+        started = time.perf_counter()
+        streams, buffers = open_event_streams(server.server_port, '/forum/thread/1/events', cookie, FORUM_LIVE_SUBSCRIBERS)
+        print(f"  {len(streams)} streams open in {time.perf_counter() - started:.1f}s")
+        sock = socket.create_connection(('127.0.0.1', server.server_port))
+        sock.sendall(f"GET /forum/thread/1/events HTTP/1.1\r\nHost: localhost\r\nCookie: {cookie}\r\n\r\n".encode())
+        status = sock.recv(64).split(b' ')[1].decode()
+        sock.close()
+        if status != '503':
+            raise AssertionError(f"Subscriber {FORUM_LIVE_SUBSCRIBERS + 1} got HTTP {status}, expected 503")
+        print(f"  subscriber {FORUM_LIVE_SUBSCRIBERS + 1}: HTTP 503")
+
+        client = logged_in_client(2)
+        hub = kodefun.get_forum_hub()
+        for source in ('this process', 'another process'):
+            latencies, polls = [], hub.published
+            for i in range(FORUM_LIVE_POSTS):
+                started = time.perf_counter()
+                if source == 'this process':
+                    client.post('/forum/thread/1/create_post', data={'content': f'Live reply {i}'})
+                else:
+                    conn.execute("INSERT INTO ForumPosts (thread_id, user_id, content) VALUES (1, 3, ?)", (f'Outside reply {i}',))
+                    conn.commit()
+                post_id = conn.execute("SELECT MAX(post_id) FROM ForumPosts").fetchone()[0]
+                marker = f"id: {post_id}\n".encode()
+                buffers, finished = read_event_streams(streams, lambda data: marker in data, timeout=30, buffers=buffers)
+                latencies.extend(at - started for at in finished.values())
+            latencies.sort()
+            print(f"  reply from {source}: delivered to all {len(streams)} streams, p50 {latencies[len(latencies) // 2] * 1000:.1f}ms, "
+                  f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.1f}ms; {hub.published - polls} post(s) read by the hub")
+    finally:
+        for sock in streams:
+            sock.close()
+        server.shutdown()
+        kodefun.app.config['FORUM_LIVE_MAX_SUBSCRIBERS'] = original_max
+        hub = kodefun.app.extensions.pop('forum_hub', None)
+        if hub is not None:
+            hub.stop(timeout=5)
+        kodefun.get_db_pool().close_all()
+        conn.close()
+
+
+
+FORUM_MARKDOWN_POSTS = 25
+FORUM_MARKDOWN_VIEWS = 200
+FORUM_MARKDOWN_SOURCE = """Tried **recursion** for this, but `fib(35)` never returns:
+
+```python
+def fib(n):
+    if n < 2:
+        return n
+    return fib(n - 1) + fib(n - 2)  # Exponential: memoize with functools.lru_cache
+```
+
+- Works for small `n`
+- See [the course notes](/courses/1) and https://docs.python.org/3/library/functools.html
+
+> Is there a *faster* way?"""
+
+# Sources whose links must not survive as links (the last ones only look site-relative)
+FORUM_MARKDOWN_UNSAFE = (
+    '[x](javascript:alert(1))',
+    '[x](data:text/html,<script>alert(1)</script>)',
+    '[x](//evil.example)',
+    '[x](/\\evil.example)',
+    '<img src=x onerror=alert(1)>',
+)
+
+
+def bench_forum_markdown(workdir):
+    """Forum thread page with Markdown posts: HTML stored at write time vs. rendered on every view."""
+    db_path = os.path.join(workdir, 'forum_markdown.db')
+    build_fixture_db(db_path, users=100, tracks=1, courses_per_track=1)
+    conn = sqlite3.connect(db_path)
+    conn.execute("INSERT INTO ForumCategories (category_id, name, description) VALUES (1, 'Bench', 'Synthetic category')")
+    conn.execute("INSERT INTO ForumThreads (thread_id, category_id, user_id, title) VALUES (1, 1, 1, 'Markdown thread')")
+    for source in FORUM_MARKDOWN_UNSAFE:
+        rendered = render_markdown(source)
+        if '<a ' in rendered or '<img' in rendered:
+            raise AssertionError(f"unsafe Markdown rendered as markup: {source!r} -> {rendered!r}")
+    started = time.perf_counter()
+    html = [render_markdown(f"{FORUM_MARKDOWN_SOURCE}\n\nReply {i}") for i in range(FORUM_MARKDOWN_POSTS)]
+    render_ms = (time.perf_counter() - started) / FORUM_MARKDOWN_POSTS * 1000
+    conn.executemany("INSERT INTO ForumPosts (thread_id, user_id, content, content_html, content_renderer) VALUES (1, ?, ?, ?, ?)",
+                     ((i % 100 + 1, f"{FORUM_MARKDOWN_SOURCE}\n\nReply {i}", html[i], RENDERER_VERSION) for i in range(FORUM_MARKDOWN_POSTS)))
+    conn.commit()
+    kodefun.app.config['DATABASE'] = db_path
+    client = logged_in_client(1)
+    print(f"  rendering one post ({RENDERER_VERSION}): {render_ms:.2f}ms, paid once at write time")
+    for label, renderer in (('stored', RENDERER_VERSION), ('per view', None)):
+        # A NULL renderer is what posts look like before the re-render job: rendered on every view
+        conn.execute("UPDATE ForumPosts SET content_renderer = ?", (renderer,))
+        conn.commit()
+        timings = []
+        for _ in range(FORUM_MARKDOWN_VIEWS):
+            started = time.perf_counter()
+            response = client.get('/forum/thread/1')
+            timings.append(time.perf_counter() - started)
+            if response.status_code != 200 or 'class="highlight"' not in response.get_data(as_text=True):
+                raise AssertionError(f"{label}: thread page did not render the posts")
+        timings.sort()
+        print(f"  /forum/thread/1 ({label:<8}): p50 {timings[len(timings) // 2] * 1000:.2f}ms, "
+              f"p95 {timings[int(len(timings) * 0.95)] * 1000:.2f}ms for {FORUM_MARKDOWN_POSTS} posts")
+    kodefun.get_db_pool().close_all()
+    conn.close()
+
+
+FORUM_UNREAD_THREADS = 200000
+FORUM_UNREAD_CATEGORIES = 4
+FORUM_UNREAD_REPLIES = 2000 # New replies after the reader marked everything read
+# The same counts without the index range or the cap: every thread checked against the user's marks
+FULL_UNREAD_SQL = """
+    SELECT t.category_id, COUNT(*)
+    FROM ForumThreads t
+    LEFT JOIN ForumReadMarkers m ON m.user_id = ?1 AND m.thread_id = t.thread_id
+    LEFT JOIN ForumCategoryReads w ON w.user_id = ?1 AND w.category_id = t.category_id
+    WHERE t.last_post_id > MAX(COALESCE(m.last_read_post_id, 0), COALESCE(w.last_read_post_id, 0))
+    GROUP BY t.category_id
+"""
+
+
+def bench_forum_unread(workdir):
+    """Forum unread counts: watermark + capped index range vs. checking every thread, at 200k threads."""
+    db_path = os.path.join(workdir, 'forum_unread.db')
+    build_fixture_db(db_path, users=100, tracks=1, courses_per_track=1)
+    conn = sqlite3.connect(db_path)
+    rng = random.Random(23)
+    conn.executemany("INSERT INTO ForumCategories (category_id, name, description) VALUES (?, ?, 'Synthetic category')",
+                     ((c, f'Bench {c}') for c in range(1, FORUM_UNREAD_CATEGORIES + 1)))
+    conn.executemany("INSERT INTO ForumThreads (thread_id, category_id, user_id, title) VALUES (?, ?, ?, ?)",
+                     ((t, t % FORUM_UNREAD_CATEGORIES + 1, rng.randint(1, 100), f'Thread {t}') for t in range(1, FORUM_UNREAD_THREADS + 1)))
+    # Stored HTML, so the pages are not timed against the background re-render
+    html = render_markdown('Synthetic post')
+    conn.executemany("INSERT INTO ForumPosts (thread_id, user_id, content, content_html, content_renderer) VALUES (?, ?, 'Synthetic post', ?, ?)",
+                     ((t, rng.randint(1, 100), html, RENDERER_VERSION) for t in range(1, FORUM_UNREAD_THREADS + 1)))
+    # User 1 marked everything read; since then replies landed and they read half of the threads they went to
+    for category_id in range(1, FORUM_UNREAD_CATEGORIES + 1):
+        mark_category_read(conn, 1, category_id)
+    replied = rng.sample(range(1, FORUM_UNREAD_THREADS + 1), FORUM_UNREAD_REPLIES)
+    conn.executemany("INSERT INTO ForumPosts (thread_id, user_id, content, content_html, content_renderer) VALUES (?, 2, 'Reply', ?, ?)",
+                     ((t, render_markdown('Reply'), RENDERER_VERSION) for t in replied))
+    for thread_id in replied[::2]:
+        mark_thread_read(conn, 1, thread_id, conn.execute("SELECT last_post_id FROM ForumThreads WHERE thread_id = ?", (thread_id,)).fetchone()[0])
+    conn.commit()
+    expected = {row[0]: row[1] for row in conn.execute(FULL_UNREAD_SQL, (1,))}
+    if {c: n for c, n in unread_counts(conn, 1, limit=FORUM_UNREAD_REPLIES).items() if n} != expected:
+        raise AssertionError("watermark counts differ from checking every thread")
+    for label, user_id in (('reader who marked all read', 1), ('user who never visited', 3)):
+        started = time.perf_counter()
+        for _ in range(FORUM_REPEATS):
+            conn.execute(FULL_UNREAD_SQL, (user_id,)).fetchall()
+        full_ms = (time.perf_counter() - started) / FORUM_REPEATS * 1000
+        started = time.perf_counter()
+        for _ in range(FORUM_REPEATS):
+            unread_counts(conn, user_id)
+        counts_ms = (time.perf_counter() - started) / FORUM_REPEATS * 1000
+        print(f"  {label:<27}: every thread {full_ms:.2f}ms, watermark + cap {counts_ms:.2f}ms")
+    conn.close()
+    kodefun.app.config['DATABASE'] = db_path
+    client = logged_in_client(1)
+    for path in ('/forum', '/forum/category/1'):
+        timings = []
+        for _ in range(FORUM_REPEATS):
+            started = time.perf_counter()
+            response = client.get(path)
+            timings.append(time.perf_counter() - started)
+            if response.status_code != 200 or 'unread' not in response.get_data(as_text=True):
+                raise AssertionError(f"{path} did not show the unread counts")
+        timings.sort()
+        print(f"  {path:<18}: p50 {timings[len(timings) // 2] * 1000:.2f}ms")
+    kodefun.get_db_pool().close_all()
+
+
+VIEW_COUNT_THREADS = 50
+VIEW_COUNT_REPLY_INTERVAL = 0.005 # Seconds between the background replies
+
+
+class DirectViewCounter(ViewCounter):
+    """The baseline: an UPDATE and a commit on the request's write connection for every view."""
+
+    def add(self, kind, item_id, count=1):
+        db = kodefun.get_db()
+        db.execute("UPDATE ForumThreads SET view_count = view_count + ? WHERE thread_id = ?", (count, item_id))
+        db.commit()
+        with self._flush_lock:
+            self.flushed += count
+
+    def is_alive(self):
+        return True
+
+
+def bench_view_counts(workdir):
+    """Forum thread views: an UPDATE per GET vs. buffered in memory and flushed in batches."""
+    db_path = os.path.join(workdir, 'view_counts.db')
+    build_fixture_db(db_path, users=BENCH_THREADS, tracks=1, courses_per_track=1)
+    conn = sqlite3.connect(db_path)
+    conn.execute("INSERT INTO ForumCategories (category_id, name, description) VALUES (1, 'Bench', 'Synthetic category')")
+    html = render_markdown('Synthetic post')
+    for thread_id in range(1, VIEW_COUNT_THREADS + 1):
+        conn.execute("INSERT INTO ForumThreads (thread_id, category_id, user_id, title) VALUES (?, 1, 1, ?)", (thread_id, f'Thread {thread_id}'))
+        conn.executemany("INSERT INTO ForumPosts (thread_id, user_id, content, content_html, content_renderer) VALUES (?, 1, 'Synthetic post', ?, ?)",
+                         ((thread_id, html, RENDERER_VERSION) for _ in range(10)))
+    conn.commit()
+    kodefun.app.config['DATABASE'] = db_path
+    urls = [f'/forum/thread/{thread_id}' for thread_id in range(1, VIEW_COUNT_THREADS + 1)]
+    run_load(urls, seconds=0.5) # Warm up: read markers written, pool filled
+    for label, make_counter in (('UPDATE per GET', lambda: DirectViewCounter(None)),
+                                ('buffered', lambda: kodefun.get_view_counter())):
+        old = kodefun.app.extensions.pop('view_counter', None)
+        if old is not None:
+            old.stop(timeout=5)
+        conn.execute("UPDATE ForumThreads SET view_count = 0")
+        conn.commit()
+        counter = kodefun.app.extensions['view_counter'] = make_counter()
+        add_timings, add = [], counter.add
+
+        def timed_add(*args):
+            started = time.perf_counter()
+            add(*args)
+            add_timings.append(time.perf_counter() - started)
+        counter.add = timed_add
+        # Replies keep coming meanwhile, so views written per GET queue behind them for the write lock
+        writing = threading.Event()
+        writing.set()
+
+        def post_replies():
+            writer = sqlite3.connect(db_path, timeout=30)
+            rng = random.Random(24)
+            while writing.is_set():
+                writer.execute("INSERT INTO ForumPosts (thread_id, user_id, content, content_html, content_renderer) VALUES (?, 1, 'Reply', ?, ?)",
+                               (rng.randint(1, VIEW_COUNT_THREADS), html, RENDERER_VERSION))
+                writer.commit()
+                time.sleep(VIEW_COUNT_REPLY_INTERVAL)
+            writer.close()
+        poster = threading.Thread(target=post_replies)
+        poster.start()
+        rate = run_load(urls)
+        writing.clear()
+        poster.join()
+        counter.stop(timeout=5)
+        kodefun.app.extensions.pop('view_counter', None)
+        stored = conn.execute("SELECT SUM(view_count) FROM ForumThreads").fetchone()[0]
+        if stored != counter.flushed or not stored:
+            raise AssertionError(f"{label}: {stored} views stored, {counter.flushed} counted")
+        add_timings.sort()
+        print(f"  {label:<14}: {rate:,.0f} thread views/s, {stored:,} views stored; counting a view "
+              f"p50 {add_timings[len(add_timings) // 2] * 1000:.3f}ms, p99 {add_timings[int(len(add_timings) * 0.99)] * 1000:.3f}ms")
+    kodefun.get_db_pool().close_all()
+    conn.close()
+
+
+QUIZ_QUESTIONS = 20
+QUIZ_CHOICES = 4
+QUIZ_ROUNDS = 200
+
+
+def add_quiz(db_path, course_id, questions, choices):
+    """Adds a Theory assessment whose quiz has `questions` questions of `choices` choices (the first correct); returns its id."""
+    conn = sqlite3.connect(db_path)
+    assessment_id = conn.execute(
+        "INSERT INTO Assessments (course_id, assessment_type, description, weight_percentage) VALUES (?, 'Theory', 'Bench quiz', 20)",
+        (course_id,)
+    ).lastrowid
+    for n in range(questions):
+        question_id = conn.execute("INSERT INTO QuizQuestions (assessment_id, question_text) VALUES (?, ?)",
+                                   (assessment_id, f'Question {n}?')).lastrowid
+        conn.executemany("INSERT INTO QuizChoices (question_id, choice_text, is_correct) VALUES (?, ?, ?)",
+                         ((question_id, f'Answer {c}', int(c == 0)) for c in range(choices)))
+    bump_catalog_version(conn)
+    conn.commit()
+    conn.close()
+    return assessment_id
+
+
+def bench_quiz(workdir):
+    """Taking and submitting a quiz: statements and time per request with the compiled quiz cache."""
+    db_path = os.path.join(workdir, 'quiz.db')
+    build_fixture_db(db_path, users=1)
+    assessment_id = add_quiz(db_path, 1, QUIZ_QUESTIONS, QUIZ_CHOICES)
+    kodefun.app.config['DATABASE'] = db_path
+    client = logged_in_client(1)
+    client.get('/tracks/1/courses') # Initialises UserProgress, course 1 unlocked
+    quiz_url = f'/courses/1/assessment/{assessment_id}/quiz'
+    client.get(quiz_url) # Compiles the quiz
+    take, submit, statements = [], [], set()
+    for _ in range(QUIZ_ROUNDS):
+        started = time.perf_counter()
+        page = client.get(quiz_url).get_data(as_text=True)
+        take.append(time.perf_counter() - started)
+        statements.add(('take', kodefun.get_profile_store().recent(1)[0]['statements']))
+        attempt_id = int(re.search(r'/submit_quiz/(\d+)', page).group(1))
+        # Right answers are each question's lowest choice_id
+        answers = {}
+        for question_id, choice_id in re.findall(r'name="question_(\d+)"\s+id="choice_(\d+)"', page):
+            answers.setdefault(f'question_{question_id}', choice_id)
+        started = time.perf_counter()
+        response = client.post(f'/submit_quiz/{attempt_id}', data=answers, follow_redirects=True)
+        submit.append(time.perf_counter() - started)
+        statements.add(('submit', kodefun.get_profile_store().recent(2)[0]['statements']))
+        if f'You scored {QUIZ_QUESTIONS}/{QUIZ_QUESTIONS}' not in response.get_data(as_text=True):
+            raise AssertionError("the quiz was not graded from the answer key")
+    for label, timings in (('take_quiz', take), ('submit_quiz', submit)):
+        timings.sort()
+        counts = sorted(count for name, count in statements if name == label.split('_')[0])
+        print(f"  {label:<11} ({QUIZ_QUESTIONS} questions): {'/'.join(map(str, counts))} statements, "
+              f"p50 {timings[len(timings) // 2] * 1000:.2f}ms")
+    # Editing a choice moves the assessment's quiz_version: the next catalog check recompiles that quiz
+    conn = sqlite3.connect(db_path)
+    conn.execute("UPDATE QuizChoices SET choice_text = 'Edited answer' WHERE choice_id = (SELECT MIN(choice_id) FROM QuizChoices)")
+    bump_catalog_version(conn)
+    conn.commit()
+    conn.close()
+    kodefun.app.extensions['catalog_cache'].invalidate() # Instead of waiting out CATALOG_CHECK_INTERVAL
+    if 'Edited answer' not in client.get(quiz_url).get_data(as_text=True):
+        raise AssertionError("the edited quiz was not recompiled")
+    kodefun.get_db_pool().close_all()
+
+
+SCENARIOS = {
+    'pool': bench_pool,
+    'rowid': bench_rowid,
+    'course_detail': bench_course_detail,
+    'xp_ledger': bench_xp_ledger,
+    'award_backfill': bench_award_backfill,
+    'course_completion': bench_course_completion,
+    'dashboard': bench_dashboard,
+    'leaderboard': bench_leaderboard,
+    'windowed_leaderboard': bench_windowed_leaderboard,
+    'track_leaderboard': bench_track_leaderboard,
+    'forum_category': bench_forum_category,
+    'forum_pagination': bench_forum_pagination,
+    'forum_search': bench_forum_search,
+    'forum_live': bench_forum_live,
+    'forum_markdown': bench_forum_markdown,
+    'forum_unread': bench_forum_unread,
+    'view_counts': bench_view_counts,
+    'quiz': bench_quiz,
+}
+
+
+def main(argv):
+    selected = argv or list(SCENARIOS)
+    unknown = [name for name in selected if name not in SCENARIOS]
+    if unknown:
+        print(f"Unknown scenario(s): {', '.join(unknown)}. Available: {', '.join(SCENARIOS)}")
+        return 1
+    original_db = kodefun.app.config['DATABASE']
+    with tempfile.TemporaryDirectory() as workdir:
+        try:
+            for name in selected:
+                print(f"--- {name}: {SCENARIOS[name].__doc__.strip()} ---")
+                SCENARIOS[name](workdir)
+        finally:
+            counter = kodefun.app.extensions.pop('view_counter', None) # Flushed while its database still exists
+            if counter is not None:
+                counter.stop(timeout=5)
+            kodefun.app.config['DATABASE'] = original_db
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,161 @@
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from types import MappingProxyType
+
+from achievement_rules import AchievementRules, parse_rule
+from prerequisite_graph import PrerequisiteGraph
+
+# How often (seconds) the cache re-reads CatalogVersion. In between, catalog
+# reads never touch the database.
+DEFAULT_CHECK_INTERVAL = 5.0
+
+LearningPath = namedtuple('LearningPath', ['path_id', 'path_name', 'path_description'])
+Track = namedtuple('Track', ['track_id', 'track_name', 'track_description', 'path_id', 'total_duration_weeks'])
+Course = namedtuple('Course', [
+    'course_id', 'track_id', 'course_name', 'course_level_number', 'duration_days',
+    'core_concepts', 'interactive_elements_description', 'order_in_track',
+])
+# coding_exercise_id is the first CodingExercise of a Practice assessment (None otherwise);
+# quiz_version moves whenever its quiz questions or choices change (see quiz_cache.py).
+Assessment = namedtuple('Assessment', [
+    'assessment_id', 'course_id', 'assessment_type', 'description', 'weight_percentage', 'coding_exercise_id',
+    'quiz_version',
+])
+
+
+def bump_catalog_version(conn):
+    """
+    Marks the catalog as changed so running app processes reload it. Call this
+    (before committing) from any script that writes LearningPaths, Tracks,
+    Courses, Assessments, CodingExercises, CoursePrerequisites, Achievements,
+    QuizQuestions or QuizChoices.
+    """
+    try:
+        conn.execute("UPDATE CatalogVersion SET version = version + 1 WHERE id = 1")
+    except sqlite3.OperationalError as e:
+        print(f"Warning: could not bump catalog version ({e}). Run update_schema.py to add the CatalogVersion table.")
+
+
+def read_catalog_version(conn):
+    row = conn.execute("SELECT version FROM CatalogVersion WHERE id = 1").fetchone()
+    return row[0] if row else 0
+
+
+class Catalog:
+    """
+    Immutable snapshot of the static course catalog with the lookups the
+    routes need. Built once per catalog version by load_catalog().
+    """
+
+    def __init__(self, version, paths, tracks, courses, assessments, prerequisite_edges=(), achievement_rows=()):
+        self.version = version
+        self.paths = tuple(sorted(paths, key=lambda p: p.path_id))
+        self.paths_by_id = MappingProxyType({p.path_id: p for p in self.paths})
+        self.tracks_by_id = MappingProxyType({t.track_id: t for t in tracks})
+        self.courses_by_id = MappingProxyType({c.course_id: c for c in courses})
+        self.assessments_by_id = MappingProxyType({a.assessment_id: a for a in assessments})
+
+        tracks_by_path = {}
+        for track in sorted(tracks, key=lambda t: t.track_name):
+            tracks_by_path.setdefault(track.path_id, []).append(track)
+        self.tracks_by_path = MappingProxyType({k: tuple(v) for k, v in tracks_by_path.items()})
+
+        courses_by_track = {}
+        for course in sorted(courses, key=lambda c: (c.order_in_track is None, c.order_in_track)):
+            courses_by_track.setdefault(course.track_id, []).append(course)
+        self.courses_by_track = MappingProxyType({k: tuple(v) for k, v in courses_by_track.items()})
+        self.prerequisites = PrerequisiteGraph(self.courses_by_track, prerequisite_edges)
+
+        course_ids_by_name = {c.course_name: c.course_id for c in courses}
+        rules = (parse_rule(row, course_ids_by_name) for row in achievement_rows)
+        self.achievements = AchievementRules(rule for rule in rules if rule is not None)
+
+        assessments_by_course = {}
+        for assessment in sorted(assessments, key=lambda a: a.assessment_id):
+            assessments_by_course.setdefault(assessment.course_id, []).append(assessment)
+        self.assessments_by_course = MappingProxyType({k: tuple(v) for k, v in assessments_by_course.items()})
+
+    def tracks_for_path(self, path_id):
+        return self.tracks_by_path.get(path_id, ())
+
+    def courses_for_track(self, track_id):
+        """Courses of a track ordered by order_in_track."""
+        return self.courses_by_track.get(track_id, ())
+
+    def assessments_for_course(self, course_id):
+        """Assessments of a course ordered by assessment_id."""
+        return self.assessments_by_course.get(course_id, ())
+
+    def find_track(self, name_fragment):
+        """First track whose name contains the fragment (case-insensitive, like SQL LIKE '%...%')."""
+        fragment = name_fragment.lower()
+        return next((t for t in sorted(self.tracks_by_id.values()) if fragment in t.track_name.lower()), None)
+
+    def find_path(self, name_fragment):
+        fragment = name_fragment.lower()
+        return next((p for p in self.paths if fragment in p.path_name.lower()), None)
+
+
+def load_catalog(conn):
+    """Reads the whole catalog (seven statements) into a Catalog snapshot."""
+    version = read_catalog_version(conn)
+    paths = [LearningPath(*row) for row in conn.execute(
+        "SELECT path_id, path_name, path_description FROM LearningPaths"
+    ).fetchall()]
+    tracks = [Track(*row) for row in conn.execute(
+        "SELECT track_id, track_name, track_description, path_id, total_duration_weeks FROM Tracks"
+    ).fetchall()]
+    courses = [Course(*row) for row in conn.execute(
+        """SELECT course_id, track_id, course_name, course_level_number, duration_days,
+                  core_concepts, interactive_elements_description, order_in_track
+           FROM Courses"""
+    ).fetchall()]
+    assessments = [Assessment(*row) for row in conn.execute(
+        """SELECT Assessments.assessment_id, course_id, assessment_type, Assessments.description, weight_percentage,
+                  CASE WHEN assessment_type = 'Practice' THEN MIN(CodingExercises.exercise_id) END, quiz_version
+           FROM Assessments
+           LEFT JOIN CodingExercises ON CodingExercises.assessment_id = Assessments.assessment_id
+           GROUP BY Assessments.assessment_id"""
+    ).fetchall()]
+    prerequisite_edges = conn.execute(
+        "SELECT course_id, prerequisite_course_id FROM CoursePrerequisites"
+    ).fetchall()
+    achievement_rows = conn.execute(
+        "SELECT achievement_id, achievement_name, xp_bonus, trigger_event, rule FROM Achievements"
+    ).fetchall()
+    return Catalog(version, paths, tracks, courses, assessments, [tuple(edge) for edge in prerequisite_edges],
+                   [tuple(row) for row in achievement_rows])
+
+
+class CatalogCache:
+    """
+    Process-wide holder of the current Catalog. get() returns the cached
+    snapshot and, at most every `check_interval` seconds, compares
+    CatalogVersion with the snapshot's version and reloads when it moved.
+    """
+
+    def __init__(self, check_interval=DEFAULT_CHECK_INTERVAL):
+        self.check_interval = check_interval
+        self._catalog = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self, connect):
+        """`connect` is a zero-argument callable returning a connection; only called when a check is due."""
+        catalog = self._catalog
+        if catalog is not None and time.monotonic() - self._checked_at < self.check_interval:
+            return catalog
+        with self._lock:
+            if self._catalog is not None and time.monotonic() - self._checked_at < self.check_interval:
+                return self._catalog
+            conn = connect()
+            if self._catalog is None or read_catalog_version(conn) != self._catalog.version:
+                self._catalog = load_catalog(conn)
+            self._checked_at = time.monotonic()
+            return self._catalog
+
+    def invalidate(self):
+        with self._lock:
+            self._catalog = None
@@ -0,0 +1,87 @@
+"""
+What happens after a course is completed. evaluate_course_completion only
+writes the new status and a course_completed outbox event; the handlers
+below run later on the outbox worker (see event_outbox.py), each in the
+event's transaction and each safe to run twice for the same event.
+"""
+import json
+from datetime import datetime
+
+from achievement_rules import evaluate_event
+from dashboard_summary import bump_dashboard_version
+from event_outbox import enqueue
+from xp_ledger import award_xp, course_completion_key
+
+COURSE_COMPLETED = 'course_completed'
+COURSE_COMPLETION_XP = 100 # Fixed XP for completing a course
+
+COMPLETED_AMONG_SQL = """
+    SELECT course_id FROM UserProgress
+    WHERE user_id = ? AND status = 'completed' AND course_id IN (SELECT value FROM json_each(?))
+"""
+
+
+def completed_course_ids(db, user_id, course_ids):
+    """Which of the given courses the user has completed, in one statement (none for an empty set)."""
+    if not course_ids:
+        return set()
+    rows = db.execute(COMPLETED_AMONG_SQL, (user_id, json.dumps(sorted(course_ids)))).fetchall()
+    return {row[0] for row in rows}
+
+
+def unlock_courses(db, user_id, course_ids):
+    """
+    Unlocks several courses for a user with one batched upsert: locked rows
+    flip to 'unlocked', missing rows are created unlocked, anything already
+    unlocked, in progress, completed or failed is left alone. Returns the
+    number of courses unlocked. Does not commit.
+    """
+    if not course_ids:
+        return 0
+    now = datetime.utcnow()
+    cursor = db.executemany("""
+        INSERT INTO UserProgress
+            (user_id, course_id, status, unlocked_at, current_score_theory, current_score_practice, current_score_project, current_score_live_coding, total_score, attempts)
+        VALUES (?, ?, 'unlocked', ?, 0, 0, 0, 0, 0, 0)
+        ON CONFLICT (user_id, course_id) DO UPDATE SET status = 'unlocked', unlocked_at = excluded.unlocked_at
+        WHERE UserProgress.status = 'locked'
+    """, [(user_id, course_id, now) for course_id in course_ids])
+    return cursor.rowcount
+
+
+def publish_course_completed(db, user_id, course_id, score):
+    """Records the course_completed event. Does not commit: it belongs to the status change's transaction."""
+    return enqueue(db, COURSE_COMPLETED, user_id, {'course_id': course_id, 'score': score, 'xp': COURSE_COMPLETION_XP})
+
+
+# --- course_completed handlers: (db, catalog, event), idempotent, do not commit ---
+def award_completion_xp(db, catalog, event):
+    course_id = event.payload['course_id']
+    award_xp(db, event.user_id, event.payload.get('xp', COURSE_COMPLETION_XP), 'course_completed', course_id,
+             course_completion_key(event.user_id, course_id))
+
+
+def unlock_dependent_courses(db, catalog, event):
+    """Unlocks the courses whose prerequisites are now all completed."""
+    course_id = event.payload['course_id']
+    graph = catalog.prerequisites
+    completed = set()
+    if graph.needs_completion_lookup(course_id):
+        completed = completed_course_ids(db, event.user_id, graph.other_prerequisites(course_id))
+    unlock_courses(db, event.user_id, graph.unlocked_by(course_id, completed))
+
+
+def award_completion_achievements(db, catalog, event):
+    evaluate_event(db, catalog, event.user_id, COURSE_COMPLETED, course_id=event.payload['course_id'])
+
+
+def refresh_dashboard(db, catalog, event):
+    """The handlers above changed XP, unlocks and achievements: the cached dashboard is stale."""
+    bump_dashboard_version(db, event.user_id)
+
+
+# Handlers per event type, run in order. Later consumers (summaries,
+# leaderboards) register here.
+HANDLERS = {
+    COURSE_COMPLETED: [award_completion_xp, unlock_dependent_courses, award_completion_achievements, refresh_dashboard],
+}
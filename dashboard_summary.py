@@ -0,0 +1,136 @@
+"""
+Per-user dashboard summary: track progress, recent achievements, the
+courses the user can work on next and their leaderboard rank, computed with
+a single statement and cached in-process.
+
+Every write that changes what the dashboard shows bumps
+Users.dashboard_version in the same transaction (bump_dashboard_version).
+A cache hit costs one primary-key read of that version (which also returns
+the live xp_points); a miss adds the summary statement. Because the version
+lives in the database, writes made by other processes (a separate outbox
+worker, another web worker) invalidate the entry too. The rank also moves
+when other users earn XP, so entries are recomputed after `rank_ttl`
+seconds regardless.
+"""
+import json
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_CACHE_SIZE = 10000 # Users kept per process
+DEFAULT_RANK_TTL = 60 # Seconds a cached rank may lag behind other users' XP
+RECENT_ACHIEVEMENTS = 5
+
+USER_VERSION_SQL = "SELECT xp_points, dashboard_version FROM Users WHERE user_id = ?"
+
+# Parameters: user_id, user_id, number of achievements, user_id, user_id.
+# Rank ties are broken by user_id, like the leaderboard.
+DASHBOARD_SUMMARY_SQL = """
+    SELECT
+        (SELECT COUNT(*) FROM Users WHERE xp_points > me.xp_points)
+        + (SELECT COUNT(*) FROM Users WHERE xp_points = me.xp_points AND user_id < me.user_id) + 1 AS rank,
+        (SELECT json_group_array(json_array(track_id, completed_count, in_progress_count, failed_count,
+                                            total_score, last_activity_at))
+           FROM UserTrackSummary WHERE user_id = ?) AS tracks,
+        (SELECT json_group_array(json_array(achievement_name, xp_bonus, unlocked_at)) FROM (
+            SELECT a.achievement_name, a.xp_bonus, ua.unlocked_at
+            FROM UserAchievements ua JOIN Achievements a ON a.achievement_id = ua.achievement_id
+            WHERE ua.user_id = ?
+            ORDER BY ua.unlocked_at DESC
+            LIMIT ?
+        )) AS achievements,
+        (SELECT json_group_array(json_array(course_id, status, last_attempt_at))
+           FROM UserProgress WHERE user_id = ? AND status IN ('unlocked', 'in_progress')) AS open_courses
+    FROM Users me
+    WHERE me.user_id = ?
+"""
+
+
+def bump_dashboard_version(db, user_id):
+    """Marks the user's cached dashboard stale. Does not commit: call it in the writing transaction."""
+    db.execute("UPDATE Users SET dashboard_version = dashboard_version + 1 WHERE user_id = ?", (user_id,))
+
+
+def load_dashboard_summary(db, user_id):
+    """The summary straight from the database (one statement), or None for an unknown user."""
+    row = db.execute(DASHBOARD_SUMMARY_SQL, (user_id, user_id, RECENT_ACHIEVEMENTS, user_id, user_id)).fetchone()
+    if row is None:
+        return None
+    return {
+        'rank': row[0],
+        'tracks': [
+            {'track_id': t[0], 'completed_count': t[1], 'in_progress_count': t[2], 'failed_count': t[3],
+             'total_score': t[4], 'last_activity_at': t[5]}
+            for t in json.loads(row[1])
+        ],
+        'achievements': [
+            {'achievement_name': a[0], 'xp_bonus': a[1], 'unlocked_at': a[2]} for a in json.loads(row[2])
+        ],
+        'open_courses': [
+            {'course_id': c[0], 'status': c[1], 'last_attempt_at': c[2]} for c in json.loads(row[3])
+        ],
+    }
+
+
+class DashboardCache:
+    """
+    Process-wide LRU of dashboard summaries keyed by user, each stamped with
+    the dashboard_version it was computed at.
+    """
+
+    def __init__(self, size=DEFAULT_CACHE_SIZE, rank_ttl=DEFAULT_RANK_TTL):
+        self.size = size
+        self.rank_ttl = rank_ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, db, user_id):
+        """Returns (live xp_points, summary), or None for an unknown user."""
+        row = db.execute(USER_VERSION_SQL, (user_id,)).fetchone()
+        if row is None:
+            return None
+        xp_points, version = row[0], row[1]
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] == version and time.monotonic() - entry[1] < self.rank_ttl:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return xp_points, entry[2]
+            self.misses += 1
+        # Computed outside the lock; the version was read first, so a write
+        # racing with this just makes the next request recompute.
+        summary = load_dashboard_summary(db, user_id)
+        with self._lock:
+            self._entries[user_id] = (version, time.monotonic(), summary)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+        return xp_points, summary
+
+    def invalidate(self, user_id=None):
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_id, None)
+
+
+def next_course(catalog, summary):
+    """
+    The course to continue with: the most recently attempted course in
+    progress, else the earliest unlocked course of the most recently active
+    track. Returns (Course, status) or None.
+    """
+    track_activity = {t['track_id']: t['last_activity_at'] or '' for t in summary['tracks']}
+    best_key, best = None, None
+    for open_course in summary['open_courses']:
+        course = catalog.courses_by_id.get(open_course['course_id'])
+        if course is None:
+            continue
+        key = (open_course['status'] == 'in_progress', open_course['last_attempt_at'] or '',
+               track_activity.get(course.track_id, ''), -(course.order_in_track or 0), -course.course_id)
+        if best_key is None or key > best_key:
+            best_key, best = key, (course, open_course['status'])
+    return best
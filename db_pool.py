@@ -0,0 +1,123 @@
+import os
+import queue
+import sqlite3
+import threading
+
+# Default tuning for pooled connections. Each value can be overridden through
+# the app config keys listed in ConnectionPool.from_config().
+DEFAULT_POOL_SIZE = 8
+DEFAULT_BUSY_TIMEOUT_MS = 5000
+DEFAULT_MMAP_SIZE = 64 * 1024 * 1024  # 64 MiB
+DEFAULT_CACHE_SIZE_KIB = 16 * 1024  # 16 MiB page cache per connection
+DEFAULT_STATEMENT_CACHE = 256
+
+READ_LANE = 'read'
+WRITE_LANE = 'write'
+
+
+class ConnectionPool:
+    """
+    Hands out long-lived SQLite connections so requests do not pay connect and
+    page-cache warmup costs every time.
+
+    Connections live in two lanes:
+      - the write lane (used by get_db()) runs in WAL mode with
+        synchronous=NORMAL and starts transactions with BEGIN IMMEDIATE, so a
+        writer takes the lock up front instead of failing on upgrade;
+      - the read lane (used by get_read_db()) is query_only and, thanks to WAL,
+        never blocks on, or is blocked by, the writer.
+
+    A connection is used by one thread at a time: it is checked out for the
+    duration of a request and returned to its lane on teardown. The pool
+    remembers the pid that created it and starts over after a fork, so every
+    worker process gets its own connections.
+    """
+
+    def __init__(self, database, size=DEFAULT_POOL_SIZE, busy_timeout_ms=DEFAULT_BUSY_TIMEOUT_MS,
+                 mmap_size=DEFAULT_MMAP_SIZE, cache_size_kib=DEFAULT_CACHE_SIZE_KIB,
+                 statement_cache=DEFAULT_STATEMENT_CACHE, factory=sqlite3.Connection):
+        self.database = database
+        self.size = size
+        self.busy_timeout_ms = busy_timeout_ms
+        self.mmap_size = mmap_size
+        self.cache_size_kib = cache_size_kib
+        self.statement_cache = statement_cache
+        self.factory = factory
+        self._lock = threading.Lock()
+        self._reset()
+
+    @classmethod
+    def from_config(cls, config, factory=sqlite3.Connection):
+        """Builds a pool from a Flask config mapping."""
+        return cls(
+            config['DATABASE'],
+            size=config.get('DB_POOL_SIZE', DEFAULT_POOL_SIZE),
+            busy_timeout_ms=config.get('DB_BUSY_TIMEOUT_MS', DEFAULT_BUSY_TIMEOUT_MS),
+            mmap_size=config.get('DB_MMAP_SIZE', DEFAULT_MMAP_SIZE),
+            cache_size_kib=config.get('DB_CACHE_SIZE_KIB', DEFAULT_CACHE_SIZE_KIB),
+            statement_cache=config.get('DB_STATEMENT_CACHE', DEFAULT_STATEMENT_CACHE),
+            factory=factory,
+        )
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._idle = {READ_LANE: queue.LifoQueue(), WRITE_LANE: queue.LifoQueue()}
+
+    def _check_pid(self):
+        # Connections must never be shared across a fork; a new worker simply
+        # forgets the parent's idle connections and opens its own.
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._reset()
+
+    def _connect(self, lane):
+        conn = sqlite3.connect(
+            self.database,
+            timeout=self.busy_timeout_ms / 1000.0,
+            cached_statements=self.statement_cache,
+            check_same_thread=False,  # Connections move between request threads, one at a time
+            isolation_level='IMMEDIATE' if lane == WRITE_LANE else 'DEFERRED',
+            factory=self.factory,
+        )
+        conn.row_factory = sqlite3.Row
+        if lane == WRITE_LANE:
+            conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout_ms)}")
+        conn.execute(f"PRAGMA mmap_size = {int(self.mmap_size)}")
+        conn.execute(f"PRAGMA cache_size = -{int(self.cache_size_kib)}")
+        if lane == READ_LANE:
+            conn.execute("PRAGMA query_only = ON")
+        return conn
+
+    def acquire(self, lane=WRITE_LANE):
+        """Checks out a connection from the given lane, opening one if none is idle."""
+        self._check_pid()
+        try:
+            return self._idle[lane].get_nowait()
+        except queue.Empty:
+            return self._connect(lane)
+
+    def release(self, conn, lane=WRITE_LANE):
+        """Returns a connection to its lane, discarding any uncommitted work."""
+        if conn.in_transaction:
+            try:
+                conn.rollback()
+            except sqlite3.Error:
+                conn.close()
+                return
+        if self._pid != os.getpid() or self._idle[lane].qsize() >= self.size:
+            conn.close()
+            return
+        self._idle[lane].put(conn)
+
+    def close_all(self):
+        """Closes every idle connection (e.g. before the database file is replaced)."""
+        for idle in self._idle.values():
+            while True:
+                try:
+                    conn = idle.get_nowait()
+                except queue.Empty:
+                    break
+                conn.close()
@@ -1,6 +1,8 @@
 import sqlite3
 import os
 
+from catalog_cache import bump_catalog_version
+
 DATABASE_PATH = 'kodefun.db'
 
 def get_db_connection():
@@ -70,6 +72,8 @@ def main():
         
         # 4. Live Coding Assessment
         ensure_assessment(conn, js_level1_course_id, "Live Coding", 15, "Live Coding (15 min): Form validation script")
+        bump_catalog_version(conn)
+        conn.commit()
 
         print("\n--- Assessment verification/creation process completed. ---")
 
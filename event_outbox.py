@@ -0,0 +1,212 @@
+"""
+Transactional outbox. A request writes its domain event into EventOutbox in
+the same transaction as the change that caused it, so the event exists if
+and only if the change committed. An OutboxWorker (a thread in the web
+process, or `flask outbox-worker` as a separate process) claims pending
+events and runs their handlers.
+
+Delivery is at least once: a claim is a lease, and an event whose worker
+died or overran the lease is claimed again. Handlers must therefore be
+idempotent. They run in one transaction together with marking the event
+done, so a handler that fails leaves nothing behind; the event is retried
+with a growing delay and parked as 'dead' after MAX_ATTEMPTS.
+"""
+import json
+import os
+import threading
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+DEFAULT_BATCH_SIZE = 50
+DEFAULT_LEASE_SECONDS = 30
+DEFAULT_POLL_SECONDS = 1.0
+DEFAULT_PRUNE_AFTER_DAYS = 7
+MAX_ATTEMPTS = 5
+RETRY_BASE_SECONDS = 2 # Doubled after every failed attempt
+
+OutboxEvent = namedtuple('OutboxEvent', ['event_id', 'event_type', 'user_id', 'payload', 'attempts', 'created_at'])
+
+CLAIM_SQL = """
+    UPDATE EventOutbox SET claimed_until = ?, attempts = attempts + 1
+    WHERE event_id IN (
+        SELECT event_id FROM EventOutbox
+        WHERE status = 'pending' AND available_at <= ? AND (claimed_until IS NULL OR claimed_until < ?)
+        ORDER BY available_at
+        LIMIT ?
+    )
+    RETURNING event_id, event_type, user_id, payload, attempts, created_at
+"""
+STATUS_COUNTS_SQL = "SELECT status, COUNT(*), MIN(created_at) FROM EventOutbox GROUP BY status"
+RECENT_LAG_SQL = """
+    SELECT (julianday(processed_at) - julianday(created_at)) * 86400000.0 FROM EventOutbox
+    WHERE status = 'done'
+    ORDER BY processed_at DESC
+    LIMIT ?
+"""
+
+
+def enqueue(db, event_type, user_id, payload=None):
+    """Writes one pending event and returns its id. Does not commit."""
+    now = datetime.utcnow()
+    cursor = db.execute(
+        "INSERT INTO EventOutbox (event_type, user_id, payload, available_at, created_at) VALUES (?, ?, ?, ?, ?)",
+        (event_type, user_id, json.dumps(payload or {}), now, now)
+    )
+    return cursor.lastrowid
+
+
+def claim_events(conn, limit=DEFAULT_BATCH_SIZE, lease_seconds=DEFAULT_LEASE_SECONDS):
+    """Leases up to `limit` due events to the caller and commits the claim. Returns them oldest first."""
+    now = datetime.utcnow()
+    try:
+        rows = conn.execute(CLAIM_SQL, (now + timedelta(seconds=lease_seconds), now, now, limit)).fetchall()
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    events = [OutboxEvent(r[0], r[1], r[2], json.loads(r[3]), r[4], r[5]) for r in rows]
+    return sorted(events, key=lambda event: event.event_id)
+
+
+def dispatch(conn, catalog, event, handlers):
+    """
+    Runs the event's handlers and marks it done in one transaction. On failure
+    rolls back, records the error and schedules a retry (or parks the event as
+    dead). Returns True if the event was processed.
+    """
+    try:
+        for handler in handlers.get(event.event_type, ()):
+            handler(conn, catalog, event)
+        conn.execute(
+            "UPDATE EventOutbox SET status = 'done', processed_at = ?, claimed_until = NULL, last_error = NULL WHERE event_id = ?",
+            (datetime.utcnow(), event.event_id)
+        )
+        conn.commit()
+        return True
+    except Exception as e:
+        conn.rollback()
+        dead = event.attempts >= MAX_ATTEMPTS
+        retry_at = datetime.utcnow() + timedelta(seconds=RETRY_BASE_SECONDS * 2 ** (event.attempts - 1))
+        conn.execute(
+            "UPDATE EventOutbox SET status = ?, available_at = ?, claimed_until = NULL, last_error = ? WHERE event_id = ?",
+            ('dead' if dead else 'pending', retry_at, f"{type(e).__name__}: {e}", event.event_id)
+        )
+        conn.commit()
+        print(f"Outbox event {event.event_id} ({event.event_type}) failed on attempt {event.attempts}: {e}"
+              + (" - giving up." if dead else ""))
+        return False
+
+
+def process_pending(conn, get_catalog, handlers, limit=DEFAULT_BATCH_SIZE, lease_seconds=DEFAULT_LEASE_SECONDS):
+    """Claims and dispatches one batch. Returns (claimed, processed)."""
+    events = claim_events(conn, limit, lease_seconds)
+    processed = 0
+    for event in events:
+        if dispatch(conn, get_catalog(), event, handlers):
+            processed += 1
+    return len(events), processed
+
+
+def outbox_status(conn, recent=1000):
+    """
+    Counts per status with the oldest created_at of each, plus the
+    enqueue-to-processed lag (ms) of the most recent `recent` done events.
+    """
+    counts = {status: {'count': count, 'oldest': oldest} for status, count, oldest in conn.execute(STATUS_COUNTS_SQL)}
+    lags = sorted(row[0] for row in conn.execute(RECENT_LAG_SQL, (recent,)))
+    lag = {}
+    if lags:
+        lag = {
+            'samples': len(lags),
+            'p50_ms': lags[len(lags) // 2],
+            'p95_ms': lags[min(len(lags) - 1, int(len(lags) * 0.95))],
+            'max_ms': lags[-1],
+        }
+    return {'counts': counts, 'lag': lag}
+
+
+def requeue_dead(conn):
+    """Gives every dead event a fresh set of attempts. Returns how many were requeued."""
+    cursor = conn.execute(
+        "UPDATE EventOutbox SET status = 'pending', attempts = 0, available_at = ?, claimed_until = NULL WHERE status = 'dead'",
+        (datetime.utcnow(),)
+    )
+    conn.commit()
+    return cursor.rowcount
+
+
+def prune(conn, older_than_days=DEFAULT_PRUNE_AFTER_DAYS):
+    """Deletes done events processed before the cutoff. Returns how many were deleted."""
+    cursor = conn.execute(
+        "DELETE FROM EventOutbox WHERE status = 'done' AND processed_at < ?",
+        (datetime.utcnow() - timedelta(days=older_than_days),)
+    )
+    conn.commit()
+    return cursor.rowcount
+
+
+class OutboxWorker:
+    """
+    Polls the outbox and dispatches events. `connect` returns the worker's own
+    write connection (opened on first use, in the worker's thread) and
+    `get_catalog(conn)` the catalog handlers should see. wake() cuts the poll
+    wait short after a request has committed new events.
+    """
+
+    def __init__(self, connect, get_catalog, handlers, batch_size=DEFAULT_BATCH_SIZE,
+                 lease_seconds=DEFAULT_LEASE_SECONDS, poll_seconds=DEFAULT_POLL_SECONDS):
+        self.connect = connect
+        self.get_catalog = get_catalog
+        self.handlers = handlers
+        self.batch_size = batch_size
+        self.lease_seconds = lease_seconds
+        self.poll_seconds = poll_seconds
+        self.pid = os.getpid()
+        self.processed = 0
+        self.failed = 0
+        self._conn = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def run_once(self):
+        """Processes one batch; returns the number of events claimed."""
+        if self._conn is None:
+            self._conn = self.connect()
+        conn = self._conn
+        claimed, processed = process_pending(conn, lambda: self.get_catalog(conn), self.handlers,
+                                             self.batch_size, self.lease_seconds)
+        self.processed += processed
+        self.failed += claimed - processed
+        return claimed
+
+    def run_forever(self):
+        while not self._stop.is_set():
+            try:
+                claimed = self.run_once()
+            except Exception as e: # e.g. the database is locked for longer than busy_timeout
+                print(f"Outbox worker error: {e}")
+                claimed = 0
+            if claimed < self.batch_size:
+                self._wake.wait(self.poll_seconds)
+                self._wake.clear()
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run_forever, name='outbox-worker', daemon=True)
+        self._thread.start()
+        return self
+
+    def is_alive(self):
+        return self._thread is not None and self._thread.is_alive() and self.pid == os.getpid()
+
+    def wake(self):
+        self._wake.set()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
@@ -0,0 +1,207 @@
+"""
+Live forum updates over Server-Sent Events.
+
+A ForumHub per process follows ForumPosts by post_id: one poller thread
+reads the posts past the last id it has seen - a rowid range, however many
+clients are connected - and fans each one out, formatted once, to the
+subscribers of its thread and of its category. forum_create_post wakes the
+poller right after its commit, so replies in this process arrive at once;
+replies written by other worker processes arrive within poll_seconds.
+
+Every event carries its post_id as the SSE id, so a reconnecting browser
+sends Last-Event-ID and the stream replays what it missed from SQLite before
+going live. A subscriber whose queue overflows (a client not reading) is
+dropped and its stream ends after what is queued, which makes the browser
+reconnect and catch up the same way.
+"""
+import json
+import os
+import queue
+import threading
+
+from forum_markdown import post_html
+
+DEFAULT_MAX_SUBSCRIBERS = 2000 # Open streams per process; each holds a server thread
+DEFAULT_POLL_SECONDS = 1.0 # How often posts from other processes are picked up
+DEFAULT_HEARTBEAT_SECONDS = 15.0 # Idle streams send a comment this often (also detects closed clients)
+DEFAULT_QUEUE_SIZE = 100 # Events buffered per subscriber before it is dropped
+BATCH_SIZE = 500
+REPLAY_LIMIT = 100 # Missed posts replayed on reconnect; the page reload covers the rest
+RETRY_MS = 3000
+
+LAST_POST_SQL = "SELECT COALESCE(MAX(post_id), 0) FROM ForumPosts"
+_EVENT_COLUMNS = """
+    SELECT p.post_id, p.thread_id, t.category_id, t.title, p.content, p.content_html, p.content_renderer, p.created_at, u.username
+    FROM ForumPosts p
+    JOIN ForumThreads t ON t.thread_id = p.thread_id
+    JOIN Users u ON u.user_id = p.user_id
+"""
+NEW_POSTS_SQL = f"{_EVENT_COLUMNS} WHERE p.post_id > ? ORDER BY p.post_id LIMIT ?"
+# Replays read the post_id range and filter it (the unary + keeps SQLite on
+# the rowid range rather than the thread's or category's whole history).
+REPLAY_THREAD_SQL = f"{_EVENT_COLUMNS} WHERE p.post_id > ? AND +p.thread_id = ? ORDER BY p.post_id LIMIT ?"
+REPLAY_CATEGORY_SQL = f"{_EVENT_COLUMNS} WHERE p.post_id > ? AND +t.category_id = ? ORDER BY p.post_id LIMIT ?"
+
+CHANNELS = {'thread': REPLAY_THREAD_SQL, 'category': REPLAY_CATEGORY_SQL}
+
+
+def format_event(row):
+    """The SSE message for a post row: event type 'post', its post_id as the id, the post as JSON data (with its rendered HTML)."""
+    post = {key: row[key] for key in row.keys() if key not in ('content_html', 'content_renderer')}
+    post['html'] = str(post_html(row))
+    data = json.dumps(post, default=str)
+    return f"id: {row['post_id']}\nevent: post\ndata: {data}\n\n"
+
+
+class Subscriber:
+    def __init__(self, channel, queue_size):
+        self.channel = channel
+        self.queue = queue.Queue(queue_size)
+        self.dropped = False
+
+
+class ForumHub:
+    """
+    In-process pub/sub of new forum posts, fed by polling SQLite. `connect`
+    returns the poller's own read connection. subscribe() returns None once
+    max_subscribers streams are open.
+    """
+
+    def __init__(self, connect, max_subscribers=DEFAULT_MAX_SUBSCRIBERS, poll_seconds=DEFAULT_POLL_SECONDS,
+                 queue_size=DEFAULT_QUEUE_SIZE):
+        self.connect = connect
+        self.max_subscribers = max_subscribers
+        self.poll_seconds = poll_seconds
+        self.queue_size = queue_size
+        self.pid = os.getpid()
+        self.last_post_id = None
+        self.published = 0
+        self.rejected = 0
+        self._channels = {} # (kind, id) -> set of Subscribers
+        self._count = 0
+        self._lock = threading.Lock()
+        self._conn = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __len__(self):
+        return self._count
+
+    # --- Subscribers ---
+    def subscribe(self, kind, channel_id):
+        with self._lock:
+            if self._count >= self.max_subscribers:
+                self.rejected += 1
+                return None
+            subscriber = Subscriber((kind, channel_id), self.queue_size)
+            self._channels.setdefault(subscriber.channel, set()).add(subscriber)
+            self._count += 1
+            return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            subscribers = self._channels.get(subscriber.channel)
+            if subscribers is None or subscriber not in subscribers:
+                return
+            subscribers.discard(subscriber)
+            if not subscribers:
+                del self._channels[subscriber.channel]
+            self._count -= 1
+
+    def publish(self, channel, message, post_id):
+        """Queues a formatted message for the channel's subscribers, dropping any whose queue is full."""
+        with self._lock:
+            subscribers = list(self._channels.get(channel, ()))
+        for subscriber in subscribers:
+            try:
+                subscriber.queue.put_nowait((post_id, message))
+            except queue.Full:
+                subscriber.dropped = True
+                self.unsubscribe(subscriber)
+        return len(subscribers)
+
+    # --- Polling ---
+    def run_once(self):
+        """Publishes the posts written since the last poll; returns how many there were."""
+        if self._conn is None:
+            self._conn = self.connect()
+        if self.last_post_id is None:
+            self.last_post_id = self._conn.execute(LAST_POST_SQL).fetchone()[0]
+        rows = self._conn.execute(NEW_POSTS_SQL, (self.last_post_id, BATCH_SIZE)).fetchall()
+        for row in rows:
+            message = format_event(row)
+            self.publish(('thread', row['thread_id']), message, row['post_id'])
+            self.publish(('category', row['category_id']), message, row['post_id'])
+            self.last_post_id = row['post_id']
+        self.published += len(rows)
+        return len(rows)
+
+    def run_forever(self):
+        while not self._stop.is_set():
+            try:
+                found = self.run_once()
+            except Exception as e: # e.g. the database file was replaced under the connection
+                print(f"Forum hub error: {e}")
+                found = 0
+            if found < BATCH_SIZE:
+                self._wake.wait(self.poll_seconds)
+                self._wake.clear()
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def start(self):
+        """Reads the current last post before returning, so no post after a subscriber's replay is missed."""
+        self._conn = self.connect()
+        self.last_post_id = self._conn.execute(LAST_POST_SQL).fetchone()[0]
+        self._thread = threading.Thread(target=self.run_forever, name='forum-hub', daemon=True)
+        self._thread.start()
+        return self
+
+    def is_alive(self):
+        return self._thread is not None and self._thread.is_alive() and self.pid == os.getpid()
+
+    def wake(self):
+        self._wake.set()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+
+def replay(db, kind, channel_id, after):
+    """The channel's posts after post_id `after` (at most REPLAY_LIMIT), as (post_id, message)."""
+    rows = db.execute(CHANNELS[kind], (after, channel_id, REPLAY_LIMIT)).fetchall()
+    return [(row['post_id'], format_event(row)) for row in rows]
+
+
+def stream(hub, subscriber, replayed, heartbeat_seconds=DEFAULT_HEARTBEAT_SECONDS):
+    """
+    The SSE body: the replayed messages, then live ones from the subscriber's
+    queue (skipping any the replay already sent), with a heartbeat comment
+    when idle. Unsubscribes when the client goes away or the hub drops it.
+    """
+    try:
+        yield f"retry: {RETRY_MS}\n\n"
+        sent = 0
+        for post_id, message in replayed:
+            sent = post_id
+            yield message
+        while True:
+            try:
+                post_id, message = subscriber.queue.get(timeout=heartbeat_seconds)
+            except queue.Empty:
+                if subscriber.dropped:
+                    return
+                yield ": heartbeat\n\n"
+                continue
+            if post_id > sent:
+                sent = post_id
+                yield message
+            if subscriber.dropped and subscriber.queue.empty():
+                return
+    finally:
+        hub.unsubscribe(subscriber)
@@ -0,0 +1,229 @@
+"""
+Markdown for forum posts, rendered once when a post is written.
+
+ForumPosts keeps the source in `content` and the HTML in `content_html`,
+with the RENDERER_VERSION that produced it in `content_renderer` (migration
+0017). Views use the stored HTML as is; a post from an older renderer (or
+from before the column) is rendered on the fly until the re-render job has
+rewritten it - started in the background by the app, or `flask forum-rerender`.
+
+The renderer covers the Markdown a coding forum needs: paragraphs, headings,
+fenced code blocks (highlighted when Pygments is installed), inline code,
+emphasis, links, lists, quotes and rules. It sanitizes by construction:
+the source is HTML-escaped first and only the tags below are ever emitted,
+with link targets limited to http(s), mailto and site-relative URLs.
+"""
+import re
+import threading
+from html import escape
+
+from markupsafe import Markup
+
+try:
+    from pygments import highlight
+    from pygments.formatters import HtmlFormatter
+    from pygments.lexers import get_lexer_by_name
+    from pygments.util import ClassNotFound
+except ImportError: # Optional: without Pygments, code blocks are rendered plain
+    highlight = None
+
+# Bump the number whenever the output for the same source changes; the re-render job rewrites older posts.
+RENDERER_VERSION = 'md2+pygments' if highlight else 'md2'
+DEFAULT_BATCH_SIZE = 500 # Posts re-rendered per transaction
+
+_FENCE = re.compile(r'^\s{0,3}(`{3,}|~{3,})\s*([\w+#.-]*)\s*$')
+_HEADING = re.compile(r'^\s{0,3}(#{1,6})\s+(.+?)\s*#*\s*$')
+_RULE = re.compile(r'^\s{0,3}([-*_])(\s*\1){2,}\s*$')
+_QUOTE = re.compile(r'^\s{0,3}>\s?(.*)$')
+_BULLET = re.compile(r'^\s{0,3}[-*+]\s+(.*)$')
+_NUMBERED = re.compile(r'^\s{0,3}\d{1,9}[.)]\s+(.*)$')
+
+_CODE_SPAN = re.compile(r'(`+)(.+?)\1')
+_LINK = re.compile(r'\[([^\]\n]+)\]\(\s*([^)\s]+)\s*\)')
+_AUTOLINK = re.compile(r'https?://[^\s<>"\'`\x00]+')
+_SAFE_URL = re.compile(r'^(https?://|mailto:|/(?![/\\])|#)', re.IGNORECASE) # Browsers read '/\host' as '//host'
+_EMPHASIS = [
+    (re.compile(r'\*\*(?=\S)(.+?)(?<=\S)\*\*'), 'strong'),
+    (re.compile(r'(?<!\w)__(?=\S)(.+?)(?<=\S)__(?!\w)'), 'strong'),
+    (re.compile(r'(?<![*\w])\*(?=[^\s*])(.+?)(?<=[^\s*])\*(?!\*)'), 'em'),
+    (re.compile(r'(?<!\w)_(?=\S)(.+?)(?<=\S)_(?!\w)'), 'em'),
+    (re.compile(r'~~(?=\S)(.+?)(?<=\S)~~'), 'del'),
+]
+_STASHED = re.compile(r'\x00(\d+)\x00')
+
+# Written as ranges so the check is an index lookup on content_renderer
+STALE_SQL = """
+    SELECT EXISTS (SELECT 1 FROM ForumPosts WHERE content_renderer IS NULL OR content_renderer < ? OR content_renderer > ?)
+"""
+STALE_BATCH_SQL = """
+    SELECT post_id, content FROM ForumPosts
+    WHERE post_id > ? AND post_id <= ? AND (content_renderer IS NULL OR content_renderer <> ?)
+"""
+STORE_HTML_SQL = "UPDATE ForumPosts SET content_html = ?, content_renderer = ? WHERE post_id = ? AND content = ?"
+
+
+# --- Rendering ---
+def _inline(text):
+    """Inline Markdown of one line of source, escaped."""
+    stash = []
+
+    def keep(html):
+        stash.append(html)
+        return f"\x00{len(stash) - 1}\x00"
+
+    def link(match):
+        label, url = match.group(1), match.group(2)
+        if not _SAFE_URL.match(url):
+            return keep(escape(match.group(0)))
+        return keep(f'<a href="{escape(url)}" rel="nofollow noopener">{_emphasis(escape(label))}</a>')
+
+    def autolink(match):
+        url = match.group(0).rstrip('.,;:!?)')
+        return keep(f'<a href="{escape(url)}" rel="nofollow noopener">{escape(url)}</a>') + match.group(0)[len(url):]
+
+    text = _CODE_SPAN.sub(lambda m: keep(f'<code>{escape(m.group(2).strip())}</code>'), text)
+    text = _LINK.sub(link, text)
+    text = _AUTOLINK.sub(autolink, text)
+    text = _emphasis(escape(text))
+
+    def restore(match): # Stashed HTML can hold stashes of its own (code inside a link label)
+        return _STASHED.sub(restore, stash[int(match.group(1))])
+    return _STASHED.sub(restore, text)
+
+
+def _emphasis(html):
+    for pattern, tag in _EMPHASIS:
+        html = pattern.sub(rf'<{tag}>\1</{tag}>', html)
+    return html
+
+
+def _code_block(code, language):
+    if highlight is not None and language:
+        try:
+            lexer = get_lexer_by_name(language)
+        except ClassNotFound:
+            lexer = None
+        if lexer is not None:
+            body = highlight(code, lexer, HtmlFormatter(nowrap=True))
+            return f'<pre class="highlight"><code class="language-{escape(language)}">{body}</code></pre>'
+    css_class = f' class="language-{escape(language)}"' if language else ''
+    return f'<pre><code{css_class}>{escape(code)}</code></pre>'
+
+
+def _starts_block(line):
+    return bool(_FENCE.match(line) or _HEADING.match(line) or _RULE.match(line) or _QUOTE.match(line)
+                or _BULLET.match(line) or _NUMBERED.match(line))
+
+
+def _blocks(lines):
+    html = []
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        if not line.strip():
+            i += 1
+            continue
+        fence = _FENCE.match(line)
+        if fence:
+            marker, code = fence.group(1), []
+            i += 1
+            while i < len(lines) and not lines[i].strip().startswith(marker):
+                code.append(lines[i])
+                i += 1
+            i += 1 # The closing fence (an unclosed block runs to the end)
+            html.append(_code_block('\n'.join(code), fence.group(2)))
+            continue
+        heading = _HEADING.match(line)
+        if heading:
+            level = min(len(heading.group(1)) + 2, 6) # A post's '#' sits below the page's own headings
+            html.append(f'<h{level}>{_inline(heading.group(2))}</h{level}>')
+            i += 1
+            continue
+        if _RULE.match(line):
+            html.append('<hr>')
+            i += 1
+            continue
+        if _QUOTE.match(line):
+            quoted = []
+            while i < len(lines) and _QUOTE.match(lines[i]):
+                quoted.append(_QUOTE.match(lines[i]).group(1))
+                i += 1
+            html.append(f'<blockquote>{"".join(_blocks(quoted))}</blockquote>')
+            continue
+        for pattern, tag in ((_BULLET, 'ul'), (_NUMBERED, 'ol')):
+            if pattern.match(line):
+                items = []
+                while i < len(lines) and (pattern.match(lines[i]) or (items and lines[i].startswith((' ', '\t')) and lines[i].strip())):
+                    item = pattern.match(lines[i])
+                    if item:
+                        items.append([item.group(1)])
+                    else:
+                        items[-1].append(lines[i].strip()) # Indented continuation of the item
+                    i += 1
+                html.append(f'<{tag}>' + ''.join(f'<li>{"<br>".join(_inline(part) for part in item)}</li>' for item in items) + f'</{tag}>')
+                break
+        else:
+            paragraph = []
+            while i < len(lines) and lines[i].strip() and (not paragraph or not _starts_block(lines[i])):
+                paragraph.append(_inline(lines[i].strip()))
+                i += 1
+            html.append(f'<p>{"<br>".join(paragraph)}</p>') # Line breaks are kept, as in chat and code review comments
+    return html
+
+
+def render(text):
+    """The post's Markdown source as sanitized HTML."""
+    lines = (text or '').replace('\r\n', '\n').replace('\r', '\n').replace('\x00', '').split('\n')
+    return '\n'.join(_blocks(lines))
+
+
+def post_html(row):
+    """Safe HTML for a post row with content, content_html and content_renderer: stored if current, else rendered now."""
+    if row['content_renderer'] == RENDERER_VERSION and row['content_html'] is not None:
+        return Markup(row['content_html'])
+    return Markup(render(row['content']))
+
+
+# --- Re-rendering ---
+def has_stale_posts(conn):
+    return bool(conn.execute(STALE_SQL, (RENDERER_VERSION, RENDERER_VERSION)).fetchone()[0])
+
+
+def rerender(conn, batch_size=DEFAULT_BATCH_SIZE, log=print):
+    """
+    Re-renders every post whose HTML is missing or from another renderer
+    version, scanning post_id ranges of `batch_size` with one short write
+    transaction each, so posting carries on meanwhile. A post edited between
+    the read and the write keeps the newer render. Returns the posts updated.
+    """
+    last_id = conn.execute("SELECT COALESCE(MAX(post_id), 0) FROM ForumPosts").fetchone()[0]
+    updated = 0
+    for start in range(0, last_id, batch_size):
+        rows = conn.execute(STALE_BATCH_SQL, (start, start + batch_size, RENDERER_VERSION)).fetchall()
+        if not rows:
+            continue
+        rendered = [(render(content), RENDERER_VERSION, post_id, content) for post_id, content in rows]
+        try:
+            updated += conn.executemany(STORE_HTML_SQL, rendered).rowcount
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        log(f"Posts {start + 1}-{min(start + batch_size, last_id)} of {last_id}: {len(rows)} re-rendered.")
+    return updated
+
+
+def start_rerender(acquire, release, batch_size=DEFAULT_BATCH_SIZE):
+    """Runs rerender() on a background thread with a connection from acquire(), handed back through release(conn)."""
+    def run():
+        conn = acquire()
+        try:
+            updated = rerender(conn, batch_size, log=lambda message: None)
+            print(f"Forum re-render finished: {updated} post(s) rendered with {RENDERER_VERSION}.")
+        except Exception as e:
+            print(f"Forum re-render failed: {e}")
+        finally:
+            release(conn)
+    thread = threading.Thread(target=run, name='forum-rerender', daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,118 @@
+"""
+Keyset pages for the forum: the posts of a thread, oldest first, and the
+threads of a category, latest activity first.
+
+A cursor is the sort key of the row a page ends on - (created_at, post_id)
+for posts, (activity, thread_id) for threads, where activity is the last
+post's time or, for a thread without posts, its own - and the next page is
+the index range just past it. Reading page 200 of a long thread costs what
+page 1 does, and the page in view never loads the rest of the thread.
+Paging backwards reads the same range in the other direction and reverses
+it, which is also how "jump to latest" gets the last page directly.
+
+A thread's activity moves when someone replies, so a thread answered while
+someone pages through its category jumps back to the first page.
+"""
+PAGE_SIZE = 25
+_FIRST = ('', 0) # Sorts before every real key (timestamps are text)
+_LAST = ('\U0010ffff', 2 ** 63 - 1) # Sorts after every real key
+
+_POST_COLUMNS = """
+    SELECT p.post_id, p.content, p.content_html, p.content_renderer, p.created_at, u.username
+    FROM ForumPosts p
+    JOIN Users u ON p.user_id = u.user_id
+"""
+POSTS_AFTER_SQL = f"""{_POST_COLUMNS}
+    WHERE p.thread_id = ? AND (p.created_at, p.post_id) > (?, ?)
+    ORDER BY p.created_at ASC, p.post_id ASC
+    LIMIT ?
+"""
+POSTS_BEFORE_SQL = f"""{_POST_COLUMNS}
+    WHERE p.thread_id = ? AND (p.created_at, p.post_id) < (?, ?)
+    ORDER BY p.created_at DESC, p.post_id DESC
+    LIMIT ?
+"""
+
+# The plain bound on the activity expression is redundant with the row value
+# but lets SQLite seek the expression index to it instead of walking the
+# category from its newest thread.
+_THREAD_COLUMNS = """
+    SELECT t.thread_id, t.title, t.created_at, u.username, t.post_count, t.view_count, t.last_post_at AS last_post_time,
+           lu.username AS last_post_username, COALESCE(t.last_post_at, t.created_at) AS activity
+    FROM ForumThreads t
+    JOIN Users u ON t.user_id = u.user_id
+    LEFT JOIN Users lu ON t.last_post_user_id = lu.user_id
+"""
+THREADS_OLDER_SQL = f"""{_THREAD_COLUMNS}
+    WHERE t.category_id = ? AND COALESCE(t.last_post_at, t.created_at) <= ?
+      AND (COALESCE(t.last_post_at, t.created_at), t.thread_id) < (?, ?)
+    ORDER BY COALESCE(t.last_post_at, t.created_at) DESC, t.thread_id DESC
+    LIMIT ?
+"""
+THREADS_NEWER_SQL = f"""{_THREAD_COLUMNS}
+    WHERE t.category_id = ? AND COALESCE(t.last_post_at, t.created_at) >= ?
+      AND (COALESCE(t.last_post_at, t.created_at), t.thread_id) > (?, ?)
+    ORDER BY COALESCE(t.last_post_at, t.created_at) ASC, t.thread_id ASC
+    LIMIT ?
+"""
+
+
+def encode_cursor(timestamp, row_id):
+    return f"{timestamp}~{row_id}"
+
+
+def decode_cursor(value):
+    """(timestamp, row_id) from encode_cursor(), or None for a missing or malformed cursor."""
+    try:
+        timestamp, _, row_id = value.rpartition('~')
+        return timestamp, int(row_id)
+    except (AttributeError, ValueError):
+        return None
+
+
+def _page(rows, page_size, forward, continued, key):
+    """
+    Trims a LIMIT page_size + 1 read to the page and works out its links:
+    more rows in the read direction means a further page that way; having
+    come from a cursor means there is one back the other way.
+    """
+    more = len(rows) > page_size
+    rows = rows[:page_size]
+    if not forward:
+        rows.reverse()
+    if not rows:
+        return {'rows': [], 'prev': None, 'next': None}
+    first, last = encode_cursor(*key(rows[0])), encode_cursor(*key(rows[-1]))
+    if forward:
+        return {'rows': rows, 'prev': first if continued else None, 'next': last if more else None}
+    return {'rows': rows, 'prev': first if more else None, 'next': last if continued else None}
+
+
+def load_posts_page(db, thread_id, after=None, before=None, latest=False, page_size=PAGE_SIZE):
+    """
+    One page of the thread's posts, oldest first: the first page, the page
+    after the cursor `after`, the page before the cursor `before`, or with
+    `latest` the last page. Returns {'rows': [...], 'prev': cursor or None,
+    'next': cursor or None}; a malformed cursor reads as no cursor.
+    """
+    after, before = decode_cursor(after), decode_cursor(before)
+    if before or latest:
+        rows = db.execute(POSTS_BEFORE_SQL, (thread_id, *(before or _LAST), page_size + 1)).fetchall()
+        return _page(rows, page_size, False, before is not None, lambda row: (row['created_at'], row['post_id']))
+    rows = db.execute(POSTS_AFTER_SQL, (thread_id, *(after or _FIRST), page_size + 1)).fetchall()
+    return _page(rows, page_size, True, after is not None, lambda row: (row['created_at'], row['post_id']))
+
+
+def load_threads_page(db, category_id, after=None, before=None, page_size=PAGE_SIZE):
+    """
+    One page of the category's threads, latest activity first: the first
+    page, the (older) page after the cursor `after` or the (newer) page
+    before the cursor `before`. Returns the same shape as load_posts_page().
+    """
+    after, before = decode_cursor(after), decode_cursor(before)
+    if before:
+        rows = db.execute(THREADS_NEWER_SQL, (category_id, before[0], *before, page_size + 1)).fetchall()
+        return _page(rows, page_size, False, True, lambda row: (row['activity'], row['thread_id']))
+    key = after or _LAST
+    rows = db.execute(THREADS_OLDER_SQL, (category_id, key[0], *key, page_size + 1)).fetchall()
+    return _page(rows, page_size, True, after is not None, lambda row: (row['activity'], row['thread_id']))
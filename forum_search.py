@@ -0,0 +1,109 @@
+"""
+Forum full-text search. ForumSearch (migration 0016) is an FTS5 index with
+one document per thread title and one per post body, kept current by
+triggers on ForumThreads and ForumPosts in the writing transaction. A post's
+document has the post_id as its rowid and a thread title's has -thread_id,
+so every trigger reaches its document by rowid.
+
+Results are ranked by BM25 with titles weighted over bodies (the table's
+rank setting). Relevance order is computed per query, so pages are OFFSETs
+over it and only the first MAX_PAGES are offered.
+"""
+import re
+
+from markupsafe import Markup, escape
+
+PAGE_SIZE = 20
+MAX_PAGES = 25
+MAX_TERMS = 8 # Words of the query that are searched for
+SNIPPET_TOKENS = 16
+_MARK_OPEN, _MARK_CLOSE = '\x02', '\x03' # Snippet highlight markers, replaced after escaping
+
+# Thread documents (negative rowids) match no post, so their author is the thread starter.
+SEARCH_SQL = """
+    SELECT ForumSearch.rowid AS doc_id, t.thread_id, t.title, c.category_id, c.name AS category_name,
+           snippet(ForumSearch, -1, char(2), char(3), '...', ?) AS snippet,
+           p.post_id, COALESCE(p.created_at, t.created_at) AS created_at, u.username
+    FROM ForumSearch
+    JOIN ForumThreads t ON t.thread_id = ForumSearch.thread_id
+    JOIN ForumCategories c ON c.category_id = t.category_id
+    LEFT JOIN ForumPosts p ON p.post_id = ForumSearch.rowid
+    JOIN Users u ON u.user_id = COALESCE(p.user_id, t.user_id)
+    WHERE ForumSearch MATCH ? AND (? IS NULL OR t.category_id = ?)
+    ORDER BY ForumSearch.rank
+    LIMIT ? OFFSET ?
+"""
+
+# Maintenance: the whole index is rewritten from the forum tables
+CLEAR_SQL = "DELETE FROM ForumSearch"
+INDEX_THREADS_SQL = "INSERT INTO ForumSearch (rowid, title, body, thread_id) SELECT -thread_id, title, '', thread_id FROM ForumThreads"
+INDEX_POSTS_SQL = "INSERT INTO ForumSearch (rowid, title, body, thread_id) SELECT post_id, '', content, thread_id FROM ForumPosts"
+OPTIMIZE_SQL = "INSERT INTO ForumSearch (ForumSearch) VALUES ('optimize')"
+DOCUMENT_COUNTS_SQL = """
+    SELECT (SELECT COUNT(*) FROM ForumSearch),
+           (SELECT COUNT(*) FROM ForumThreads) + (SELECT COUNT(*) FROM ForumPosts)
+"""
+
+
+def match_query(text):
+    """
+    An FTS5 query for the words of free text: every word must appear, the
+    last one as a prefix. Quoting each word keeps FTS5 operators and
+    punctuation in the input from being parsed. None if there are no words.
+    """
+    words = re.findall(r'\w+', text or '')[:MAX_TERMS]
+    if not words:
+        return None
+    return ' '.join(f'"{word}"' for word in words) + '*'
+
+
+def highlight(snippet):
+    """The snippet escaped for HTML, with the matched words in <mark>."""
+    return Markup(str(escape(snippet)).replace(_MARK_OPEN, '<mark>').replace(_MARK_CLOSE, '</mark>'))
+
+
+def search(db, text, category_id=None, page=1, page_size=PAGE_SIZE):
+    """
+    Page `page` (1-based) of the results for `text`, best first, optionally
+    within one category. Returns {'results': [...], 'has_next': bool};
+    results are dicts with doc_id, thread_id, title, category_id,
+    category_name, snippet (safe HTML), post_id (None for a title match),
+    created_at and username.
+    """
+    query = match_query(text)
+    page = min(max(page, 1), MAX_PAGES)
+    if query is None:
+        return {'results': [], 'has_next': False}
+    rows = db.execute(SEARCH_SQL, (SNIPPET_TOKENS, query, category_id, category_id,
+                                   page_size + 1, (page - 1) * page_size)).fetchall()
+    results = []
+    for row in rows[:page_size]:
+        result = dict(row)
+        result['snippet'] = highlight(result['snippet'])
+        results.append(result)
+    return {'results': results, 'has_next': len(rows) > page_size and page < MAX_PAGES}
+
+
+def document_counts(conn):
+    """(documents indexed, threads + posts): equal when the index is complete."""
+    return tuple(conn.execute(DOCUMENT_COUNTS_SQL).fetchone())
+
+
+def optimize(conn):
+    """Merges the index's segments into one, which keeps queries fast after many small trigger writes."""
+    conn.execute(OPTIMIZE_SQL)
+    conn.commit()
+
+
+def rebuild(conn):
+    """Rewrites the index from ForumThreads and ForumPosts in one transaction, then optimizes it. Returns the documents indexed."""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute(CLEAR_SQL)
+        indexed = conn.execute(INDEX_THREADS_SQL).rowcount + conn.execute(INDEX_POSTS_SQL).rowcount
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    optimize(conn)
+    return indexed
@@ -0,0 +1,71 @@
+"""
+Forum listing counters: post_count, last_post_at, last_post_user_id and
+last_post_id on ForumThreads, thread_count and post_count on
+ForumCategories. Triggers on ForumPosts and ForumThreads (migrations 0014
+and 0018) keep them current in the same transaction as every post, so the
+category pages (forum_pages.py) and unread counts (forum_unread.py) read one
+index range instead of aggregating ForumPosts.
+
+A post moved to another thread, or rows written with the triggers missing,
+make the counters drift; find_drift() reports that and backfill()
+recomputes them batch by batch.
+"""
+
+DEFAULT_BATCH_SIZE = 1000 # Threads recomputed per transaction
+
+CATEGORIES_SQL = "SELECT category_id, name, description, thread_count, post_count FROM ForumCategories ORDER BY name"
+
+# The newest post is the one with the latest created_at, then the highest post_id (as in the triggers).
+_THREAD_STATS = """
+    post_count = (SELECT COUNT(*) FROM ForumPosts p WHERE p.thread_id = ForumThreads.thread_id),
+    last_post_at = (SELECT p.created_at FROM ForumPosts p WHERE p.thread_id = ForumThreads.thread_id
+                    ORDER BY p.created_at DESC, p.post_id DESC LIMIT 1),
+    last_post_user_id = (SELECT p.user_id FROM ForumPosts p WHERE p.thread_id = ForumThreads.thread_id
+                         ORDER BY p.created_at DESC, p.post_id DESC LIMIT 1),
+    last_post_id = (SELECT MAX(p.post_id) FROM ForumPosts p WHERE p.thread_id = ForumThreads.thread_id)
+"""
+BACKFILL_THREADS_SQL = f"UPDATE ForumThreads SET {_THREAD_STATS} WHERE thread_id > ? AND thread_id <= ?"
+BACKFILL_CATEGORIES_SQL = """
+    UPDATE ForumCategories SET
+        thread_count = (SELECT COUNT(*) FROM ForumThreads t WHERE t.category_id = ForumCategories.category_id),
+        post_count = (SELECT COALESCE(SUM(t.post_count), 0) FROM ForumThreads t WHERE t.category_id = ForumCategories.category_id)
+"""
+DRIFT_SQL = """
+    SELECT ForumThreads.thread_id, ForumThreads.post_count, COUNT(p.post_id)
+    FROM ForumThreads LEFT JOIN ForumPosts p ON p.thread_id = ForumThreads.thread_id
+    GROUP BY ForumThreads.thread_id
+    HAVING ForumThreads.post_count <> COUNT(p.post_id)
+        OR ForumThreads.last_post_at IS NOT MAX(p.created_at)
+        OR ForumThreads.last_post_id IS NOT MAX(p.post_id)
+    ORDER BY ForumThreads.thread_id
+"""
+
+
+def find_drift(conn):
+    """Returns (thread_id, stored post_count, actual post_count) for every thread whose counters disagree with ForumPosts."""
+    return conn.execute(DRIFT_SQL).fetchall()
+
+
+def backfill(conn, batch_size=DEFAULT_BATCH_SIZE, log=print):
+    """
+    Recomputes every thread's counters from ForumPosts, `batch_size` threads
+    per transaction so posting is never blocked for long, then the category
+    totals from the thread counters. Returns the number of threads updated.
+    """
+    last_id = conn.execute("SELECT COALESCE(MAX(thread_id), 0) FROM ForumThreads").fetchone()[0]
+    updated = 0
+    for start in range(0, last_id, batch_size):
+        try:
+            updated += conn.execute(BACKFILL_THREADS_SQL, (start, start + batch_size)).rowcount
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        log(f"Threads {start + 1}-{min(start + batch_size, last_id)} of {last_id} recomputed.")
+    try:
+        conn.execute(BACKFILL_CATEGORIES_SQL)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return updated
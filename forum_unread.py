@@ -0,0 +1,119 @@
+"""
+Per-user unread tracking for the forum.
+
+A thread is unread for a user when its last_post_id (kept on ForumThreads
+by triggers, migration 0018) is past both the user's marker for the thread
+(ForumReadMarkers, the last post they were shown) and their watermark for
+the thread's category (ForumCategoryReads: every post up to it counts as
+read). Marking a category read moves its watermark and drops the markers it
+covers, so users keep one row per category plus one per thread read since.
+
+Counting is an index range over (category_id, last_post_id) above the
+watermark, i.e. only threads active since then, and stops at UNREAD_LIMIT.
+The category page moves the watermark up whenever nothing in the category
+is unread, which keeps that range short without the user doing anything.
+"""
+import json
+
+UNREAD_LIMIT = 100 # Counts stop here; the page shows "100+"
+
+_UNREAD_IN_CATEGORY = """
+    SELECT COUNT(*) FROM (
+        SELECT 1 FROM ForumThreads t
+        LEFT JOIN ForumReadMarkers m ON m.user_id = me.user_id AND m.thread_id = t.thread_id
+        WHERE t.category_id = c.category_id AND t.last_post_id > COALESCE(w.last_read_post_id, 0)
+          AND t.last_post_id > COALESCE(m.last_read_post_id, 0)
+        LIMIT ?
+    )
+"""
+# `me` carries the user id into the correlated count
+UNREAD_COUNTS_SQL = f"""
+    SELECT c.category_id, ({_UNREAD_IN_CATEGORY}) AS unread
+    FROM (SELECT ? AS user_id) AS me
+    CROSS JOIN ForumCategories c
+    LEFT JOIN ForumCategoryReads w ON w.user_id = me.user_id AND w.category_id = c.category_id
+"""
+CATEGORY_UNREAD_SQL = f"""
+    SELECT COALESCE(w.last_read_post_id, 0), ({_UNREAD_IN_CATEGORY}) AS unread,
+           (SELECT MAX(last_post_id) FROM ForumThreads WHERE category_id = c.category_id) AS last_post_id
+    FROM (SELECT ? AS user_id) AS me
+    JOIN ForumCategories c ON c.category_id = ?
+    LEFT JOIN ForumCategoryReads w ON w.user_id = me.user_id AND w.category_id = c.category_id
+"""
+# The unread threads among a page's, with the post the user last read (to resume after it)
+PAGE_UNREAD_SQL = """
+    SELECT t.thread_id, lp.post_id AS last_read_post_id, lp.created_at AS last_read_at
+    FROM ForumThreads t
+    LEFT JOIN ForumReadMarkers m ON m.user_id = ? AND m.thread_id = t.thread_id
+    LEFT JOIN ForumPosts lp ON lp.post_id = m.last_read_post_id AND lp.thread_id = t.thread_id
+    WHERE t.thread_id IN (SELECT value FROM json_each(?))
+      AND t.last_post_id > MAX(COALESCE(m.last_read_post_id, 0), ?)
+"""
+THREAD_READ_SQL = """
+    SELECT MAX(COALESCE(m.last_read_post_id, 0), COALESCE(w.last_read_post_id, 0))
+    FROM ForumThreads t
+    LEFT JOIN ForumReadMarkers m ON m.user_id = ? AND m.thread_id = t.thread_id
+    LEFT JOIN ForumCategoryReads w ON w.user_id = ? AND w.category_id = t.category_id
+    WHERE t.thread_id = ?
+"""
+MARK_THREAD_SQL = """
+    INSERT INTO ForumReadMarkers (user_id, thread_id, last_read_post_id) VALUES (?, ?, ?)
+    ON CONFLICT (user_id, thread_id) DO UPDATE SET last_read_post_id = MAX(last_read_post_id, excluded.last_read_post_id)
+"""
+MARK_CATEGORY_SQL = """
+    INSERT INTO ForumCategoryReads (user_id, category_id, last_read_post_id) VALUES (?, ?, ?)
+    ON CONFLICT (user_id, category_id) DO UPDATE SET last_read_post_id = MAX(last_read_post_id, excluded.last_read_post_id)
+"""
+# Walks the user's markers (not the category's threads) and looks each thread up by key
+PRUNE_MARKERS_SQL = """
+    DELETE FROM ForumReadMarkers
+    WHERE user_id = ? AND last_read_post_id <= ?
+      AND (SELECT t.category_id FROM ForumThreads t WHERE t.thread_id = ForumReadMarkers.thread_id) = ?
+"""
+CATEGORY_LAST_POST_SQL = "SELECT COALESCE(MAX(last_post_id), 0) FROM ForumThreads WHERE category_id = ?"
+
+
+def unread_counts(db, user_id, limit=UNREAD_LIMIT):
+    """{category_id: unread threads (at most `limit`)} for every category, in one statement."""
+    return {row[0]: row[1] for row in db.execute(UNREAD_COUNTS_SQL, (limit, user_id))}
+
+
+def category_unread(db, user_id, category_id, limit=UNREAD_LIMIT):
+    """(watermark, unread threads up to `limit`, the category's last post_id) for one category."""
+    row = db.execute(CATEGORY_UNREAD_SQL, (limit, user_id, category_id)).fetchone()
+    return (row[0], row[1], row[2] or 0) if row else (0, 0, 0)
+
+
+def unread_threads(db, user_id, thread_ids, watermark):
+    """
+    {thread_id: (last read post_id, its created_at) or None} for the unread
+    threads among `thread_ids`; None when the user has no marker there.
+    """
+    if not thread_ids:
+        return {}
+    rows = db.execute(PAGE_UNREAD_SQL, (user_id, json.dumps(sorted(thread_ids)), watermark)).fetchall()
+    return {row[0]: (row[1], row[2]) if row[1] is not None else None for row in rows}
+
+
+def last_read(db, user_id, thread_id):
+    """The highest post_id the user has read in the thread (marker or category watermark); 0 for none."""
+    row = db.execute(THREAD_READ_SQL, (user_id, user_id, thread_id)).fetchone()
+    return row[0] if row else 0
+
+
+def mark_thread_read(db, user_id, thread_id, post_id):
+    """Records that the user has seen the thread up to post_id (never moving back). Does not commit."""
+    db.execute(MARK_THREAD_SQL, (user_id, thread_id, post_id))
+
+
+def mark_category_read(db, user_id, category_id, post_id=None):
+    """
+    Moves the user's watermark for the category to post_id (by default its
+    last post) and deletes the thread markers it makes redundant. Does not
+    commit.
+    """
+    if post_id is None:
+        post_id = db.execute(CATEGORY_LAST_POST_SQL, (category_id,)).fetchone()[0]
+    db.execute(MARK_CATEGORY_SQL, (user_id, category_id, post_id))
+    db.execute(PRUNE_MARKERS_SQL, (user_id, post_id, category_id))
+    return post_id
@@ -0,0 +1,342 @@
+"""
+In-memory XP standings: top-N, the rank of any user and the users around
+them, without counting the Users table on every view.
+
+The Leaderboard keeps one bucket per XP value (the users holding it, sorted
+by user_id) and a Fenwick tree over the bucket sizes, so "how many users
+have more XP than x" and "which XP value holds rank r" are O(log max_xp).
+Order matches the SQL leaderboard: XP descending, ties by user_id ascending.
+
+It is seeded from Users in one statement and then follows XpLedger: every
+XP change is a ledger entry, so sync() reads the entries (and new users)
+past the last ids it has seen - one primary-key range read that also picks
+up awards made by other processes (the outbox worker, a backfill). Balances
+rewritten without a ledger entry (`flask xp-reconcile --fix`) are picked up
+by the next seed, i.e. the next process start.
+
+Until it is seeded, load_standings() answers from SQL instead.
+"""
+import bisect
+import json
+import threading
+import time
+from array import array
+
+DEFAULT_SYNC_INTERVAL = 1.0 # Seconds between XpLedger catch-up reads
+DEFAULT_SEED_RETRY_SECONDS = 60.0 # After a failed seed, SQL answers for this long before the next attempt
+DEFAULT_TOP_N = 20
+DEFAULT_NEIGHBOURS = 3 # Users shown above and below the current user
+
+# The snapshot's last ledger entry comes with every row so the seed and its
+# starting point are read in one statement.
+SEED_SQL = """
+    SELECT user_id, COALESCE(xp_points, 0), (SELECT COALESCE(MAX(entry_id), 0) FROM XpLedger)
+    FROM Users ORDER BY user_id
+"""
+# New users with their balance, then ledger entries. Compaction folds old
+# entries without changing balances, so its entries are not deltas.
+SYNC_SQL = """
+    SELECT 'user', user_id, COALESCE(xp_points, 0), user_id FROM Users WHERE user_id > ?
+    UNION ALL
+    SELECT 'xp', user_id, amount, entry_id FROM XpLedger WHERE entry_id > ? AND reason <> 'compacted'
+"""
+
+# SQL fallback, used while the board is not seeded
+RANGE_SQL = "SELECT user_id, COALESCE(xp_points, 0) FROM Users ORDER BY xp_points DESC, user_id ASC LIMIT ? OFFSET ?"
+RANK_SQL = """
+    SELECT (SELECT COUNT(*) FROM Users WHERE xp_points > me.xp_points)
+           + (SELECT COUNT(*) FROM Users WHERE xp_points = me.xp_points AND user_id < me.user_id) + 1
+    FROM Users me WHERE me.user_id = ?
+"""
+USERNAMES_SQL = "SELECT user_id, username FROM Users WHERE user_id IN (SELECT value FROM json_each(?))"
+
+
+class _Fenwick:
+    """Counts per XP value (0..size-1) with O(log size) prefix sums and rank search."""
+
+    def __init__(self, counts):
+        self.size = len(counts)
+        tree = [0] + list(counts)
+        for i in range(1, self.size + 1):
+            parent = i + (i & -i)
+            if parent <= self.size:
+                tree[parent] += tree[i]
+        self.tree = tree
+        self.top_bit = 1 << (self.size.bit_length() - 1) if self.size else 0
+
+    def add(self, value, delta):
+        i = value + 1
+        while i <= self.size:
+            self.tree[i] += delta
+            i += i & -i
+
+    def prefix(self, value):
+        """Number of users with XP <= value."""
+        total = 0
+        i = min(value + 1, self.size)
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+        return total
+
+    def find(self, below):
+        """The XP value holding the user with exactly `below` users under it."""
+        pos = 0
+        step = self.top_bit
+        while step:
+            nxt = pos + step
+            if nxt <= self.size and self.tree[nxt] <= below:
+                pos = nxt
+                below -= self.tree[nxt]
+            step >>= 1
+        return pos
+
+
+class Leaderboard:
+    """
+    Thread-safe order-statistic index of every user's XP. Ranks are 1-based.
+    Moving a user between buckets shifts the bucket's array, which is a
+    memmove even for the large bucket of users still at 0 XP.
+    """
+
+    def __init__(self, sync_interval=DEFAULT_SYNC_INTERVAL):
+        self.sync_interval = sync_interval
+        self.ready = False
+        self.last_user_id = 0
+        self.last_entry_id = 0
+        self.seed_seconds = None
+        self.seed_failed_at = None # time.monotonic() of the last failed seed
+        self._xp = array('q') # user_id -> XP, -1 for unknown ids
+        self._buckets = {} # XP -> array of user_ids, ascending
+        self._tree = _Fenwick([])
+        self._total = 0
+        self._synced_at = 0.0
+        self._lock = threading.RLock()
+        self._sync_lock = threading.Lock()
+        self._seeder = None
+        self._seeder_lock = threading.Lock()
+
+    def __len__(self):
+        return self._total
+
+    # --- Loading ---
+    def seed(self, db):
+        """Rebuilds the board from Users (one statement) and marks it ready."""
+        started = time.perf_counter()
+        xp_by_user = array('q')
+        buckets = {}
+        last_entry_id = 0
+        for user_id, xp, last_entry_id in db.execute(SEED_SQL):
+            xp = max(xp, 0)
+            if user_id >= len(xp_by_user):
+                xp_by_user.extend([-1] * (user_id + 1 - len(xp_by_user)))
+            xp_by_user[user_id] = xp
+            bucket = buckets.get(xp)
+            if bucket is None:
+                bucket = buckets[xp] = array('q')
+            bucket.append(user_id) # Rows come in user_id order: buckets stay sorted
+        counts = [0] * (max(buckets, default=0) + 1)
+        for xp, bucket in buckets.items():
+            counts[xp] = len(bucket)
+        with self._lock:
+            self._xp = xp_by_user
+            self._buckets = buckets
+            self._tree = _Fenwick(counts)
+            self._total = sum(counts)
+            self.last_user_id = len(xp_by_user) - 1 if xp_by_user else 0
+            self.last_entry_id = last_entry_id or 0
+            self._synced_at = time.monotonic()
+            self.ready = True
+        self.seed_seconds = time.perf_counter() - started
+
+    def start_seeding(self, acquire, release):
+        """
+        Seeds on a background thread with a connection from acquire(), handed
+        back through release(conn). Does nothing while a seed is running; a
+        failure is recorded in seed_failed_at (see seed_due()).
+        """
+        def run():
+            try:
+                conn = acquire()
+            except Exception as e:
+                self.seed_failed_at = time.monotonic()
+                print(f"Leaderboard seed failed: {e}")
+                return
+            try:
+                self.seed(conn)
+            except Exception as e:
+                self.seed_failed_at = time.monotonic()
+                print(f"Leaderboard seed failed: {e}")
+            finally:
+                release(conn)
+        with self._seeder_lock:
+            if not self.is_seeding():
+                self._seeder = threading.Thread(target=run, name='leaderboard-seed', daemon=True)
+                self._seeder.start()
+        return self
+
+    def is_seeding(self):
+        return self._seeder is not None and self._seeder.is_alive()
+
+    def seed_due(self, retry_seconds=DEFAULT_SEED_RETRY_SECONDS):
+        """Whether to seed again: not ready, no seed running, and any failed seed at least retry_seconds ago."""
+        if self.ready or self.is_seeding():
+            return False
+        return self.seed_failed_at is None or time.monotonic() - self.seed_failed_at >= retry_seconds
+
+    def sync(self, db, force=False):
+        """
+        Applies new users and ledger entries since the last sync, at most once
+        per sync_interval (unless forced). Returns the number of rows applied.
+        """
+        if not self.ready or (not force and time.monotonic() - self._synced_at < self.sync_interval):
+            return 0
+        if not self._sync_lock.acquire(blocking=False):
+            return 0 # Another thread is syncing; this view may be one interval behind
+        try:
+            rows = db.execute(SYNC_SQL, (self.last_user_id, self.last_entry_id)).fetchall()
+            with self._lock:
+                new_users = set()
+                for kind, user_id, amount, row_id in rows:
+                    if kind == 'user':
+                        # Its balance already includes this snapshot's ledger entries
+                        new_users.add(user_id)
+                        self.set_xp(user_id, amount)
+                        self.last_user_id = max(self.last_user_id, row_id)
+                for kind, user_id, amount, row_id in rows:
+                    if kind == 'xp':
+                        if user_id not in new_users:
+                            self.add_xp(user_id, amount)
+                        self.last_entry_id = max(self.last_entry_id, row_id)
+                self._synced_at = time.monotonic()
+            return len(rows)
+        finally:
+            self._sync_lock.release()
+
+    # --- Updates ---
+    def set_xp(self, user_id, xp):
+        """Places the user at `xp` (adding them if unknown)."""
+        xp = max(xp, 0) # XP is never negative; clamp rather than index below bucket 0
+        with self._lock:
+            if user_id >= len(self._xp):
+                self._xp.extend([-1] * (user_id + 1 - len(self._xp)))
+            old = self._xp[user_id]
+            if old == xp:
+                return
+            if old >= 0:
+                bucket = self._buckets[old]
+                del bucket[bisect.bisect_left(bucket, user_id)]
+                if not bucket:
+                    del self._buckets[old]
+                self._tree.add(old, -1)
+            else:
+                self._total += 1
+            if xp >= self._tree.size:
+                self._grow(xp)
+            bisect.insort(self._buckets.setdefault(xp, array('q')), user_id)
+            self._tree.add(xp, 1)
+            self._xp[user_id] = xp
+
+    def add_xp(self, user_id, delta):
+        with self._lock:
+            old = self._xp[user_id] if user_id < len(self._xp) else -1
+            self.set_xp(user_id, max(old, 0) + delta)
+
+    def _grow(self, xp):
+        size = max(xp + 1, self._tree.size * 2)
+        counts = [0] * size
+        for value, bucket in self._buckets.items():
+            counts[value] = len(bucket)
+        # The caller adds the user being moved right after
+        self._tree = _Fenwick(counts)
+
+    # --- Queries ---
+    def xp_of(self, user_id):
+        xp = self._xp[user_id] if 0 <= user_id < len(self._xp) else -1
+        return xp if xp >= 0 else None
+
+    def rank(self, user_id):
+        """The user's 1-based rank, or None if they are not on the board."""
+        with self._lock:
+            xp = self.xp_of(user_id)
+            if xp is None:
+                return None
+            above = self._total - self._tree.prefix(xp)
+            return above + bisect.bisect_left(self._buckets[xp], user_id) + 1
+
+    def range(self, start, count):
+        """(rank, user_id, xp) for ranks start .. start + count - 1 (fewer at the bottom)."""
+        entries = []
+        with self._lock:
+            rank = max(start, 1)
+            end = min(start + count - 1, self._total)
+            while rank <= end:
+                xp = self._tree.find(self._total - rank)
+                above = self._total - self._tree.prefix(xp)
+                bucket = self._buckets[xp]
+                first = rank - above - 1
+                for offset, user_id in enumerate(bucket[first:first + end - rank + 1]):
+                    entries.append((rank + offset, user_id, xp))
+                rank = above + len(bucket) + 1
+        return entries
+
+    def top(self, n=DEFAULT_TOP_N):
+        return self.range(1, n)
+
+    def around(self, user_id, neighbours=DEFAULT_NEIGHBOURS):
+        """The user's entry with up to `neighbours` entries on either side; [] if unknown."""
+        with self._lock:
+            rank = self.rank(user_id)
+            if rank is None:
+                return []
+            start = max(1, rank - neighbours)
+            return self.range(start, rank + neighbours - start + 1)
+
+
+# --- SQL fallback ---
+def sql_range(db, start, count):
+    rows = db.execute(RANGE_SQL, (count, max(start, 1) - 1)).fetchall()
+    return [(max(start, 1) + i, row[0], row[1]) for i, row in enumerate(rows)]
+
+
+def sql_rank(db, user_id):
+    row = db.execute(RANK_SQL, (user_id,)).fetchone()
+    return row[0] if row else None
+
+
+def usernames(db, user_ids):
+    if not user_ids:
+        return {}
+    return {row[0]: row[1] for row in db.execute(USERNAMES_SQL, (json.dumps(sorted(user_ids)),))}
+
+
+def load_standings(db, board, user_id, top_n=DEFAULT_TOP_N, neighbours=DEFAULT_NEIGHBOURS):
+    """
+    What the leaderboard page shows: the top `top_n`, the user's rank and,
+    when they are outside the top, their neighbours. Served from the board
+    when it is seeded, from SQL otherwise. Entries are dicts with rank,
+    user_id, username and xp_points.
+    """
+    rank = None
+    if board is not None and board.ready:
+        board.sync(db)
+        top = board.top(top_n)
+        rank = board.rank(user_id)
+        around = board.around(user_id, neighbours) if rank is not None and rank > top_n else []
+    else:
+        top = sql_range(db, 1, top_n)
+    if rank is None: # Board not seeded, or a user it has not synced yet
+        rank = sql_rank(db, user_id)
+        around = []
+        if rank is not None and rank > top_n:
+            around = sql_range(db, max(1, rank - neighbours), rank + neighbours - max(1, rank - neighbours) + 1)
+    names = usernames(db, {entry[1] for entry in top + around})
+
+    def to_dict(entry):
+        return {'rank': entry[0], 'user_id': entry[1], 'username': names.get(entry[1]), 'xp_points': entry[2]}
+    return {
+        'top': [to_dict(entry) for entry in top],
+        'rank': rank,
+        'around': [to_dict(entry) for entry in around],
+        'from_memory': board is not None and board.ready,
+    }
@@ -2,6 +2,8 @@ import sqlite3
 import os
 from datetime import datetime
 
+from catalog_cache import bump_catalog_version
+
 DATABASE_PATH = 'kodefun.db'
 
 def get_db_connection():
@@ -18,37 +20,55 @@ def populate_achievements_table(conn):
     """Populates the Achievements table with predefined achievements."""
     cursor = conn.cursor()
     
+    # trigger_event and rule (JSON) drive the achievement rule engine; see
+    # achievement_rules.py for the supported triggers and rule keys. Migration
+    # 0007 seeded existing rows from a frozen copy of these rules; this list
+    # refreshes them on every run.
     achievements_data = [
-        ("JavaScript Novice", "Complete LEVEL 1 of JavaScript Mastery Track.", "Complete JavaScript Fundamentals course.", 25, "Single Programming"),
-        ("PHP Beginner", "Complete LEVEL 1 of PHP Mastery Track.", "Complete PHP Fundamentals course.", 25, "Single Programming"),
-        ("Web Dev Starter", "Complete LEVEL 1 of Web Development Stack.", "Complete Frontend - HTML5 Semantics & Accessibility course.", 30, "Multi Programming"),
-        ("Five Courses Down!", "Successfully complete any 5 courses.", "Complete 5 courses across any track.", 50, "Universal"),
-        ("First Track Completed!", "Complete all courses in any single track.", "Finish all levels of any track.", 200, "Universal"),
-        ("JS Functions Pro", "Master JavaScript functions.", "Complete LEVEL 2: Functions & Scope in JavaScript Mastery Track.", 30, "Single Programming"),
-        ("DOM Manipulator", "Conquer DOM Manipulation in JavaScript.", "Complete LEVEL 4: DOM Manipulation in JavaScript Mastery Track.", 35, "Single Programming"),
-        ("PHP OOP Basics", "Grasp Object-Oriented Programming in PHP.", "Complete LEVEL 3: OOP in PHP (Basic) in PHP Mastery Track.", 30, "Single Programming"),
-        ("Full-Stack Foundation", "Complete the foundational backend and frontend courses in Web Dev Stack.", "Complete L3: Frontend - JavaScript DOM & Events AND L6: Backend - MySQL & Full-Stack Integration.", 100, "Multi Programming"),
-        ("Halfway There!", "Complete 6 courses in any single 12-course track.", "Complete 6 courses of a single track.", 75, "Universal")
+        ("JavaScript Novice", "Complete LEVEL 1 of JavaScript Mastery Track.", "Complete JavaScript Fundamentals course.", 25, "Single Programming",
+         "course_completed", '{"courses": ["LEVEL 1: JavaScript Fundamentals"]}'),
+        ("PHP Beginner", "Complete LEVEL 1 of PHP Mastery Track.", "Complete PHP Fundamentals course.", 25, "Single Programming",
+         "course_completed", '{"courses": ["LEVEL 1: PHP Fundamentals"]}'),
+        ("Web Dev Starter", "Complete LEVEL 1 of Web Development Stack.", "Complete Frontend - HTML5 Semantics & Accessibility course.", 30, "Multi Programming",
+         "course_completed", '{"courses": ["L1: Frontend - HTML5 Semantics & Accessibility"]}'),
+        ("Five Courses Down!", "Successfully complete any 5 courses.", "Complete 5 courses across any track.", 50, "Universal",
+         "course_count", '{"min_completed": 5}'),
+        ("First Track Completed!", "Complete all courses in any single track.", "Finish all levels of any track.", 200, "Universal",
+         "track_completed", '{}'),
+        ("JS Functions Pro", "Master JavaScript functions.", "Complete LEVEL 2: Functions & Scope in JavaScript Mastery Track.", 30, "Single Programming",
+         "course_completed", '{"courses": ["LEVEL 2: Functions & Scope"]}'),
+        ("DOM Manipulator", "Conquer DOM Manipulation in JavaScript.", "Complete LEVEL 4: DOM Manipulation in JavaScript Mastery Track.", 35, "Single Programming",
+         "course_completed", '{"courses": ["LEVEL 4: DOM Manipulation"]}'),
+        ("PHP OOP Basics", "Grasp Object-Oriented Programming in PHP.", "Complete LEVEL 3: OOP in PHP (Basic) in PHP Mastery Track.", 30, "Single Programming",
+         "course_completed", '{"courses": ["LEVEL 3: OOP in PHP (Basic)"]}'),
+        ("Full-Stack Foundation", "Complete the foundational backend and frontend courses in Web Dev Stack.", "Complete L3: Frontend - JavaScript DOM & Events AND L6: Backend - MySQL & Full-Stack Integration.", 100, "Multi Programming",
+         "course_completed", '{"courses": ["L3: Frontend - JavaScript DOM & Events", "L6: Backend - MySQL & Full-Stack Integration"]}'),
+        ("Halfway There!", "Complete 6 courses in any single 12-course track.", "Complete 6 courses of a single track.", 75, "Universal",
+         "track_progress", '{"min_completed": 6, "min_track_courses": 10}')
     ]
     
     print("\n--- Populating Achievements ---")
-    for name, description, criteria, xp_bonus, ach_type in achievements_data:
+    for name, description, criteria, xp_bonus, ach_type, trigger_event, rule in achievements_data:
         try:
             cursor.execute("SELECT achievement_id FROM Achievements WHERE achievement_name = ?", (name,))
             existing_achievement = cursor.fetchone()
             if existing_achievement:
-                print(f"Achievement '{name}' already exists (ID: {existing_achievement['achievement_id']}). Skipping insertion.")
+                # Keep the rule in sync so edits to it here take effect
+                cursor.execute("UPDATE Achievements SET trigger_event = ?, rule = ? WHERE achievement_id = ?",
+                               (trigger_event, rule, existing_achievement['achievement_id']))
+                print(f"Achievement '{name}' already exists (ID: {existing_achievement['achievement_id']}). Rule refreshed, skipping insertion.")
             else:
                 cursor.execute("""
-                    INSERT INTO Achievements (achievement_name, description, criteria, xp_bonus, achievement_type)
-                    VALUES (?, ?, ?, ?, ?)
-                """, (name, description, criteria, xp_bonus, ach_type))
+                    INSERT INTO Achievements (achievement_name, description, criteria, xp_bonus, achievement_type, trigger_event, rule)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                """, (name, description, criteria, xp_bonus, ach_type, trigger_event, rule))
                 achievement_id = cursor.lastrowid
                 print(f"Inserted Achievement: '{name}' (ID: {achievement_id}, XP: {xp_bonus}, Type: {ach_type})")
         except sqlite3.Error as e:
             print(f"SQLite error while inserting achievement '{name}': {e}")
             conn.rollback() # Rollback on error for this specific item
             # Decide if you want to stop or continue with next items
+    bump_catalog_version(conn)
     conn.commit()
     print("\n--- Finished populating Achievements ---")
 
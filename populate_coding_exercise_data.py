@@ -2,6 +2,8 @@ import sqlite3
 import os
 import json
 
+from catalog_cache import bump_catalog_version
+
 DATABASE_PATH = 'kodefun.db'
 
 def get_db_connection():
@@ -141,6 +143,8 @@ def main():
             print("\nCoding exercise data population script completed.")
         else:
             print("\nCoding exercise data population script could not proceed without a valid Practice Assessment ID.")
+        bump_catalog_version(conn)
+        conn.commit()
 
     except Exception as e:
         print(f"An error occurred during script execution: {e}")
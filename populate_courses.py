@@ -1,6 +1,8 @@
 import sqlite3
 import os
 
+from catalog_cache import bump_catalog_version
+
 DATABASE_PATH = 'kodefun.db'
 
 def get_db_connection():
@@ -234,6 +236,8 @@ def main():
             return
             
         populate_courses_and_assessments(conn, track_ids)
+        bump_catalog_version(conn)
+        conn.commit()
         
         print("\nDatabase population script completed successfully.")
     except Exception as e:
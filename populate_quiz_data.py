@@ -1,6 +1,8 @@
 import sqlite3
 import os
 
+from catalog_cache import bump_catalog_version
+
 DATABASE_PATH = 'kodefun.db'
 
 def get_db_connection():
@@ -144,6 +146,8 @@ def main():
             print("\nQuiz data population script completed.")
         else:
             print("\nQuiz data population script could not proceed without a valid Theory Assessment ID.")
+        bump_catalog_version(conn)
+        conn.commit()
 
     except Exception as e:
         print(f"An error occurred during script execution: {e}")
@@ -0,0 +1,110 @@
+from types import MappingProxyType
+
+
+class PrerequisiteGraph:
+    """
+    Course prerequisite DAG. Every course depends on the course before it in
+    its track (by order_in_track) plus any explicit CoursePrerequisites rows,
+    so a course can need several courses, possibly from other tracks.
+
+    Built once per catalog version; lookups are dictionary reads.
+    """
+
+    def __init__(self, courses_by_track, explicit_edges=()):
+        """
+        courses_by_track maps track_id to its courses ordered by
+        order_in_track; explicit_edges is an iterable of
+        (course_id, prerequisite_course_id) pairs.
+        """
+        prerequisites = {}
+        for courses in courses_by_track.values():
+            previous = None
+            for course in courses:
+                prerequisites.setdefault(course.course_id, set())
+                if previous is not None:
+                    prerequisites[course.course_id].add(previous.course_id)
+                previous = course
+        for course_id, prerequisite_id in explicit_edges:
+            if course_id in prerequisites and prerequisite_id in prerequisites:
+                prerequisites[course_id].add(prerequisite_id)
+
+        dependents = {}
+        for course_id, required in prerequisites.items():
+            for prerequisite_id in required:
+                dependents.setdefault(prerequisite_id, []).append(course_id)
+
+        self.prerequisites = MappingProxyType({k: frozenset(v) for k, v in prerequisites.items()})
+        self.dependents = MappingProxyType({k: tuple(sorted(v)) for k, v in dependents.items()})
+
+        cycle = self.find_cycle()
+        if cycle:
+            # Courses on a cycle can never be unlocked; say so instead of failing every request.
+            print(f"Warning: course prerequisites contain a cycle: {' -> '.join(map(str, cycle))}")
+
+    def prerequisites_of(self, course_id):
+        return self.prerequisites.get(course_id, frozenset())
+
+    def dependents_of(self, course_id):
+        """Courses that list course_id as a direct prerequisite."""
+        return self.dependents.get(course_id, ())
+
+    def external_prerequisites(self, course_ids):
+        """Prerequisites of the given courses that are not themselves among them."""
+        course_ids = set(course_ids)
+        external = set()
+        for course_id in course_ids:
+            external.update(self.prerequisites_of(course_id))
+        return external - course_ids
+
+    def unlockable(self, course_ids, completed_ids=frozenset()):
+        """Courses among course_ids whose prerequisites are all in completed_ids."""
+        return [c for c in course_ids if self.prerequisites_of(c) <= completed_ids]
+
+    def needs_completion_lookup(self, course_id):
+        """
+        True if deciding what completing course_id unlocks requires knowing
+        which other courses the user completed (some dependent has more than
+        one prerequisite). For plain linear tracks this is False and
+        unlocked_by() needs no database access.
+        """
+        return any(len(self.prerequisites_of(d)) > 1 for d in self.dependents_of(course_id))
+
+    def other_prerequisites(self, course_id):
+        """Prerequisites of course_id's dependents, other than course_id itself."""
+        others = set()
+        for dependent in self.dependents_of(course_id):
+            others.update(self.prerequisites_of(dependent))
+        others.discard(course_id)
+        return others
+
+    def unlocked_by(self, course_id, completed_ids=frozenset()):
+        """
+        Courses that become unlockable when course_id is completed, given the
+        ids of the other courses the user has completed.
+        """
+        done = set(completed_ids)
+        done.add(course_id)
+        return [d for d in self.dependents_of(course_id) if self.prerequisites_of(d) <= done]
+
+    def find_cycle(self):
+        """Returns one cycle as a list of course ids, or None if the graph is acyclic."""
+        WHITE, GREY, BLACK = 0, 1, 2
+        colour = dict.fromkeys(self.prerequisites, WHITE)
+        for start in self.prerequisites:
+            if colour[start] != WHITE:
+                continue
+            stack = [(start, iter(self.dependents_of(start)))]
+            colour[start] = GREY
+            while stack:
+                node, children = stack[-1]
+                child = next(children, None)
+                if child is None:
+                    colour[node] = BLACK
+                    stack.pop()
+                elif colour[child] == GREY:
+                    path = [n for n, _ in stack]
+                    return path[path.index(child):] + [child]
+                elif colour[child] == WHITE:
+                    colour[child] = GREY
+                    stack.append((child, iter(self.dependents_of(child))))
+        return None
@@ -0,0 +1,89 @@
+"""
+Compiled quizzes for Theory assessments. A quiz is read from QuizQuestions
+and QuizChoices once, into immutable questions and choices for take_quiz to
+render plus an answer key for submit_quiz to grade, and kept per
+assessment_id until the assessment's quiz_version moves.
+
+quiz_version is bumped by triggers on QuizQuestions and QuizChoices
+(migration 0020) and reaches the app through the catalog snapshot, so
+scripts that edit quizzes bump CatalogVersion as for any catalog change;
+running processes recompile that quiz within CATALOG_CHECK_INTERVAL.
+"""
+import threading
+from collections import namedtuple
+from types import MappingProxyType
+
+QuizChoice = namedtuple('QuizChoice', ['choice_id', 'choice_text'])
+QuizQuestion = namedtuple('QuizQuestion', ['question_id', 'question_text', 'choices'])
+
+QUIZ_SQL = """
+    SELECT q.question_id, q.question_text, qc.choice_id, qc.choice_text, qc.is_correct
+    FROM QuizQuestions q
+    JOIN QuizChoices qc ON qc.question_id = q.question_id
+    WHERE q.assessment_id = ?
+    ORDER BY q.question_id, qc.choice_id
+"""
+
+
+class Quiz:
+    """
+    One assessment's quiz as of quiz_version: `questions` in question_id
+    order, each with its choices in choice_id order (questions without
+    choices are left out, as they cannot be answered), and the answer key.
+    """
+
+    def __init__(self, assessment_id, version, questions, answer_key):
+        self.assessment_id = assessment_id
+        self.version = version
+        self.questions = tuple(questions)
+        # choice_id -> (question_id, is_correct)
+        self.answer_key = MappingProxyType(dict(answer_key))
+
+    def __len__(self):
+        return len(self.questions)
+
+    def is_correct(self, question_id, choice_id):
+        """Whether choice_id is a correct choice of question_id (False for a choice of another question)."""
+        return self.answer_key.get(choice_id) == (question_id, True)
+
+
+def load_quiz(conn, assessment_id, version):
+    """Compiles the assessment's quiz from one statement."""
+    questions, choices, answer_key = [], {}, {}
+    for question_id, question_text, choice_id, choice_text, is_correct in conn.execute(QUIZ_SQL, (assessment_id,)):
+        if question_id not in choices:
+            choices[question_id] = []
+            questions.append((question_id, question_text))
+        choices[question_id].append(QuizChoice(choice_id, choice_text))
+        answer_key[choice_id] = (question_id, bool(is_correct))
+    return Quiz(assessment_id, version,
+                (QuizQuestion(question_id, text, tuple(choices[question_id])) for question_id, text in questions),
+                answer_key)
+
+
+class QuizCache:
+    """
+    Process-wide compiled quizzes, one per Theory assessment. get() returns
+    the cached Quiz while its version matches the catalog's and compiles it
+    (through `connect`, only then called) when it does not.
+    """
+
+    def __init__(self):
+        self._quizzes = {}
+        self._lock = threading.Lock()
+
+    def get(self, assessment, connect):
+        """`assessment` is the catalog's Assessment; `connect` a zero-argument callable returning a connection."""
+        quiz = self._quizzes.get(assessment.assessment_id)
+        if quiz is not None and quiz.version == assessment.quiz_version:
+            return quiz
+        with self._lock:
+            quiz = self._quizzes.get(assessment.assessment_id)
+            if quiz is None or quiz.version != assessment.quiz_version:
+                quiz = self._quizzes[assessment.assessment_id] = load_quiz(connect(), assessment.assessment_id,
+                                                                           assessment.quiz_version)
+            return quiz
+
+    def invalidate(self):
+        with self._lock:
+            self._quizzes.clear()
@@ -1,6 +1,6 @@
 -- Users Table
 CREATE TABLE Users (
-    user_id INT AUTO_INCREMENT PRIMARY KEY,
+    user_id INTEGER PRIMARY KEY AUTOINCREMENT,
     username VARCHAR(255) UNIQUE NOT NULL,
     email VARCHAR(255) UNIQUE NOT NULL,
     password_hash VARCHAR(255) NOT NULL,
@@ -10,14 +10,14 @@ CREATE TABLE Users (
 
 -- LearningPaths Table
 CREATE TABLE LearningPaths (
-    path_id INT AUTO_INCREMENT PRIMARY KEY,
+    path_id INTEGER PRIMARY KEY AUTOINCREMENT,
     path_name VARCHAR(255) NOT NULL,
     path_description TEXT
 );
 
 -- Tracks Table
 CREATE TABLE Tracks (
-    track_id INT AUTO_INCREMENT PRIMARY KEY,
+    track_id INTEGER PRIMARY KEY AUTOINCREMENT,
     track_name VARCHAR(255) NOT NULL,
     track_description TEXT,
     path_id INT,
@@ -27,7 +27,7 @@ CREATE TABLE Tracks (
 
 -- Courses Table
 CREATE TABLE Courses (
-    course_id INT AUTO_INCREMENT PRIMARY KEY,
+    course_id INTEGER PRIMARY KEY AUTOINCREMENT,
     track_id INT,
     course_name VARCHAR(255) NOT NULL,
     course_level_number INT NOT NULL,
@@ -40,7 +40,7 @@ CREATE TABLE Courses (
 
 -- Assessments Table
 CREATE TABLE Assessments (
-    assessment_id INT AUTO_INCREMENT PRIMARY KEY,
+    assessment_id INTEGER PRIMARY KEY AUTOINCREMENT,
     course_id INT,
     assessment_type VARCHAR(50), -- Enum-like: 'Theory', 'Practice', 'Project', 'Live Coding'
     description TEXT,
@@ -50,7 +50,7 @@ CREATE TABLE Assessments (
 
 -- UserProgress Table
 CREATE TABLE UserProgress (
-    progress_id INT AUTO_INCREMENT PRIMARY KEY,
+    progress_id INTEGER PRIMARY KEY AUTOINCREMENT,
     user_id INT,
     course_id INT,
     status VARCHAR(50), -- Enum-like: 'locked', 'unlocked', 'in_progress', 'completed', 'failed'
@@ -69,7 +69,7 @@ CREATE TABLE UserProgress (
 
 -- Achievements Table
 CREATE TABLE Achievements (
-    achievement_id INT AUTO_INCREMENT PRIMARY KEY,
+    achievement_id INTEGER PRIMARY KEY AUTOINCREMENT,
     achievement_name VARCHAR(255) NOT NULL,
     description TEXT,
     criteria TEXT,
@@ -79,7 +79,7 @@ CREATE TABLE Achievements (
 
 -- UserAchievements Table
 CREATE TABLE UserAchievements (
-    user_achievement_id INT AUTO_INCREMENT PRIMARY KEY,
+    user_achievement_id INTEGER PRIMARY KEY AUTOINCREMENT,
     user_id INT,
     achievement_id INT,
     unlocked_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
@@ -115,7 +115,6 @@ CREATE TABLE ForumPosts (
     FOREIGN KEY (thread_id) REFERENCES ForumThreads(thread_id),
     FOREIGN KEY (user_id) REFERENCES Users(user_id)
 );
-kodefun-initial-build
 
 -- Quiz System Tables
 CREATE TABLE IF NOT EXISTS QuizQuestions (
@@ -198,4 +197,6 @@ CREATE TABLE IF NOT EXISTS UserCodingSubmissions (
     FOREIGN KEY (assessment_id) REFERENCES Assessments(assessment_id),
     FOREIGN KEY (course_id) REFERENCES Courses(course_id)
 );
-main
+
+-- Secondary indexes and every later schema change are applied by the numbered
+-- migrations in update_schema.py (run automatically by init_db, or: flask migrate-db).
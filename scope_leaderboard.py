@@ -0,0 +1,102 @@
+"""
+Per-track and per-path leaderboards: learners ranked by completed courses,
+then by summed total_score, read from UserTrackSummary and UserPathSummary
+(maintained by triggers on every progress write, see track_summary.py).
+Only learners with a completion or some score are listed.
+
+Pages use keyset cursors rather than OFFSET: a cursor carries the last row's
+rank and (completed_count, total_score, user_id), and the next page is an
+index range starting just after that row, so page 500 costs what page 1
+does. Ties on both counts go to the higher user_id, which keeps the sort
+key one row value in one index direction.
+"""
+from leaderboard import usernames
+
+PAGE_SIZE = 20
+RANK_LIMIT = 10000 # Exact ranks are counted up to here; further down the user is "outside the top RANK_LIMIT"
+_START = (2 ** 63 - 1,) * 3 # Sorts after every real key
+
+TRACK_PAGE_SQL = """
+    SELECT user_id, completed_count, total_score FROM UserTrackSummary
+    WHERE track_id = ? AND (completed_count, total_score, user_id) < (?, ?, ?) AND (completed_count, total_score) > (0, 0)
+    ORDER BY completed_count DESC, total_score DESC, user_id DESC
+    LIMIT ?
+"""
+PATH_PAGE_SQL = """
+    SELECT user_id, completed_count, total_score FROM UserPathSummary
+    WHERE path_id = ? AND (completed_count, total_score, user_id) < (?, ?, ?) AND (completed_count, total_score) > (0, 0)
+    ORDER BY completed_count DESC, total_score DESC, user_id DESC
+    LIMIT ?
+"""
+# The user's own key (by primary key), then the rows ahead of it, counted no
+# further than RANK_LIMIT. The key is bound as parameters so the count is one
+# index range; correlated columns would only bound completed_count.
+TRACK_KEY_SQL = """
+    SELECT completed_count, total_score FROM UserTrackSummary
+    WHERE user_id = ? AND track_id = ? AND (completed_count, total_score) > (0, 0)
+"""
+TRACK_AHEAD_SQL = """
+    SELECT COUNT(*) FROM (
+        SELECT 1 FROM UserTrackSummary WHERE track_id = ? AND (completed_count, total_score, user_id) > (?, ?, ?) LIMIT ?
+    )
+"""
+PATH_KEY_SQL = """
+    SELECT completed_count, total_score FROM UserPathSummary
+    WHERE user_id = ? AND path_id = ? AND (completed_count, total_score) > (0, 0)
+"""
+PATH_AHEAD_SQL = """
+    SELECT COUNT(*) FROM (
+        SELECT 1 FROM UserPathSummary WHERE path_id = ? AND (completed_count, total_score, user_id) > (?, ?, ?) LIMIT ?
+    )
+"""
+
+SCOPES = {
+    'track': (TRACK_PAGE_SQL, TRACK_KEY_SQL, TRACK_AHEAD_SQL),
+    'path': (PATH_PAGE_SQL, PATH_KEY_SQL, PATH_AHEAD_SQL),
+}
+
+
+def encode_cursor(entry):
+    return f"{entry['rank']}.{entry['completed_count']}.{entry['total_score']}.{entry['user_id']}"
+
+
+def decode_cursor(value):
+    """(rank, completed_count, total_score, user_id) from encode_cursor(), or None for a missing or malformed cursor."""
+    try:
+        rank, completed_count, total_score, user_id = (int(part) for part in value.split('.'))
+    except (AttributeError, ValueError):
+        return None
+    return rank, completed_count, total_score, user_id
+
+
+def load_page(db, scope, scope_id, after=None, page_size=PAGE_SIZE):
+    """
+    One page of the scope's leaderboard after the cursor `after` (a string
+    from a previous page; None for the first page). Returns {'entries':
+    [...], 'next': cursor or None}; entries are dicts with rank, user_id,
+    username, completed_count and total_score.
+    """
+    page_sql = SCOPES[scope][0]
+    cursor = decode_cursor(after)
+    rank, key = (cursor[0], cursor[1:]) if cursor else (0, _START)
+    rows = db.execute(page_sql, (scope_id, *key, page_size + 1)).fetchall()
+    names = usernames(db, {row[0] for row in rows[:page_size]})
+    entries = [
+        {'rank': rank + i, 'user_id': row[0], 'username': names.get(row[0]), 'completed_count': row[1], 'total_score': row[2]}
+        for i, row in enumerate(rows[:page_size], 1)
+    ]
+    return {'entries': entries, 'next': encode_cursor(entries[-1]) if len(rows) > page_size else None}
+
+
+def load_rank(db, scope, scope_id, user_id, limit=RANK_LIMIT):
+    """
+    The user's {'rank', 'completed_count', 'total_score'} in the scope, or
+    None if they are not listed. Counting the rows ahead costs O(rank), so
+    it stops at `limit`: further down, 'rank' is None.
+    """
+    _, key_sql, ahead_sql = SCOPES[scope]
+    row = db.execute(key_sql, (user_id, scope_id)).fetchone()
+    if row is None:
+        return None
+    ahead = db.execute(ahead_sql, (scope_id, row[0], row[1], user_id, limit)).fetchone()[0]
+    return {'rank': ahead + 1 if ahead < limit else None, 'completed_count': row[0], 'total_score': row[1]}
@@ -0,0 +1,214 @@
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter, deque
+
+# Defaults for the per-request thresholds; see ProfileStore.from_config().
+DEFAULT_MAX_STATEMENTS = 30
+DEFAULT_MAX_DB_MS = 200
+DEFAULT_MAX_REPEATS = 5  # Same statement shape this many times in one request looks like N+1
+DEFAULT_HISTORY = 100
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+
+
+def fingerprint(sql):
+    """Normalises a statement so that calls differing only in literals compare equal."""
+    sql = _STRING_LITERAL.sub('?', sql)
+    sql = _NUMBER_LITERAL.sub('?', sql)
+    sql = _IN_LIST.sub('(?)', sql)
+    return ' '.join(sql.split())
+
+
+class QueryProfile:
+    """SQL activity of a single request: statement count, DB time and statement shapes."""
+
+    def __init__(self, method, path, endpoint):
+        self.method = method
+        self.path = path
+        self.endpoint = endpoint
+        self.started_at = time.time()
+        self.statements = 0
+        self.db_seconds = 0.0
+        self.fingerprints = Counter()
+        self.duration_seconds = None
+
+    def record(self, sql, seconds):
+        self.statements += 1
+        self.db_seconds += seconds
+        self.fingerprints[fingerprint(sql)] += 1
+
+    def add_time(self, seconds):
+        self.db_seconds += seconds
+
+    def finish(self):
+        self.duration_seconds = time.time() - self.started_at
+
+    def repeated(self, min_count):
+        """Statement shapes executed at least min_count times, most frequent first."""
+        return [(fp, count) for fp, count in self.fingerprints.most_common() if count >= min_count]
+
+    @classmethod
+    def from_dict(cls, entry):
+        """Rebuilds a finished profile from to_dict() output (e.g. a SQL_PROFILE_LOG line)."""
+        profile = cls(entry['method'], entry['path'], entry['endpoint'])
+        profile.started_at = entry['started_at']
+        profile.duration_seconds = entry['duration_ms'] / 1000.0
+        profile.statements = entry['statements']
+        profile.db_seconds = entry['db_ms'] / 1000.0
+        profile.fingerprints.update({item['sql']: item['count'] for item in entry['fingerprints']})
+        return profile
+
+    def to_dict(self):
+        return {
+            'method': self.method,
+            'path': self.path,
+            'endpoint': self.endpoint,
+            'started_at': self.started_at,
+            'duration_ms': round((self.duration_seconds or 0) * 1000, 2),
+            'statements': self.statements,
+            'db_ms': round(self.db_seconds * 1000, 2),
+            'fingerprints': [{'sql': fp, 'count': count} for fp, count in self.fingerprints.most_common()],
+        }
+
+
+class ProfiledCursor(sqlite3.Cursor):
+    """Cursor that charges execute and fetch time to its connection's active profile."""
+
+    def execute(self, sql, parameters=()):
+        profile = self.connection.profile
+        if profile is None:
+            return super().execute(sql, parameters)
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            profile.record(sql, time.perf_counter() - started)
+
+    def executemany(self, sql, seq_of_parameters):
+        profile = self.connection.profile
+        if profile is None:
+            return super().executemany(sql, seq_of_parameters)
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            profile.record(sql, time.perf_counter() - started)
+
+    def _timed_fetch(self, fetch, *args):
+        profile = self.connection.profile
+        if profile is None:
+            return fetch(*args)
+        started = time.perf_counter()
+        try:
+            return fetch(*args)
+        finally:
+            profile.add_time(time.perf_counter() - started)
+
+    def fetchone(self):
+        return self._timed_fetch(super().fetchone)
+
+    def fetchmany(self, size=None):
+        return self._timed_fetch(super().fetchmany, size if size is not None else self.arraysize)
+
+    def fetchall(self):
+        return self._timed_fetch(super().fetchall)
+
+
+class ProfiledConnection(sqlite3.Connection):
+    """
+    sqlite3 connection factory that reports every statement to `profile`
+    (a QueryProfile, or None while the connection sits idle in the pool).
+    """
+
+    profile = None
+
+    def cursor(self, factory=ProfiledCursor):
+        return super().cursor(factory)
+
+    # sqlite3.Connection.execute() does not go through Cursor.execute(), so the
+    # shortcuts are re-routed through a ProfiledCursor explicitly.
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+class ProfileStore:
+    """
+    Keeps the last N request profiles, warns about requests that exceed the
+    thresholds and optionally appends every profile to a JSON-lines file so
+    `flask sql-profiles` can dump them from another process.
+    """
+
+    def __init__(self, logger, max_statements=DEFAULT_MAX_STATEMENTS, max_db_ms=DEFAULT_MAX_DB_MS,
+                 max_repeats=DEFAULT_MAX_REPEATS, history=DEFAULT_HISTORY, log_path=None):
+        self.logger = logger
+        self.max_statements = max_statements
+        self.max_db_ms = max_db_ms
+        self.max_repeats = max_repeats
+        self.log_path = log_path
+        self._recent = deque(maxlen=history)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config, logger):
+        return cls(
+            logger,
+            max_statements=config.get('SQL_PROFILE_MAX_STATEMENTS', DEFAULT_MAX_STATEMENTS),
+            max_db_ms=config.get('SQL_PROFILE_MAX_DB_MS', DEFAULT_MAX_DB_MS),
+            max_repeats=config.get('SQL_PROFILE_MAX_REPEATS', DEFAULT_MAX_REPEATS),
+            history=config.get('SQL_PROFILE_HISTORY', DEFAULT_HISTORY),
+            log_path=config.get('SQL_PROFILE_LOG'),
+        )
+
+    def problems(self, profile):
+        """Human-readable list of thresholds the profile exceeds."""
+        found = []
+        if profile.statements > self.max_statements:
+            found.append(f"{profile.statements} statements (limit {self.max_statements})")
+        if profile.db_seconds * 1000 > self.max_db_ms:
+            found.append(f"{profile.db_seconds * 1000:.1f} ms in the database (limit {self.max_db_ms} ms)")
+        for sql, count in profile.repeated(self.max_repeats):
+            found.append(f"possible N+1: {count}x {sql}")
+        return found
+
+    def add(self, profile):
+        profile.finish()
+        problems = self.problems(profile)
+        if problems:
+            self.logger.warning("SQL profile for %s %s (%s): %s", profile.method, profile.path,
+                                profile.endpoint, '; '.join(problems))
+        entry = profile.to_dict()
+        with self._lock:
+            self._recent.append(entry)
+            if self.log_path:
+                with open(self.log_path, 'a') as f:
+                    f.write(json.dumps(entry) + '\n')
+
+    def recent(self, limit=None):
+        with self._lock:
+            entries = list(self._recent)
+        return entries[-limit:] if limit else entries
+
+
+def read_profile_log(path, limit):
+    """Returns the last `limit` profiles written to a SQL_PROFILE_LOG file."""
+    with open(path) as f:
+        lines = deque(f, maxlen=limit)
+    return [json.loads(line) for line in lines if line.strip()]
+
+
+def format_profile(entry):
+    lines = [
+        f"{entry['method']} {entry['path']} [{entry['endpoint']}] "
+        f"{entry['statements']} statements, {entry['db_ms']} ms DB / {entry['duration_ms']} ms total"
+    ]
+    for item in entry['fingerprints']:
+        lines.append(f"    {item['count']:>4}x  {item['sql']}")
+    return '\n'.join(lines)
@@ -0,0 +1,77 @@
+// Live forum updates: listens to a thread's or category's Server-Sent Events
+// stream (see forum_live.py). The browser reconnects on its own and resumes
+// from the last post it received.
+
+function buildPostCard(post) {
+    const card = document.createElement('div');
+    card.className = 'card mb-3';
+    card.id = 'post-' + post.post_id;
+
+    const header = document.createElement('div');
+    header.className = 'card-header d-flex justify-content-between';
+    const author = document.createElement('span');
+    const name = document.createElement('strong');
+    name.textContent = post.username;
+    author.appendChild(name);
+    author.appendChild(document.createTextNode(' replied:'));
+    const time = document.createElement('small');
+    time.className = 'text-muted';
+    time.textContent = String(post.created_at).slice(0, 16);
+    header.appendChild(author);
+    header.appendChild(time);
+
+    const body = document.createElement('div');
+    body.className = 'card-body';
+    const text = document.createElement('div');
+    text.className = 'card-text forum-post';
+    text.innerHTML = post.html; // Rendered and sanitized on the server (forum_markdown.py)
+    body.appendChild(text);
+
+    card.appendChild(header);
+    card.appendChild(body);
+    return card;
+}
+
+function showLiveNotice(noticeId, count, label) {
+    const notice = document.getElementById(noticeId);
+    if (!notice) {
+        return;
+    }
+    notice.querySelector('.live-count').textContent = count + ' ' + label + (count === 1 ? '' : 's');
+    notice.classList.remove('d-none');
+}
+
+// On the thread's last page new posts are appended; on earlier pages a notice links to the latest one.
+function initThreadLive(eventsUrl, postsContainerId, noticeId, appendPosts) {
+    if (!window.EventSource) {
+        return;
+    }
+    const container = document.getElementById(postsContainerId);
+    let unseen = 0;
+    const source = new EventSource(eventsUrl);
+    source.addEventListener('post', function(event) {
+        const post = JSON.parse(event.data);
+        if (document.getElementById('post-' + post.post_id)) {
+            return; // Already on the page (e.g. the reader's own reply)
+        }
+        if (appendPosts && container) {
+            container.appendChild(buildPostCard(post));
+        } else {
+            unseen += 1;
+            showLiveNotice(noticeId, unseen, 'new reply');
+        }
+    });
+}
+
+// Category pages only announce new activity; the listing order changes with every reply.
+function initCategoryLive(eventsUrl, noticeId) {
+    if (!window.EventSource) {
+        return;
+    }
+    let unseen = 0;
+    const source = new EventSource(eventsUrl);
+    source.addEventListener('post', function() {
+        unseen += 1;
+        showLiveNotice(noticeId, unseen, 'new post');
+    });
+}
@@ -0,0 +1,132 @@
+"""
+UserTrackSummary: one row per (user, track) with the number of completed,
+in-progress and failed courses, the summed total_score and the latest
+activity (a high-water mark: deleting or rewinding a progress row does not
+move it back). Triggers on UserProgress (migration 0010) keep it current
+inside the same transaction as every progress write, so readers never need
+to aggregate UserProgress themselves.
+
+UserPathSummary (migration 0013) rolls UserTrackSummary up per learning
+path the same way, from triggers on UserTrackSummary.
+
+The summaries can drift if a course moves to another track, a track to
+another path, or rows are changed with the triggers missing (e.g. a restore
+into an older schema); find_drift(), find_path_drift() and reconcile()
+detect and repair that, rebuild() starts over.
+"""
+import json
+
+SUMMARY_COLUMNS = "user_id, track_id, completed_count, in_progress_count, failed_count, total_score, last_activity_at"
+_SUMMARY_SELECT = """
+    SELECT up.user_id, c.track_id,
+           SUM(up.status IS 'completed') AS completed_count,
+           SUM(up.status IS 'in_progress') AS in_progress_count,
+           SUM(up.status IS 'failed') AS failed_count,
+           SUM(COALESCE(up.total_score, 0)) AS total_score,
+           MAX(COALESCE(up.last_attempt_at, up.completed_at)) AS last_activity_at
+    FROM UserProgress up JOIN Courses c ON c.course_id = up.course_id
+"""
+# The summary as computed from UserProgress, for everyone or for a JSON list of user ids.
+ACTUAL_SUMMARY_SQL = f"{_SUMMARY_SELECT} WHERE up.user_id IS NOT NULL GROUP BY up.user_id, c.track_id"
+USERS_ACTUAL_SUMMARY_SQL = f"{_SUMMARY_SELECT} WHERE up.user_id IN (SELECT value FROM json_each(?)) GROUP BY up.user_id, c.track_id"
+
+USER_SUMMARIES_SQL = f"SELECT {SUMMARY_COLUMNS} FROM UserTrackSummary WHERE user_id = ?"
+
+PATH_SUMMARY_COLUMNS = "user_id, path_id, completed_count, total_score"
+_PATH_SUMMARY_SELECT = """
+    SELECT UserTrackSummary.user_id, t.path_id,
+           SUM(UserTrackSummary.completed_count) AS completed_count, SUM(UserTrackSummary.total_score) AS total_score
+    FROM UserTrackSummary JOIN Tracks t ON t.track_id = UserTrackSummary.track_id
+"""
+ACTUAL_PATH_SUMMARY_SQL = f"{_PATH_SUMMARY_SELECT} WHERE t.path_id IS NOT NULL GROUP BY UserTrackSummary.user_id, t.path_id"
+USERS_ACTUAL_PATH_SUMMARY_SQL = f"""{_PATH_SUMMARY_SELECT}
+    WHERE t.path_id IS NOT NULL AND UserTrackSummary.user_id IN (SELECT value FROM json_each(?))
+    GROUP BY UserTrackSummary.user_id, t.path_id"""
+
+DRIFT_SQL = f"""
+    WITH actual AS ({ACTUAL_SUMMARY_SQL})
+    SELECT actual.user_id, actual.track_id, COALESCE(UserTrackSummary.completed_count, 0), actual.completed_count
+    FROM actual
+    LEFT JOIN UserTrackSummary ON UserTrackSummary.user_id = actual.user_id AND UserTrackSummary.track_id = actual.track_id
+    WHERE UserTrackSummary.user_id IS NULL
+       OR UserTrackSummary.completed_count IS NOT actual.completed_count
+       OR UserTrackSummary.in_progress_count IS NOT actual.in_progress_count
+       OR UserTrackSummary.failed_count IS NOT actual.failed_count
+       OR UserTrackSummary.total_score IS NOT actual.total_score
+       OR COALESCE(UserTrackSummary.last_activity_at, '') < COALESCE(actual.last_activity_at, '')
+    UNION ALL
+    SELECT UserTrackSummary.user_id, UserTrackSummary.track_id, UserTrackSummary.completed_count, 0
+    FROM UserTrackSummary
+    WHERE (UserTrackSummary.completed_count OR UserTrackSummary.in_progress_count
+           OR UserTrackSummary.failed_count OR UserTrackSummary.total_score)
+      AND NOT EXISTS (SELECT 1 FROM actual WHERE actual.user_id = UserTrackSummary.user_id AND actual.track_id = UserTrackSummary.track_id)
+    ORDER BY 1, 2
+"""
+PATH_DRIFT_SQL = f"""
+    WITH actual AS ({ACTUAL_PATH_SUMMARY_SQL})
+    SELECT actual.user_id, actual.path_id, COALESCE(UserPathSummary.completed_count, 0), actual.completed_count
+    FROM actual
+    LEFT JOIN UserPathSummary ON UserPathSummary.user_id = actual.user_id AND UserPathSummary.path_id = actual.path_id
+    WHERE UserPathSummary.user_id IS NULL
+       OR UserPathSummary.completed_count IS NOT actual.completed_count
+       OR UserPathSummary.total_score IS NOT actual.total_score
+    UNION ALL
+    SELECT UserPathSummary.user_id, UserPathSummary.path_id, UserPathSummary.completed_count, 0
+    FROM UserPathSummary
+    WHERE (UserPathSummary.completed_count OR UserPathSummary.total_score)
+      AND NOT EXISTS (SELECT 1 FROM actual WHERE actual.user_id = UserPathSummary.user_id AND actual.path_id = UserPathSummary.path_id)
+    ORDER BY 1, 2
+"""
+
+
+def load_user_summaries(db, user_id):
+    """{track_id: summary row} for one user, in one primary-key range read."""
+    return {row['track_id']: row for row in db.execute(USER_SUMMARIES_SQL, (user_id,)).fetchall()}
+
+
+def find_drift(conn):
+    """Returns (user_id, track_id, stored completed_count, actual completed_count) for every summary row that disagrees with UserProgress."""
+    return conn.execute(DRIFT_SQL).fetchall()
+
+
+def find_path_drift(conn):
+    """Returns (user_id, path_id, stored completed_count, actual completed_count) for every path row that disagrees with UserTrackSummary."""
+    return conn.execute(PATH_DRIFT_SQL).fetchall()
+
+
+def rebuild(conn, user_ids=None):
+    """
+    Recomputes the track summaries from UserProgress and the path summaries
+    from those, for everyone or only for the given users, in one
+    transaction. Returns the number of track summary rows written.
+    """
+    try:
+        if user_ids is None:
+            conn.execute("DELETE FROM UserTrackSummary")
+            cursor = conn.execute(f"INSERT INTO UserTrackSummary ({SUMMARY_COLUMNS}) {ACTUAL_SUMMARY_SQL}")
+            # The triggers carried the rebuild over to the path rows, along with any drift they had
+            conn.execute("DELETE FROM UserPathSummary")
+            conn.execute(f"INSERT INTO UserPathSummary ({PATH_SUMMARY_COLUMNS}) {ACTUAL_PATH_SUMMARY_SQL}")
+        else:
+            users = json.dumps(sorted(user_ids))
+            conn.execute("DELETE FROM UserTrackSummary WHERE user_id IN (SELECT value FROM json_each(?))", (users,))
+            cursor = conn.execute(f"INSERT INTO UserTrackSummary ({SUMMARY_COLUMNS}) {USERS_ACTUAL_SUMMARY_SQL}", (users,))
+            conn.execute("DELETE FROM UserPathSummary WHERE user_id IN (SELECT value FROM json_each(?))", (users,))
+            conn.execute(f"INSERT INTO UserPathSummary ({PATH_SUMMARY_COLUMNS}) {USERS_ACTUAL_PATH_SUMMARY_SQL}", (users,))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return cursor.rowcount
+
+
+def reconcile(conn, fix=False):
+    """
+    Compares UserTrackSummary with UserProgress and UserPathSummary with
+    UserTrackSummary. With fix=True the drifted users' summaries are rebuilt
+    (UserProgress is the source of truth). Returns (track drift, path drift).
+    """
+    drift, path_drift = find_drift(conn), find_path_drift(conn)
+    if fix and (drift or path_drift):
+        rebuild(conn, {row[0] for row in drift} | {row[0] for row in path_drift})
+    return drift, path_drift
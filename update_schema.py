@@ -1,30 +1,147 @@
 import sqlite3
 import os
+import re
+import sys
+from collections import namedtuple
 
 DATABASE_PATH = 'kodefun.db'
 SCHEMA_PATH = 'schema.sql'
 
-def table_exists(cursor, table_name):
+# A migration is a numbered, named list of steps. A step is either a SQL
+# statement or a callable taking the connection (for data fixes that need
+# Python). Migrations only ever move forward; never edit one that has shipped,
+# add a new one instead.
+Migration = namedtuple('Migration', ['version', 'name', 'steps'])
+
+# Tables originally declared with MySQL-style "INT AUTO_INCREMENT PRIMARY KEY".
+# In SQLite that is not a rowid alias: the id is a separate, nullable column
+# behind an extra unique index and is never auto-assigned. Listed parent-first.
+ROWID_REBUILD_TABLES = [
+    'Users', 'LearningPaths', 'Tracks', 'Courses', 'Assessments',
+    'UserProgress', 'Achievements', 'UserAchievements',
+]
+
+LEGACY_PK_PATTERN = re.compile(r'\bINT\s+AUTO_INCREMENT\s+PRIMARY\s+KEY\b', re.IGNORECASE)
+
+
+def table_exists(conn, table_name):
     """Checks if a table exists in the database."""
-    cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name=?;", (table_name,))
-    return cursor.fetchone() is not None
+    row = conn.execute("SELECT name FROM sqlite_master WHERE type='table' AND name=?", (table_name,)).fetchone()
+    return row is not None
+
+
+def has_rowid_alias_pk(conn, table):
+    pk_columns = [col for col in conn.execute(f"PRAGMA table_info({table})").fetchall() if col[5]]
+    return len(pk_columns) == 1 and pk_columns[0][2].upper() == 'INTEGER'
+
 
-def apply_new_schema_parts(conn):
+def count_foreign_key_violations(conn):
+    return len(conn.execute("PRAGMA foreign_key_check").fetchall())
+
+
+def rebuild_with_rowid_pk(conn, table):
     """
-    Applies only the new parts of the schema (Forum tables) if they don't exist.
-    Reads the entire schema.sql but specifically looks for Forum table creations.
+    Rebuilds one table so its primary key becomes INTEGER PRIMARY KEY (a rowid
+    alias), preserving every row. Must run inside a transaction.
+
+    Rows whose id was never assigned (NULL) take their rowid, which is what
+    the code inserting them got back from cursor.lastrowid and stored in child
+    tables. If that rowid is already used as another row's id, the row gets a
+    fresh id instead. Indexes and triggers on the table are recreated.
+    Returns (rows_before, rows_after, reassigned_ids).
     """
-    cursor = conn.cursor()
-    
-    new_tables_schemas = {
-        "ForumCategories": """
-CREATE TABLE ForumCategories (
+    create_sql = conn.execute(
+        "SELECT sql FROM sqlite_master WHERE type='table' AND name=?", (table,)
+    ).fetchone()[0]
+    dependents = [row[0] for row in conn.execute(
+        "SELECT sql FROM sqlite_master WHERE type IN ('index', 'trigger') AND tbl_name=? AND sql IS NOT NULL", (table,)
+    ).fetchall()]
+    table_info = conn.execute(f"PRAGMA table_info({table})").fetchall()
+    columns = [col[1] for col in table_info]
+    pk = [col[1] for col in table_info if col[5]][0]
+    temp_table = f"{table}__rebuild"
+
+    new_sql = LEGACY_PK_PATTERN.sub('INTEGER PRIMARY KEY AUTOINCREMENT', create_sql, count=1)
+    new_sql = re.sub(rf'^CREATE TABLE\s+["`]?{table}["`]?', f'CREATE TABLE {temp_table}', new_sql, count=1)
+    conn.execute(new_sql)
+
+    rows_before = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    column_list = ", ".join(columns)
+    select_list = ", ".join(f"COALESCE({pk}, rowid)" if col == pk else col for col in columns)
+    collides = f"{pk} IS NULL AND rowid IN (SELECT {pk} FROM {table} WHERE {pk} IS NOT NULL)"
+    conn.execute(f"INSERT INTO {temp_table} ({column_list}) SELECT {select_list} FROM {table} WHERE NOT ({collides}) ORDER BY rowid")
+    reassigned = conn.execute(f"SELECT COUNT(*) FROM {table} WHERE {collides}").fetchone()[0]
+    if reassigned:
+        other_columns = [col for col in columns if col != pk]
+        conn.execute(
+            f"INSERT INTO {temp_table} ({', '.join(other_columns)}) SELECT {', '.join(other_columns)} FROM {table} WHERE {collides} ORDER BY rowid"
+        )
+
+    conn.execute(f"DROP TABLE {table}")
+    conn.execute(f"ALTER TABLE {temp_table} RENAME TO {table}")
+    for sql in dependents:
+        conn.execute(sql)
+    rows_after = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    return rows_before, rows_after, reassigned
+
+
+def rebuild_core_tables(conn, log=print):
+    """Rebuild the core tables with INTEGER PRIMARY KEY (rowid alias) ids."""
+    # Checks are deferred to COMMIT so parents can be swapped out from under
+    # their children; the explicit check below then compares with the start.
+    conn.execute("PRAGMA defer_foreign_keys = ON")
+    violations_before = count_foreign_key_violations(conn)
+    for table in ROWID_REBUILD_TABLES:
+        if not table_exists(conn, table) or has_rowid_alias_pk(conn, table):
+            continue
+        rows_before, rows_after, reassigned = rebuild_with_rowid_pk(conn, table)
+        if rows_before != rows_after:
+            raise sqlite3.IntegrityError(f"Rebuild of {table} changed the row count ({rows_before} -> {rows_after}).")
+        note = f", {reassigned} id(s) reassigned" if reassigned else ""
+        log(f"  Rebuilt {table}: {rows_after} row(s){note}.")
+    violations_after = count_foreign_key_violations(conn)
+    if violations_after > violations_before:
+        raise sqlite3.IntegrityError(
+            f"Table rebuild introduced foreign key violations ({violations_before} -> {violations_after})."
+        )
+
+
+# Rules for the achievements shipped by populate_achievements.py: what the old
+# hard-coded checks in evaluate_course_completion implemented. Frozen with
+# migration 0007; rule changes go in populate_achievements.py or a new migration.
+SEED_ACHIEVEMENT_RULES = [
+    ('JavaScript Novice', 'course_completed', '{"courses": ["LEVEL 1: JavaScript Fundamentals"]}'),
+    ('PHP Beginner', 'course_completed', '{"courses": ["LEVEL 1: PHP Fundamentals"]}'),
+    ('Web Dev Starter', 'course_completed', '{"courses": ["L1: Frontend - HTML5 Semantics & Accessibility"]}'),
+    ('JS Functions Pro', 'course_completed', '{"courses": ["LEVEL 2: Functions & Scope"]}'),
+    ('DOM Manipulator', 'course_completed', '{"courses": ["LEVEL 4: DOM Manipulation"]}'),
+    ('PHP OOP Basics', 'course_completed', '{"courses": ["LEVEL 3: OOP in PHP (Basic)"]}'),
+    ('Full-Stack Foundation', 'course_completed',
+     '{"courses": ["L3: Frontend - JavaScript DOM & Events", "L6: Backend - MySQL & Full-Stack Integration"]}'),
+    ('Five Courses Down!', 'course_count', '{"min_completed": 5}'),
+    ('First Track Completed!', 'track_completed', '{}'),
+    ('Halfway There!', 'track_progress', '{"min_completed": 6, "min_track_courses": 10}'),
+]
+
+
+def seed_achievement_rules(conn, log=print):
+    """Fills trigger_event and rule for the shipped achievements that have none yet."""
+    conn.executemany(
+        "UPDATE Achievements SET trigger_event = ?, rule = ? WHERE achievement_name = ? AND trigger_event IS NULL",
+        [(trigger, rule, name) for name, trigger, rule in SEED_ACHIEVEMENT_RULES]
+    )
+
+
+MIGRATIONS = [
+    Migration(1, 'forum_quiz_coding_tables', [
+        # Databases created before the forum, quiz and coding exercise features
+        # only have the original eight tables.
+        """CREATE TABLE IF NOT EXISTS ForumCategories (
     category_id INTEGER PRIMARY KEY AUTOINCREMENT,
     name VARCHAR(255) UNIQUE NOT NULL,
     description TEXT
-);""",
-        "ForumThreads": """
-CREATE TABLE ForumThreads (
+)""",
+        """CREATE TABLE IF NOT EXISTS ForumThreads (
     thread_id INTEGER PRIMARY KEY AUTOINCREMENT,
     category_id INTEGER NOT NULL,
     user_id INTEGER NOT NULL,
@@ -32,9 +149,8 @@ CREATE TABLE ForumThreads (
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (category_id) REFERENCES ForumCategories(category_id),
     FOREIGN KEY (user_id) REFERENCES Users(user_id)
-);""",
-        "ForumPosts": """
-CREATE TABLE ForumPosts (
+)""",
+        """CREATE TABLE IF NOT EXISTS ForumPosts (
     post_id INTEGER PRIMARY KEY AUTOINCREMENT,
     thread_id INTEGER NOT NULL,
     user_id INTEGER NOT NULL,
@@ -42,26 +158,22 @@ CREATE TABLE ForumPosts (
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (thread_id) REFERENCES ForumThreads(thread_id),
     FOREIGN KEY (user_id) REFERENCES Users(user_id)
-kodefun-initial-build
-);""",
-        "QuizQuestions": """
-CREATE TABLE IF NOT EXISTS QuizQuestions (
+)""",
+        """CREATE TABLE IF NOT EXISTS QuizQuestions (
     question_id INTEGER PRIMARY KEY AUTOINCREMENT,
     assessment_id INTEGER NOT NULL,
     question_text TEXT NOT NULL,
     question_type VARCHAR(50) DEFAULT 'multiple-choice',
     FOREIGN KEY (assessment_id) REFERENCES Assessments(assessment_id)
-);""",
-        "QuizChoices": """
-CREATE TABLE IF NOT EXISTS QuizChoices (
+)""",
+        """CREATE TABLE IF NOT EXISTS QuizChoices (
     choice_id INTEGER PRIMARY KEY AUTOINCREMENT,
     question_id INTEGER NOT NULL,
     choice_text TEXT NOT NULL,
     is_correct BOOLEAN NOT NULL DEFAULT FALSE,
     FOREIGN KEY (question_id) REFERENCES QuizQuestions(question_id)
-);""",
-        "UserQuizAttempts": """
-CREATE TABLE IF NOT EXISTS UserQuizAttempts (
+)""",
+        """CREATE TABLE IF NOT EXISTS UserQuizAttempts (
     attempt_id INTEGER PRIMARY KEY AUTOINCREMENT,
     user_id INTEGER NOT NULL,
     assessment_id INTEGER NOT NULL,
@@ -74,9 +186,8 @@ CREATE TABLE IF NOT EXISTS UserQuizAttempts (
     FOREIGN KEY (user_id) REFERENCES Users(user_id),
     FOREIGN KEY (assessment_id) REFERENCES Assessments(assessment_id),
     FOREIGN KEY (course_id) REFERENCES Courses(course_id)
-);""",
-        "UserQuizAnswers": """
-CREATE TABLE IF NOT EXISTS UserQuizAnswers (
+)""",
+        """CREATE TABLE IF NOT EXISTS UserQuizAnswers (
     user_answer_id INTEGER PRIMARY KEY AUTOINCREMENT,
     attempt_id INTEGER NOT NULL,
     question_id INTEGER NOT NULL,
@@ -85,19 +196,17 @@ CREATE TABLE IF NOT EXISTS UserQuizAnswers (
     FOREIGN KEY (attempt_id) REFERENCES UserQuizAttempts(attempt_id),
     FOREIGN KEY (question_id) REFERENCES QuizQuestions(question_id),
     FOREIGN KEY (chosen_choice_id) REFERENCES QuizChoices(choice_id)
-);""",
-        "CodingExercises": """
-CREATE TABLE IF NOT EXISTS CodingExercises (
+)""",
+        """CREATE TABLE IF NOT EXISTS CodingExercises (
     exercise_id INTEGER PRIMARY KEY AUTOINCREMENT,
     assessment_id INTEGER NOT NULL,
     title VARCHAR(255) NOT NULL,
     description TEXT NOT NULL,
     starter_code TEXT,
-    function_name VARCHAR(100) DEFAULT 'solve', 
+    function_name VARCHAR(100) DEFAULT 'solve',
     FOREIGN KEY (assessment_id) REFERENCES Assessments(assessment_id)
-);""",
-        "CodingExerciseTestCases": """
-CREATE TABLE IF NOT EXISTS CodingExerciseTestCases (
+)""",
+        """CREATE TABLE IF NOT EXISTS CodingExerciseTestCases (
     test_case_id INTEGER PRIMARY KEY AUTOINCREMENT,
     exercise_id INTEGER NOT NULL,
     input_data TEXT,
@@ -105,13 +214,12 @@ CREATE TABLE IF NOT EXISTS CodingExerciseTestCases (
     is_hidden BOOLEAN DEFAULT FALSE,
     description TEXT,
     FOREIGN KEY (exercise_id) REFERENCES CodingExercises(exercise_id)
-);""",
-        "UserCodingSubmissions": """
-CREATE TABLE IF NOT EXISTS UserCodingSubmissions (
+)""",
+        """CREATE TABLE IF NOT EXISTS UserCodingSubmissions (
     submission_id INTEGER PRIMARY KEY AUTOINCREMENT,
     user_id INTEGER NOT NULL,
     exercise_id INTEGER NOT NULL,
-    assessment_id INTEGER NOT NULL, 
+    assessment_id INTEGER NOT NULL,
     course_id INTEGER NOT NULL,
     submitted_code TEXT NOT NULL,
     passed_tests INTEGER NOT NULL,
@@ -123,57 +231,567 @@ CREATE TABLE IF NOT EXISTS UserCodingSubmissions (
     FOREIGN KEY (exercise_id) REFERENCES CodingExercises(exercise_id),
     FOREIGN KEY (assessment_id) REFERENCES Assessments(assessment_id),
     FOREIGN KEY (course_id) REFERENCES Courses(course_id)
-);"""
-    }
-
-    print("--- Checking and Applying New Schema Parts (Forum, Quiz & Coding Exercise Tables) ---")
-);"""
-    }
-
-    print("--- Checking and Applying New Schema Parts (Forum Tables) ---")
-main
-    applied_count = 0
-    for table_name, table_sql in new_tables_schemas.items():
-        if not table_exists(cursor, table_name):
-            try:
-                print(f"Creating table '{table_name}'...")
-kodefun-initial-build
-                cursor.executescript(table_sql)
-                cursor.executescript(table_sql) # Use executescript for potentially multiple statements or complex definitions
-main
-                conn.commit()
-                print(f"Table '{table_name}' created successfully.")
-                applied_count += 1
-            except sqlite3.Error as e:
-                print(f"Error creating table '{table_name}': {e}")
-kodefun-initial-build
-                conn.rollback()
-                conn.rollback() # Rollback on error for this table
-main
-        else:
-            print(f"Table '{table_name}' already exists. Skipping.")
-            
-    if applied_count > 0:
-        print(f"\nApplied {applied_count} new table(s) to the schema.")
-    else:
-kodefun-initial-build
-        print("\nNo new tables needed to be applied. Schema likely up-to-date for these specific tables.")
-        print("\nNo new forum tables needed to be applied. Schema likely up-to-date for forum features.")
- main
-
-def main():
+)""",
+    ]),
+    Migration(2, 'hot_path_indexes', [
+        # Duplicate progress/achievement rows (from races in the old
+        # check-then-insert code) would block the UNIQUE indexes. Keep the
+        # oldest row, which is the one the app has been reading.
+        "DELETE FROM UserProgress WHERE rowid NOT IN (SELECT MIN(rowid) FROM UserProgress GROUP BY user_id, course_id)",
+        "DELETE FROM UserAchievements WHERE rowid NOT IN (SELECT MIN(rowid) FROM UserAchievements GROUP BY user_id, achievement_id)",
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_userprogress_user_course ON UserProgress (user_id, course_id)",
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_userachievements_user_achievement ON UserAchievements (user_id, achievement_id)",
+        "CREATE INDEX IF NOT EXISTS idx_users_xp ON Users (xp_points DESC, user_id)",
+        "CREATE INDEX IF NOT EXISTS idx_tracks_path ON Tracks (path_id, track_name)",
+        "CREATE INDEX IF NOT EXISTS idx_courses_track_order ON Courses (track_id, order_in_track)",
+        "CREATE INDEX IF NOT EXISTS idx_courses_name ON Courses (course_name)",
+        "CREATE INDEX IF NOT EXISTS idx_assessments_course ON Assessments (course_id, assessment_id)",
+        "CREATE INDEX IF NOT EXISTS idx_achievements_name ON Achievements (achievement_name)",
+        "CREATE INDEX IF NOT EXISTS idx_forumthreads_category ON ForumThreads (category_id, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_forumposts_thread ON ForumPosts (thread_id, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_quizquestions_assessment ON QuizQuestions (assessment_id)",
+        "CREATE INDEX IF NOT EXISTS idx_quizchoices_question ON QuizChoices (question_id)",
+        "CREATE INDEX IF NOT EXISTS idx_userquizattempts_user_assessment ON UserQuizAttempts (user_id, assessment_id, attempt_number)",
+        "CREATE INDEX IF NOT EXISTS idx_userquizanswers_attempt ON UserQuizAnswers (attempt_id)",
+        "CREATE INDEX IF NOT EXISTS idx_codingexercises_assessment ON CodingExercises (assessment_id)",
+        "CREATE INDEX IF NOT EXISTS idx_codingtestcases_exercise ON CodingExerciseTestCases (exercise_id, is_hidden)",
+        "CREATE INDEX IF NOT EXISTS idx_usercodingsubmissions_user_exercise ON UserCodingSubmissions (user_id, exercise_id)",
+    ]),
+    Migration(3, 'rowid_alias_primary_keys', [
+        rebuild_core_tables,
+    ]),
+    Migration(4, 'catalog_version', [
+        # Single-row counter bumped by the populate_* scripts whenever the
+        # static catalog changes; running apps reload their catalog cache.
+        """CREATE TABLE IF NOT EXISTS CatalogVersion (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    version INTEGER NOT NULL DEFAULT 1
+)""",
+        "INSERT OR IGNORE INTO CatalogVersion (id, version) VALUES (1, 1)",
+    ]),
+    Migration(5, 'course_prerequisites', [
+        # Explicit prerequisites on top of the implicit "previous course in the
+        # same track" rule, e.g. a course that needs courses from another track.
+        """CREATE TABLE IF NOT EXISTS CoursePrerequisites (
+    course_id INTEGER NOT NULL,
+    prerequisite_course_id INTEGER NOT NULL,
+    PRIMARY KEY (course_id, prerequisite_course_id),
+    CHECK (course_id <> prerequisite_course_id),
+    FOREIGN KEY (course_id) REFERENCES Courses(course_id),
+    FOREIGN KEY (prerequisite_course_id) REFERENCES Courses(course_id)
+) WITHOUT ROWID""",
+        "CREATE INDEX IF NOT EXISTS idx_courseprerequisites_prerequisite ON CoursePrerequisites (prerequisite_course_id)",
+    ]),
+    Migration(6, 'xp_ledger', [
+        # Append-only record of every XP change; Users.xp_points is the running
+        # total of a user's entries (see xp_ledger.py).
+        """CREATE TABLE IF NOT EXISTS XpLedger (
+    entry_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    amount INTEGER NOT NULL,
+    reason VARCHAR(50) NOT NULL,
+    source_id INTEGER,
+    idempotency_key VARCHAR(255) UNIQUE,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES Users(user_id)
+)""",
+        "CREATE INDEX IF NOT EXISTS idx_xpledger_user ON XpLedger (user_id, created_at)",
+        # Existing balances become each user's opening entry so the ledger
+        # reconciles from day one.
+        """INSERT OR IGNORE INTO XpLedger (user_id, amount, reason, idempotency_key)
+           SELECT user_id, xp_points, 'opening_balance', 'opening_balance:' || user_id
+           FROM Users WHERE COALESCE(xp_points, 0) <> 0""",
+    ]),
+    Migration(7, 'achievement_rules', [
+        # Machine-readable trigger and criteria next to the human-readable
+        # criteria text; see achievement_rules.py for the rule format.
+        "ALTER TABLE Achievements ADD COLUMN trigger_event VARCHAR(50)",
+        "ALTER TABLE Achievements ADD COLUMN rule TEXT",
+        seed_achievement_rules,
+        "CREATE INDEX IF NOT EXISTS idx_forumposts_user ON ForumPosts (user_id)",
+        "UPDATE CatalogVersion SET version = version + 1 WHERE id = 1",
+    ]),
+    Migration(8, 'backfill_checkpoints', [
+        # One row per finished shard of a resumable batch job (flask award-backfill).
+        """CREATE TABLE IF NOT EXISTS BackfillCheckpoints (
+    job VARCHAR(100) NOT NULL,
+    shard_start INTEGER NOT NULL,
+    shard_end INTEGER NOT NULL,
+    awards INTEGER NOT NULL DEFAULT 0,
+    completed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (job, shard_start)
+) WITHOUT ROWID""",
+    ]),
+    Migration(9, 'event_outbox', [
+        # Domain events written in the same transaction as the change that caused
+        # them and consumed by the outbox worker (see event_outbox.py).
+        """CREATE TABLE IF NOT EXISTS EventOutbox (
+    event_id INTEGER PRIMARY KEY,
+    event_type VARCHAR(50) NOT NULL,
+    user_id INTEGER NOT NULL,
+    payload TEXT NOT NULL DEFAULT '{}',
+    status VARCHAR(10) NOT NULL DEFAULT 'pending', -- pending, done, dead
+    attempts INTEGER NOT NULL DEFAULT 0,
+    available_at TIMESTAMP NOT NULL,
+    claimed_until TIMESTAMP,
+    last_error TEXT,
+    created_at TIMESTAMP NOT NULL,
+    processed_at TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES Users(user_id)
+)""",
+        "CREATE INDEX IF NOT EXISTS idx_eventoutbox_status ON EventOutbox (status, available_at)",
+        "CREATE INDEX IF NOT EXISTS idx_eventoutbox_processed ON EventOutbox (processed_at) WHERE status = 'done'",
+    ]),
+    Migration(10, 'user_track_summary', [
+        # Per-user, per-track rollup of UserProgress, kept current by the triggers
+        # below (see track_summary.py for the rebuild and the consistency check).
+        """CREATE TABLE IF NOT EXISTS UserTrackSummary (
+    user_id INTEGER NOT NULL,
+    track_id INTEGER NOT NULL,
+    completed_count INTEGER NOT NULL DEFAULT 0,
+    in_progress_count INTEGER NOT NULL DEFAULT 0,
+    failed_count INTEGER NOT NULL DEFAULT 0,
+    total_score INTEGER NOT NULL DEFAULT 0,
+    last_activity_at TIMESTAMP,
+    PRIMARY KEY (user_id, track_id),
+    FOREIGN KEY (user_id) REFERENCES Users(user_id),
+    FOREIGN KEY (track_id) REFERENCES Tracks(track_id)
+) WITHOUT ROWID""",
+        """INSERT INTO UserTrackSummary
+    (user_id, track_id, completed_count, in_progress_count, failed_count, total_score, last_activity_at)
+SELECT up.user_id, c.track_id,
+       SUM(up.status IS 'completed'), SUM(up.status IS 'in_progress'), SUM(up.status IS 'failed'),
+       SUM(COALESCE(up.total_score, 0)), MAX(COALESCE(up.last_attempt_at, up.completed_at))
+FROM UserProgress up JOIN Courses c ON c.course_id = up.course_id
+WHERE up.user_id IS NOT NULL
+GROUP BY up.user_id, c.track_id
+ON CONFLICT (user_id, track_id) DO NOTHING""",
+        # Adds a UserProgress row's contribution to its summary row.
+        """CREATE TRIGGER IF NOT EXISTS trg_userprogress_summary_insert AFTER INSERT ON UserProgress
+BEGIN
+    INSERT INTO UserTrackSummary
+        (user_id, track_id, completed_count, in_progress_count, failed_count, total_score, last_activity_at)
+    SELECT NEW.user_id, track_id, NEW.status IS 'completed', NEW.status IS 'in_progress', NEW.status IS 'failed',
+           COALESCE(NEW.total_score, 0), COALESCE(NEW.last_attempt_at, NEW.completed_at)
+    FROM Courses WHERE course_id = NEW.course_id AND NEW.user_id IS NOT NULL
+    ON CONFLICT (user_id, track_id) DO UPDATE SET
+        completed_count = completed_count + excluded.completed_count,
+        in_progress_count = in_progress_count + excluded.in_progress_count,
+        failed_count = failed_count + excluded.failed_count,
+        total_score = total_score + excluded.total_score,
+        last_activity_at = CASE WHEN excluded.last_activity_at > COALESCE(last_activity_at, '')
+                                THEN excluded.last_activity_at ELSE last_activity_at END;
+END""",
+        # Takes the old contribution out and puts the new one in; only fires when a summarised column changed.
+        """CREATE TRIGGER IF NOT EXISTS trg_userprogress_summary_update
+AFTER UPDATE OF user_id, course_id, status, total_score, last_attempt_at, completed_at ON UserProgress
+WHEN OLD.user_id IS NOT NEW.user_id OR OLD.course_id IS NOT NEW.course_id OR OLD.status IS NOT NEW.status
+  OR OLD.total_score IS NOT NEW.total_score OR OLD.last_attempt_at IS NOT NEW.last_attempt_at
+  OR OLD.completed_at IS NOT NEW.completed_at
+BEGIN
+    UPDATE UserTrackSummary SET
+        completed_count = completed_count - (OLD.status IS 'completed'),
+        in_progress_count = in_progress_count - (OLD.status IS 'in_progress'),
+        failed_count = failed_count - (OLD.status IS 'failed'),
+        total_score = total_score - COALESCE(OLD.total_score, 0)
+    WHERE user_id = OLD.user_id AND track_id = (SELECT track_id FROM Courses WHERE course_id = OLD.course_id);
+    INSERT INTO UserTrackSummary
+        (user_id, track_id, completed_count, in_progress_count, failed_count, total_score, last_activity_at)
+    SELECT NEW.user_id, track_id, NEW.status IS 'completed', NEW.status IS 'in_progress', NEW.status IS 'failed',
+           COALESCE(NEW.total_score, 0), COALESCE(NEW.last_attempt_at, NEW.completed_at)
+    FROM Courses WHERE course_id = NEW.course_id AND NEW.user_id IS NOT NULL
+    ON CONFLICT (user_id, track_id) DO UPDATE SET
+        completed_count = completed_count + excluded.completed_count,
+        in_progress_count = in_progress_count + excluded.in_progress_count,
+        failed_count = failed_count + excluded.failed_count,
+        total_score = total_score + excluded.total_score,
+        last_activity_at = CASE WHEN excluded.last_activity_at > COALESCE(last_activity_at, '')
+                                THEN excluded.last_activity_at ELSE last_activity_at END;
+END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_userprogress_summary_delete AFTER DELETE ON UserProgress
+BEGIN
+    UPDATE UserTrackSummary SET
+        completed_count = completed_count - (OLD.status IS 'completed'),
+        in_progress_count = in_progress_count - (OLD.status IS 'in_progress'),
+        failed_count = failed_count - (OLD.status IS 'failed'),
+        total_score = total_score - COALESCE(OLD.total_score, 0)
+    WHERE user_id = OLD.user_id AND track_id = (SELECT track_id FROM Courses WHERE course_id = OLD.course_id);
+END""",
+    ]),
+    Migration(11, 'dashboard_version', [
+        # Bumped by every write that changes what the dashboard shows (see dashboard_summary.py).
+        "ALTER TABLE Users ADD COLUMN dashboard_version INTEGER NOT NULL DEFAULT 0",
+    ]),
+    Migration(12, 'xp_windows', [
+        # XP earned per user per day, and each rolling window's per-user total
+        # (see xp_windows.py). The trigger below keeps both current.
+        """CREATE TABLE IF NOT EXISTS XpDaily (
+    user_id INTEGER NOT NULL,
+    day DATE NOT NULL,
+    xp INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, day),
+    FOREIGN KEY (user_id) REFERENCES Users(user_id)
+) WITHOUT ROWID""",
+        "CREATE INDEX IF NOT EXISTS idx_xpdaily_day ON XpDaily (day, user_id)",
+        """CREATE TABLE IF NOT EXISTS XpWindows (
+    period VARCHAR(10) PRIMARY KEY,
+    days INTEGER NOT NULL,
+    first_day DATE NOT NULL
+)""",
+        """INSERT OR IGNORE INTO XpWindows (period, days, first_day)
+VALUES ('week', 7, date('now', '-6 days')), ('month', 30, date('now', '-29 days'))""",
+        """CREATE TABLE IF NOT EXISTS XpWindowTotals (
+    period VARCHAR(10) NOT NULL,
+    user_id INTEGER NOT NULL,
+    xp INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (period, user_id),
+    FOREIGN KEY (user_id) REFERENCES Users(user_id)
+) WITHOUT ROWID""",
+        "CREATE INDEX IF NOT EXISTS idx_xpwindowtotals_rank ON XpWindowTotals (period, xp DESC, user_id)",
+        # Compacted entries only fold old entries together, so they are not XP earned that day.
+        """INSERT INTO XpDaily (user_id, day, xp)
+SELECT user_id, COALESCE(date(created_at), date('now')), SUM(amount) FROM XpLedger WHERE reason <> 'compacted'
+GROUP BY 1, 2
+ON CONFLICT (user_id, day) DO NOTHING""",
+        """INSERT INTO XpWindowTotals (period, user_id, xp)
+SELECT w.period, d.user_id, SUM(d.xp) FROM XpWindows w JOIN XpDaily d ON d.day >= w.first_day
+GROUP BY w.period, d.user_id
+ON CONFLICT (period, user_id) DO NOTHING""",
+        # Adds every award to its day and to each window that already covers that day.
+        """CREATE TRIGGER IF NOT EXISTS trg_xpledger_windows_insert AFTER INSERT ON XpLedger
+WHEN NEW.reason <> 'compacted'
+BEGIN
+    INSERT INTO XpDaily (user_id, day, xp) VALUES (NEW.user_id, COALESCE(date(NEW.created_at), date('now')), NEW.amount)
+    ON CONFLICT (user_id, day) DO UPDATE SET xp = xp + excluded.xp;
+    INSERT INTO XpWindowTotals (period, user_id, xp)
+    SELECT period, NEW.user_id, NEW.amount FROM XpWindows WHERE first_day <= COALESCE(date(NEW.created_at), date('now'))
+    ON CONFLICT (period, user_id) DO UPDATE SET xp = xp + excluded.xp;
+END""",
+    ]),
+    Migration(13, 'scope_leaderboards', [
+        # Per-track ranking reads UserTrackSummary in this order (see scope_leaderboard.py).
+        "CREATE INDEX IF NOT EXISTS idx_usertracksummary_rank ON UserTrackSummary (track_id, completed_count, total_score, user_id)",
+        # Per-path rollup of UserTrackSummary, kept current by the triggers below.
+        """CREATE TABLE IF NOT EXISTS UserPathSummary (
+    user_id INTEGER NOT NULL,
+    path_id INTEGER NOT NULL,
+    completed_count INTEGER NOT NULL DEFAULT 0,
+    total_score INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, path_id),
+    FOREIGN KEY (user_id) REFERENCES Users(user_id),
+    FOREIGN KEY (path_id) REFERENCES LearningPaths(path_id)
+) WITHOUT ROWID""",
+        "CREATE INDEX IF NOT EXISTS idx_userpathsummary_rank ON UserPathSummary (path_id, completed_count, total_score, user_id)",
+        """INSERT INTO UserPathSummary (user_id, path_id, completed_count, total_score)
+SELECT s.user_id, t.path_id, SUM(s.completed_count), SUM(s.total_score)
+FROM UserTrackSummary s JOIN Tracks t ON t.track_id = s.track_id
+WHERE t.path_id IS NOT NULL
+GROUP BY s.user_id, t.path_id
+ON CONFLICT (user_id, path_id) DO NOTHING""",
+        """CREATE TRIGGER IF NOT EXISTS trg_usertracksummary_path_insert AFTER INSERT ON UserTrackSummary
+BEGIN
+    INSERT INTO UserPathSummary (user_id, path_id, completed_count, total_score)
+    SELECT NEW.user_id, path_id, NEW.completed_count, NEW.total_score
+    FROM Tracks WHERE track_id = NEW.track_id AND path_id IS NOT NULL
+    ON CONFLICT (user_id, path_id) DO UPDATE SET
+        completed_count = completed_count + excluded.completed_count,
+        total_score = total_score + excluded.total_score;
+END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_usertracksummary_path_update
+AFTER UPDATE OF user_id, track_id, completed_count, total_score ON UserTrackSummary
+WHEN OLD.user_id IS NOT NEW.user_id OR OLD.track_id IS NOT NEW.track_id
+  OR OLD.completed_count IS NOT NEW.completed_count OR OLD.total_score IS NOT NEW.total_score
+BEGIN
+    UPDATE UserPathSummary SET
+        completed_count = completed_count - OLD.completed_count,
+        total_score = total_score - OLD.total_score
+    WHERE user_id = OLD.user_id AND path_id = (SELECT path_id FROM Tracks WHERE track_id = OLD.track_id);
+    INSERT INTO UserPathSummary (user_id, path_id, completed_count, total_score)
+    SELECT NEW.user_id, path_id, NEW.completed_count, NEW.total_score
+    FROM Tracks WHERE track_id = NEW.track_id AND path_id IS NOT NULL
+    ON CONFLICT (user_id, path_id) DO UPDATE SET
+        completed_count = completed_count + excluded.completed_count,
+        total_score = total_score + excluded.total_score;
+END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_usertracksummary_path_delete AFTER DELETE ON UserTrackSummary
+BEGIN
+    UPDATE UserPathSummary SET
+        completed_count = completed_count - OLD.completed_count,
+        total_score = total_score - OLD.total_score
+    WHERE user_id = OLD.user_id AND path_id = (SELECT path_id FROM Tracks WHERE track_id = OLD.track_id);
+END""",
+    ]),
+    Migration(14, 'forum_thread_stats', [
+        # Counters for the forum listings, kept current by the triggers below
+        # (see forum_stats.py for the backfill and the consistency check).
+        "ALTER TABLE ForumThreads ADD COLUMN post_count INTEGER NOT NULL DEFAULT 0",
+        "ALTER TABLE ForumThreads ADD COLUMN last_post_at TIMESTAMP",
+        "ALTER TABLE ForumThreads ADD COLUMN last_post_user_id INTEGER REFERENCES Users(user_id)",
+        "ALTER TABLE ForumCategories ADD COLUMN thread_count INTEGER NOT NULL DEFAULT 0",
+        "ALTER TABLE ForumCategories ADD COLUMN post_count INTEGER NOT NULL DEFAULT 0",
+        "CREATE INDEX IF NOT EXISTS idx_forumthreads_activity ON ForumThreads (category_id, last_post_at DESC, created_at DESC)",
+        """UPDATE ForumThreads SET
+    post_count = (SELECT COUNT(*) FROM ForumPosts p WHERE p.thread_id = ForumThreads.thread_id),
+    last_post_at = (SELECT p.created_at FROM ForumPosts p WHERE p.thread_id = ForumThreads.thread_id
+                    ORDER BY p.created_at DESC, p.post_id DESC LIMIT 1),
+    last_post_user_id = (SELECT p.user_id FROM ForumPosts p WHERE p.thread_id = ForumThreads.thread_id
+                         ORDER BY p.created_at DESC, p.post_id DESC LIMIT 1)""",
+        """UPDATE ForumCategories SET
+    thread_count = (SELECT COUNT(*) FROM ForumThreads t WHERE t.category_id = ForumCategories.category_id),
+    post_count = (SELECT COALESCE(SUM(t.post_count), 0) FROM ForumThreads t WHERE t.category_id = ForumCategories.category_id)""",
+        # The newest post (latest created_at, then highest post_id) is the thread's last post.
+        """CREATE TRIGGER IF NOT EXISTS trg_forumposts_stats_insert AFTER INSERT ON ForumPosts
+BEGIN
+    UPDATE ForumThreads SET
+        post_count = post_count + 1,
+        last_post_user_id = CASE WHEN NEW.created_at >= COALESCE(last_post_at, '') THEN NEW.user_id ELSE last_post_user_id END,
+        last_post_at = CASE WHEN NEW.created_at >= COALESCE(last_post_at, '') THEN NEW.created_at ELSE last_post_at END
+    WHERE thread_id = NEW.thread_id;
+    UPDATE ForumCategories SET post_count = post_count + 1
+    WHERE category_id = (SELECT category_id FROM ForumThreads WHERE thread_id = NEW.thread_id);
+END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_forumposts_stats_delete AFTER DELETE ON ForumPosts
+BEGIN
+    UPDATE ForumThreads SET
+        post_count = post_count - 1,
+        last_post_at = (SELECT created_at FROM ForumPosts WHERE thread_id = OLD.thread_id ORDER BY created_at DESC, post_id DESC LIMIT 1),
+        last_post_user_id = (SELECT user_id FROM ForumPosts WHERE thread_id = OLD.thread_id ORDER BY created_at DESC, post_id DESC LIMIT 1)
+    WHERE thread_id = OLD.thread_id;
+    UPDATE ForumCategories SET post_count = post_count - 1
+    WHERE category_id = (SELECT category_id FROM ForumThreads WHERE thread_id = OLD.thread_id);
+END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_forumthreads_stats_insert AFTER INSERT ON ForumThreads
+BEGIN
+    UPDATE ForumCategories SET thread_count = thread_count + 1, post_count = post_count + NEW.post_count
+    WHERE category_id = NEW.category_id;
+END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_forumthreads_stats_move AFTER UPDATE OF category_id ON ForumThreads
+WHEN OLD.category_id IS NOT NEW.category_id
+BEGIN
+    UPDATE ForumCategories SET thread_count = thread_count - 1, post_count = post_count - OLD.post_count
+    WHERE category_id = OLD.category_id;
+    UPDATE ForumCategories SET thread_count = thread_count + 1, post_count = post_count + NEW.post_count
+    WHERE category_id = NEW.category_id;
+END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_forumthreads_stats_delete AFTER DELETE ON ForumThreads
+BEGIN
+    UPDATE ForumCategories SET thread_count = thread_count - 1, post_count = post_count - OLD.post_count
+    WHERE category_id = OLD.category_id;
+END""",
+    ]),
+    Migration(15, 'forum_keyset_pages', [
+        # Indexes matching the keyset cursors of forum_pages.py. The post index
+        # also serves the last-post lookups of the triggers above, and the
+        # thread index replaces the listing order of migration 0014.
+        "CREATE INDEX IF NOT EXISTS idx_forumposts_thread_page ON ForumPosts (thread_id, created_at, post_id)",
+        "DROP INDEX IF EXISTS idx_forumposts_thread",
+        "CREATE INDEX IF NOT EXISTS idx_forumthreads_page ON ForumThreads (category_id, COALESCE(last_post_at, created_at), thread_id)",
+        "DROP INDEX IF EXISTS idx_forumthreads_activity",
+    ]),
+    Migration(16, 'forum_search', [
+        # Full-text index of thread titles (rowid -thread_id) and post bodies
+        # (rowid post_id), see forum_search.py. Title matches rank 10x body matches.
+        "CREATE VIRTUAL TABLE IF NOT EXISTS ForumSearch USING fts5(title, body, thread_id UNINDEXED, tokenize = 'unicode61 remove_diacritics 2')",
+        "INSERT INTO ForumSearch (ForumSearch, rank) VALUES ('rank', 'bm25(10.0, 1.0)')",
+        "INSERT INTO ForumSearch (rowid, title, body, thread_id) SELECT -thread_id, title, '', thread_id FROM ForumThreads",
+        "INSERT INTO ForumSearch (rowid, title, body, thread_id) SELECT post_id, '', content, thread_id FROM ForumPosts",
+        """CREATE TRIGGER IF NOT EXISTS trg_forumthreads_search_insert AFTER INSERT ON ForumThreads
+BEGIN
+    INSERT INTO ForumSearch (rowid, title, body, thread_id) VALUES (-NEW.thread_id, NEW.title, '', NEW.thread_id);
+END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_forumthreads_search_update AFTER UPDATE OF title ON ForumThreads
+WHEN OLD.title IS NOT NEW.title
+BEGIN
+    UPDATE ForumSearch SET title = NEW.title WHERE rowid = -NEW.thread_id;
+END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_forumthreads_search_delete AFTER DELETE ON ForumThreads
+BEGIN
+    DELETE FROM ForumSearch WHERE rowid = -OLD.thread_id;
+END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_forumposts_search_insert AFTER INSERT ON ForumPosts
+BEGIN
+    INSERT INTO ForumSearch (rowid, title, body, thread_id) VALUES (NEW.post_id, '', NEW.content, NEW.thread_id);
+END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_forumposts_search_update AFTER UPDATE OF content, thread_id ON ForumPosts
+WHEN OLD.content IS NOT NEW.content OR OLD.thread_id IS NOT NEW.thread_id
+BEGIN
+    UPDATE ForumSearch SET body = NEW.content, thread_id = NEW.thread_id WHERE rowid = NEW.post_id;
+END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_forumposts_search_delete AFTER DELETE ON ForumPosts
+BEGIN
+    DELETE FROM ForumSearch WHERE rowid = OLD.post_id;
+END""",
+    ]),
+    Migration(17, 'forum_post_html', [
+        # Markdown rendered at write time (forum_markdown.py). Existing posts
+        # have no renderer yet; the re-render job fills them in.
+        "ALTER TABLE ForumPosts ADD COLUMN content_html TEXT",
+        "ALTER TABLE ForumPosts ADD COLUMN content_renderer TEXT",
+        "CREATE INDEX IF NOT EXISTS idx_forumposts_renderer ON ForumPosts (content_renderer)",
+    ]),
+    Migration(18, 'forum_read_markers', [
+        # Unread tracking (forum_unread.py): each thread's highest post_id,
+        # kept current like the counters of migration 0014, compared with the
+        # user's per-thread marker and per-category watermark.
+        "ALTER TABLE ForumThreads ADD COLUMN last_post_id INTEGER",
+        "UPDATE ForumThreads SET last_post_id = (SELECT MAX(p.post_id) FROM ForumPosts p WHERE p.thread_id = ForumThreads.thread_id)",
+        "CREATE INDEX IF NOT EXISTS idx_forumthreads_unread ON ForumThreads (category_id, last_post_id)",
+        """CREATE TABLE IF NOT EXISTS ForumReadMarkers (
+    user_id INTEGER NOT NULL REFERENCES Users(user_id),
+    thread_id INTEGER NOT NULL REFERENCES ForumThreads(thread_id),
+    last_read_post_id INTEGER NOT NULL,
+    PRIMARY KEY (user_id, thread_id)
+) WITHOUT ROWID""",
+        """CREATE TABLE IF NOT EXISTS ForumCategoryReads (
+    user_id INTEGER NOT NULL REFERENCES Users(user_id),
+    category_id INTEGER NOT NULL REFERENCES ForumCategories(category_id),
+    last_read_post_id INTEGER NOT NULL,
+    PRIMARY KEY (user_id, category_id)
+) WITHOUT ROWID""",
+        """CREATE TRIGGER IF NOT EXISTS trg_forumposts_lastid_insert AFTER INSERT ON ForumPosts
+BEGIN
+    UPDATE ForumThreads SET last_post_id = MAX(COALESCE(last_post_id, 0), NEW.post_id) WHERE thread_id = NEW.thread_id;
+END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_forumposts_lastid_delete AFTER DELETE ON ForumPosts
+BEGIN
+    UPDATE ForumThreads SET last_post_id = (SELECT MAX(post_id) FROM ForumPosts WHERE thread_id = OLD.thread_id)
+    WHERE thread_id = OLD.thread_id AND last_post_id = OLD.post_id;
+END""",
+    ]),
+    Migration(19, 'view_counts', [
+        # Written in batches by view_counter.py. Course views live outside
+        # Courses so the catalog rows stay static.
+        "ALTER TABLE ForumThreads ADD COLUMN view_count INTEGER NOT NULL DEFAULT 0",
+        """CREATE TABLE IF NOT EXISTS CourseViews (
+    course_id INTEGER PRIMARY KEY REFERENCES Courses(course_id),
+    view_count INTEGER NOT NULL DEFAULT 0
+)""",
+    ]),
+    Migration(20, 'quiz_version', [
+        # Compiled quizzes (quiz_cache.py) are kept per (assessment_id, quiz_version);
+        # any write to an assessment's questions or choices moves its version.
+        "ALTER TABLE Assessments ADD COLUMN quiz_version INTEGER NOT NULL DEFAULT 0",
+        """CREATE TRIGGER IF NOT EXISTS trg_quizquestions_version_insert AFTER INSERT ON QuizQuestions
+BEGIN
+    UPDATE Assessments SET quiz_version = quiz_version + 1 WHERE assessment_id = NEW.assessment_id;
+END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_quizquestions_version_update AFTER UPDATE ON QuizQuestions
+BEGIN
+    UPDATE Assessments SET quiz_version = quiz_version + 1 WHERE assessment_id IN (OLD.assessment_id, NEW.assessment_id);
+END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_quizquestions_version_delete AFTER DELETE ON QuizQuestions
+BEGIN
+    UPDATE Assessments SET quiz_version = quiz_version + 1 WHERE assessment_id = OLD.assessment_id;
+END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_quizchoices_version_insert AFTER INSERT ON QuizChoices
+BEGIN
+    UPDATE Assessments SET quiz_version = quiz_version + 1
+    WHERE assessment_id = (SELECT assessment_id FROM QuizQuestions WHERE question_id = NEW.question_id);
+END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_quizchoices_version_update AFTER UPDATE ON QuizChoices
+BEGIN
+    UPDATE Assessments SET quiz_version = quiz_version + 1
+    WHERE assessment_id IN (SELECT assessment_id FROM QuizQuestions WHERE question_id IN (OLD.question_id, NEW.question_id));
+END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_quizchoices_version_delete AFTER DELETE ON QuizChoices
+BEGIN
+    UPDATE Assessments SET quiz_version = quiz_version + 1
+    WHERE assessment_id = (SELECT assessment_id FROM QuizQuestions WHERE question_id = OLD.question_id);
+END""",
+    ]),
+]
+
+
+def ensure_version_table(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    conn.commit()
+
+
+def current_version(conn):
+    """Returns the highest applied migration version (0 for a fresh or legacy database)."""
+    row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    return row[0] or 0
+
+
+def pending_migrations(conn, target=None):
+    version = current_version(conn)
+    return [m for m in MIGRATIONS if m.version > version and (target is None or m.version <= target)]
+
+
+def describe_step(step):
+    if callable(step):
+        doc = (step.__doc__ or '').strip()
+        return f"<python> {step.__name__}" + (f": {doc.splitlines()[0]}" if doc else '')
+    return " ".join(step.split())
+
+
+def apply_migration(conn, migration, log=print):
+    """
+    Runs one migration and records it in schema_version, all in a single
+    transaction. Python steps are called as step(conn, log).
+    """
+    if conn.in_transaction:
+        conn.commit()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for step in migration.steps:
+            if callable(step):
+                step(conn, log)
+            else:
+                conn.execute(step)
+        conn.execute("INSERT INTO schema_version (version, name) VALUES (?, ?)", (migration.version, migration.name))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def migrate(conn, dry_run=False, verbose=True, target=None):
+    """
+    Brings the database up to the latest migration (or up to `target`).
+    With dry_run=True only prints what would be executed. Returns the list of
+    migrations that were (or would have been) applied.
+    """
+    ensure_version_table(conn)
+    pending = pending_migrations(conn, target)
+    if verbose:
+        print(f"Current schema version: {current_version(conn)}. Latest: {MIGRATIONS[-1].version}.")
+    for migration in pending:
+        if dry_run:
+            print(f"[dry-run] Would apply {migration.version:04d}_{migration.name}:")
+            for step in migration.steps:
+                print(f"    {describe_step(step)}")
+            continue
+        if verbose:
+            print(f"Applying {migration.version:04d}_{migration.name}...")
+        apply_migration(conn, migration, log=print if verbose else lambda message: None)
+    if verbose and not pending:
+        print("Schema is up to date.")
+    return pending
+
+
+def main(argv):
+    dry_run = '--dry-run' in argv
     if not os.path.exists(DATABASE_PATH):
         print(f"Error: Database file '{DATABASE_PATH}' not found. Please run app.py or flask init-db first.")
-        return
+        return 1
 
     conn = sqlite3.connect(DATABASE_PATH)
     try:
-        apply_new_schema_parts(conn)
-    except Exception as e:
+        migrate(conn, dry_run=dry_run)
+    except sqlite3.Error as e:
         print(f"An error occurred during schema update: {e}")
+        return 1
     finally:
         conn.close()
         print("Database connection closed.")
+    return 0
 
 if __name__ == '__main__':
-    main()
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,168 @@
+import ast
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+
+from update_schema import migrate
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SCHEMA_PATH = os.path.join(BASE_DIR, 'schema.sql')
+
+# Modules whose SQL runs on the request path, each with the tables it may
+# legitimately read in full. Everything else must be reached through an index.
+SOURCE_FILES = {
+    'app.py': set(),
+    # The catalog cache loads the whole (small, static) catalog once per version.
+    'catalog_cache.py': {'LearningPaths', 'Tracks', 'Courses', 'Assessments', 'Achievements'},
+    'quiz_cache.py': set(),
+    'achievement_rules.py': set(),
+    'achievement_backfill.py': set(),
+    'course_events.py': set(),
+    'event_outbox.py': set(),
+    'dashboard_summary.py': set(),
+    # The in-memory leaderboard is seeded from every user once per process.
+    'leaderboard.py': {'Users'},
+    # XpWindows holds one row per leaderboard window.
+    'xp_windows.py': {'XpWindows'},
+    'scope_leaderboard.py': set(),
+    # The drift check and backfill read every thread by design.
+    'forum_stats.py': {'ForumThreads', 'ForumCategories'},
+    'forum_pages.py': set(),
+    'forum_live.py': set(),
+    'forum_markdown.py': set(),
+    # Unread counts are computed for each of the (few) categories.
+    'forum_unread.py': {'ForumCategories'},
+    # Rebuilding the search index re-reads every thread and post by design.
+    'forum_search.py': {'ForumThreads', 'ForumPosts'},
+    # Reconciliation and compaction are offline maintenance over every user.
+    'xp_ledger.py': {'Users', 'XpLedger'},
+    # The summary rebuilds and consistency checks read everything by design.
+    'track_summary.py': {'UserProgress', 'UserTrackSummary', 'UserPathSummary'},
+}
+
+
+def extract_queries(path):
+    """
+    Returns (line, sql) for every literal SQL string passed to an execute()
+    call in the given module, including module-level SQL constants passed by
+    name and every module-level constant named *_SQL (which may be picked at
+    runtime). f-strings are included with module-level string constants
+    substituted and any other placeholder replaced by a representative
+    column name.
+    """
+    with open(path) as f:
+        tree = ast.parse(f.read(), filename=path)
+    constants = {}
+    queries = []
+    for node in tree.body:
+        if not isinstance(node, ast.Assign):
+            continue
+        value = string_value(node.value, constants)
+        if value is None:
+            continue
+        for target in node.targets:
+            if isinstance(target, ast.Name):
+                constants[target.id] = value
+                if target.id.endswith('_SQL'):
+                    queries.append((node.lineno, value))
+    for node in ast.walk(tree):
+        if not (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute)):
+            continue
+        if node.func.attr not in ('execute', 'executemany') or not node.args:
+            continue
+        arg = node.args[0]
+        if isinstance(arg, ast.Constant) and isinstance(arg.value, str):
+            queries.append((node.lineno, arg.value))
+        elif isinstance(arg, ast.Name) and arg.id in constants and not arg.id.endswith('_SQL'):
+            queries.append((node.lineno, constants[arg.id]))
+        elif isinstance(arg, ast.JoinedStr):
+            queries.append((node.lineno, string_value(arg, constants, placeholder='current_score_theory')))
+    return sorted(queries)
+
+
+def string_value(node, constants, placeholder=None):
+    """
+    The value of a string literal, or of an f-string built from literals and
+    module-level string constants. Other placeholders become `placeholder`
+    (or make the value unknown: None).
+    """
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return node.value
+    if not isinstance(node, ast.JoinedStr):
+        return None
+    parts = []
+    for value in node.values:
+        if isinstance(value, ast.Constant):
+            parts.append(value.value)
+        elif isinstance(value.value, ast.Name) and value.value.id in constants:
+            parts.append(constants[value.value.id])
+        elif placeholder is not None:
+            parts.append(placeholder)
+        else:
+            return None
+    return ''.join(parts)
+
+
+def build_database(db_path):
+    conn = sqlite3.connect(db_path)
+    with open(SCHEMA_PATH) as f:
+        conn.executescript(f.read())
+    migrate(conn, verbose=False)
+    return conn
+
+
+def offending_scans(conn, sql, allowed_full_scans=()):
+    """Returns the plan lines that scan a table without using an index."""
+    if sql.lstrip().upper().startswith(('PRAGMA', 'BEGIN', 'COMMIT')):
+        return []
+    params = [None] * sql.count('?')
+    plan = conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+    ctes = set(re.findall(r'(\w+)\s+AS\s*\(', sql, re.IGNORECASE))
+    ctes.update(re.findall(r'\)\s+AS\s+(\w+)', sql, re.IGNORECASE)) # FROM (subquery) AS name
+    offending = []
+    for row in plan:
+        detail = row[-1]
+        if not detail.startswith('SCAN ') or detail == 'SCAN CONSTANT ROW':
+            continue
+        if 'USING INDEX' in detail or 'USING COVERING INDEX' in detail or 'USING INTEGER PRIMARY KEY' in detail:
+            continue
+        if 'VIRTUAL TABLE INDEX' in detail:
+            # Table-valued functions (json_each over a bound list) and virtual
+            # tables pick their own access path.
+            continue
+        table = detail.split()[1]
+        if table.startswith('(') or table in ctes:
+            continue # Materialised subquery or CTE: already planned on its own
+        if table in allowed_full_scans:
+            continue
+        offending.append(detail)
+    return offending
+
+
+def main():
+    failures = 0
+    checked = 0
+    with tempfile.TemporaryDirectory() as workdir:
+        conn = build_database(os.path.join(workdir, 'plans.db'))
+        for source, allowed_full_scans in SOURCE_FILES.items():
+            for line, sql in extract_queries(os.path.join(BASE_DIR, source)):
+                checked += 1
+                try:
+                    offending = offending_scans(conn, sql, allowed_full_scans)
+                except sqlite3.Error as e:
+                    failures += 1
+                    print(f"FAIL {source}:{line}: could not plan query ({e})")
+                    continue
+                if offending:
+                    failures += 1
+                    print(f"FAIL {source}:{line}: {' | '.join(offending)}")
+                    print(f"     {' '.join(sql.split())}")
+        conn.close()
+
+    print(f"Checked {checked} queries: {checked - failures} ok, {failures} full table scan(s).")
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,135 @@
+"""
+Buffered view counters for forum threads and course pages.
+
+A GET only adds to an in-memory Counter; a ViewCounter thread per process
+writes the totals every flush_seconds in one transaction (and once more when
+stopped, e.g. at interpreter exit), so readers never queue behind SQLite's
+single writer for a view. Each request thread adds to its own shard - a
+Counter behind its own lock, so concurrent views do not contend - and the
+flush empties every shard and merges them. Flushes add to the stored
+counts, so several worker processes each flushing their own buffer sum up.
+
+Counts in the database trail the real ones by up to flush_seconds, and the
+views buffered in a process that is killed outright are lost; a view count
+can afford both.
+"""
+import itertools
+import os
+import threading
+from collections import Counter
+
+DEFAULT_FLUSH_SECONDS = 5.0
+DEFAULT_SHARDS = 8
+
+FLUSH_SQL = {
+    'thread': "UPDATE ForumThreads SET view_count = view_count + ? WHERE thread_id = ?",
+    'course': """
+        INSERT INTO CourseViews (course_id, view_count) VALUES (?2, ?1)
+        ON CONFLICT (course_id) DO UPDATE SET view_count = view_count + excluded.view_count
+    """,
+}
+
+
+class ViewCounter:
+    """
+    Aggregates views per (kind, id) in memory and flushes them in batches.
+    `connect` returns the flusher's own write connection (opened on first
+    flush). Kinds are the keys of FLUSH_SQL.
+    """
+
+    def __init__(self, connect, flush_seconds=DEFAULT_FLUSH_SECONDS, shards=DEFAULT_SHARDS):
+        self.connect = connect
+        self.flush_seconds = flush_seconds
+        self.pid = os.getpid()
+        self.flushed = 0
+        self._shards = [(threading.Lock(), Counter()) for _ in range(shards)]
+        self._next_shard = itertools.count()
+        self._local = threading.local()
+        self._flush_lock = threading.Lock()
+        self._conn = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None: # Threads take shards round-robin on their first view
+            shard = self._local.shard = self._shards[next(self._next_shard) % len(self._shards)]
+        return shard
+
+    def add(self, kind, item_id, count=1):
+        lock, counts = self._shard()
+        with lock:
+            counts[(kind, item_id)] += count
+
+    def pending(self):
+        """The buffered views not yet flushed, merged: {(kind, id): count}."""
+        merged = Counter()
+        for lock, counts in self._shards:
+            with lock:
+                merged.update(counts)
+        return merged
+
+    def _take(self):
+        merged = Counter()
+        for lock, counts in self._shards:
+            with lock: # Emptied in place: threads keep their shard for good
+                merged.update(counts)
+                counts.clear()
+        return merged
+
+    def flush(self):
+        """Writes the buffered views in one transaction; returns how many. On failure they go back in the buffer."""
+        with self._flush_lock:
+            counts = self._take()
+            if not counts:
+                return 0
+            try:
+                if self._conn is None:
+                    self._conn = self.connect()
+                for kind, sql in FLUSH_SQL.items():
+                    rows = [(count, item_id) for (item_kind, item_id), count in counts.items() if item_kind == kind]
+                    if rows:
+                        self._conn.executemany(sql, rows)
+                self._conn.commit()
+            except Exception:
+                if self._conn is not None:
+                    self._conn.rollback()
+                lock, shard = self._shards[0]
+                with lock:
+                    shard.update(counts)
+                raise
+            total = sum(counts.values())
+            self.flushed += total
+            return total
+
+    # --- Background flushing ---
+    def run_forever(self):
+        while not self._stop.wait(self.flush_seconds):
+            try:
+                self.flush()
+            except Exception as e: # e.g. the database is locked for longer than busy_timeout
+                print(f"View counter flush error: {e}")
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run_forever, name='view-counter', daemon=True)
+        self._thread.start()
+        return self
+
+    def is_alive(self):
+        return self._thread is not None and self._thread.is_alive() and self.pid == os.getpid()
+
+    def stop(self, timeout=None):
+        """Stops the thread, then flushes what is still buffered and closes the connection."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        if self.pid != os.getpid():
+            return # A forked copy: the buffer belongs to the parent, which flushes it
+        try:
+            self.flush()
+        except Exception as e:
+            print(f"View counter final flush error: {e}")
+        finally:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
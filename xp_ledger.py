@@ -0,0 +1,156 @@
+import json
+from datetime import datetime, timedelta
+
+# Entries younger than this are never compacted, so their idempotency keys
+# keep protecting against retried awards.
+DEFAULT_COMPACT_AFTER_DAYS = 90
+
+
+def course_completion_key(user_id, course_id):
+    return f"course_completed:{user_id}:{course_id}"
+
+
+def achievement_key(user_id, achievement_id):
+    return f"achievement:{user_id}:{achievement_id}"
+
+
+def award_xp(db, user_id, amount, reason, source_id=None, idempotency_key=None):
+    """
+    Appends an XpLedger entry and adds it to Users.xp_points with a single
+    relative UPDATE, so concurrent awards never overwrite each other. An
+    award whose idempotency_key is already in the ledger is ignored.
+
+    Returns the user's new xp_points, or None if the award was a duplicate.
+    Does not commit: the ledger row and the balance change belong to the
+    caller's transaction.
+    """
+    cursor = db.execute(
+        """INSERT INTO XpLedger (user_id, amount, reason, source_id, idempotency_key, created_at)
+           VALUES (?, ?, ?, ?, ?, ?)
+           ON CONFLICT (idempotency_key) DO NOTHING""",
+        (user_id, amount, reason, source_id, idempotency_key, datetime.utcnow())
+    )
+    if cursor.rowcount == 0:
+        return None
+    row = db.execute(
+        "UPDATE Users SET xp_points = COALESCE(xp_points, 0) + ? WHERE user_id = ? RETURNING xp_points",
+        (amount, user_id)
+    ).fetchone()
+    return row[0] if row else None
+
+
+def award_xp_batch(db, user_id, entries):
+    """
+    award_xp() for several (amount, reason, source_id, idempotency_key)
+    entries at once: one INSERT for the ledger rows and one relative UPDATE
+    for their total. Entries with an already-used key are ignored.
+
+    Returns the user's new xp_points, or None if nothing was awarded.
+    Does not commit.
+    """
+    if not entries:
+        return None
+    inserted = db.execute(
+        """INSERT INTO XpLedger (user_id, amount, reason, source_id, idempotency_key, created_at)
+           SELECT ?, json_extract(value, '$[0]'), json_extract(value, '$[1]'), json_extract(value, '$[2]'),
+                  json_extract(value, '$[3]'), ?
+           FROM json_each(?) WHERE true
+           ON CONFLICT (idempotency_key) DO NOTHING
+           RETURNING amount""",
+        (user_id, datetime.utcnow(), json.dumps([list(entry) for entry in entries]))
+    ).fetchall()
+    if not inserted:
+        return None
+    row = db.execute(
+        "UPDATE Users SET xp_points = COALESCE(xp_points, 0) + ? WHERE user_id = ? RETURNING xp_points",
+        (sum(r[0] for r in inserted), user_id)
+    ).fetchone()
+    return row[0] if row else None
+
+
+def award_xp_bulk(db, entries):
+    """
+    Ledger entries for many users at once, as (user_id, amount, reason,
+    source_id, idempotency_key) tuples: one INSERT for the ledger rows, then
+    one relative UPDATE per affected user. Entries with an already-used key
+    are ignored. Returns {user_id: xp added}. Does not commit.
+    """
+    if not entries:
+        return {}
+    inserted = db.execute(
+        """INSERT INTO XpLedger (user_id, amount, reason, source_id, idempotency_key, created_at)
+           SELECT json_extract(value, '$[0]'), json_extract(value, '$[1]'), json_extract(value, '$[2]'),
+                  json_extract(value, '$[3]'), json_extract(value, '$[4]'), ?
+           FROM json_each(?) WHERE true
+           ON CONFLICT (idempotency_key) DO NOTHING
+           RETURNING user_id, amount""",
+        (datetime.utcnow(), json.dumps([list(entry) for entry in entries]))
+    ).fetchall()
+    added = {}
+    for user_id, amount in inserted:
+        added[user_id] = added.get(user_id, 0) + amount
+    db.executemany(
+        "UPDATE Users SET xp_points = COALESCE(xp_points, 0) + ? WHERE user_id = ?",
+        [(amount, user_id) for user_id, amount in added.items()]
+    )
+    return added
+
+
+def find_drift(conn):
+    """Returns (user_id, xp_points, ledger_total) for every user whose balance disagrees with the ledger."""
+    return conn.execute("""
+        SELECT Users.user_id, COALESCE(xp_points, 0), COALESCE(ledger.total, 0)
+        FROM Users
+        LEFT JOIN (SELECT user_id, SUM(amount) AS total FROM XpLedger GROUP BY user_id) ledger ON ledger.user_id = Users.user_id
+        WHERE COALESCE(xp_points, 0) <> COALESCE(ledger.total, 0)
+        ORDER BY Users.user_id
+    """).fetchall()
+
+
+def reconcile(conn, fix=False):
+    """
+    Compares Users.xp_points with the ledger. With fix=True the balances are
+    reset to the ledger totals (the ledger is the source of truth).
+    Returns the drift rows found.
+    """
+    drift = find_drift(conn)
+    if fix and drift:
+        conn.executemany(
+            "UPDATE Users SET xp_points = ? WHERE user_id = ?",
+            [(ledger_total, user_id) for user_id, _, ledger_total in drift]
+        )
+        conn.commit()
+    return drift
+
+
+def compact(conn, older_than_days=DEFAULT_COMPACT_AFTER_DAYS):
+    """
+    Folds every user's ledger entries older than the cutoff into a single
+    'compacted' entry carrying their sum. Balances are unchanged; the folded
+    entries' idempotency keys are forgotten, which is why only old entries
+    are compacted. Returns (entries_removed, users_compacted).
+    """
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        totals = conn.execute("""
+            SELECT user_id, SUM(amount), COUNT(*), MAX(entry_id), MAX(created_at)
+            FROM XpLedger
+            WHERE created_at < ?
+            GROUP BY user_id
+            HAVING COUNT(*) > 1
+        """, (cutoff,)).fetchall()
+        removed = 0
+        for user_id, total, count, last_entry_id, newest in totals:
+            conn.execute("DELETE FROM XpLedger WHERE user_id = ? AND created_at < ?", (user_id, cutoff))
+            conn.execute(
+                """INSERT INTO XpLedger (user_id, amount, reason, source_id, idempotency_key, created_at)
+                   VALUES (?, ?, 'compacted', NULL, ?, ?)""",
+                (user_id, total, f"compacted:{user_id}:{last_entry_id}", newest)
+            )
+            removed += count
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return removed, len(totals)
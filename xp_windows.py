@@ -0,0 +1,87 @@
+"""
+Weekly and monthly leaderboards over rolling windows of XP earned.
+
+Migration 0012 rolls every XpLedger entry up into XpDaily (user, day) and
+adds it to XpWindowTotals for each window in XpWindows whose first_day it
+falls on or after, all from a trigger in the award's transaction. A window
+covers its last `days` days (UTC) including today; roll_windows() moves
+first_day forward and subtracts the XpDaily rows of the days that fell out.
+Each roll costs the XP rows of the expired days, never the whole history,
+and reading a window is an index range on XpWindowTotals whatever the
+number of ledger entries.
+"""
+from datetime import date, datetime, timedelta
+
+from leaderboard import DEFAULT_TOP_N, usernames
+
+WINDOW_LABELS = {'week': 'This Week', 'month': 'This Month'} # Rows of XpWindows
+
+WINDOWS_SQL = "SELECT period, days, first_day FROM XpWindows"
+EXPIRE_SQL = """
+    UPDATE XpWindowTotals SET xp = XpWindowTotals.xp - expired.xp
+    FROM (SELECT user_id, SUM(xp) AS xp FROM XpDaily WHERE day >= ? AND day < ? GROUP BY user_id) AS expired
+    WHERE XpWindowTotals.period = ? AND XpWindowTotals.user_id = expired.user_id
+"""
+WINDOW_TOP_SQL = "SELECT user_id, xp FROM XpWindowTotals WHERE period = ? ORDER BY xp DESC, user_id ASC LIMIT ?"
+WINDOW_RANK_SQL = """
+    SELECT me.xp,
+           (SELECT COUNT(*) FROM XpWindowTotals WHERE period = me.period AND xp > me.xp)
+           + (SELECT COUNT(*) FROM XpWindowTotals WHERE period = me.period AND xp = me.xp AND user_id < me.user_id) + 1
+    FROM XpWindowTotals me WHERE me.period = ? AND me.user_id = ?
+"""
+
+
+def _first_day(days, today):
+    return (today - timedelta(days=days - 1)).isoformat()
+
+
+def stale_windows(db, today=None):
+    """Periods whose first_day is behind `today` (UTC by default), i.e. that roll_windows() would move."""
+    today = today or datetime.utcnow().date()
+    return [period for period, days, first_day in db.execute(WINDOWS_SQL) if first_day < _first_day(days, today)]
+
+
+def roll_windows(conn, today=None):
+    """
+    Moves every window up to `today` in one transaction, subtracting the
+    days that left it. Returns {period: days expired} for the windows moved.
+    """
+    today = today or datetime.utcnow().date()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        rolled = {}
+        # Read inside the write transaction: a concurrent roll has either finished or not started
+        for period, days, first_day in conn.execute(WINDOWS_SQL).fetchall():
+            new_first_day = _first_day(days, today)
+            if first_day >= new_first_day:
+                continue
+            conn.execute(EXPIRE_SQL, (first_day, new_first_day, period))
+            conn.execute("DELETE FROM XpWindowTotals WHERE period = ? AND xp = 0", (period,))
+            conn.execute("UPDATE XpWindows SET first_day = ? WHERE period = ?", (new_first_day, period))
+            rolled[period] = (date.fromisoformat(new_first_day) - date.fromisoformat(first_day)).days
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return rolled
+
+
+def load_window_standings(db, period, user_id, top_n=DEFAULT_TOP_N):
+    """
+    The window's top `top_n` and the user's rank and XP in it (None if they
+    earned nothing in the window), shaped like leaderboard.load_standings().
+    """
+    top = [(rank, row[0], row[1]) for rank, row in enumerate(db.execute(WINDOW_TOP_SQL, (period, top_n)).fetchall(), 1)]
+    mine = db.execute(WINDOW_RANK_SQL, (period, user_id)).fetchone()
+    around = []
+    if mine is not None and mine[1] > top_n:
+        around = [(mine[1], user_id, mine[0])]
+    names = usernames(db, {entry[1] for entry in top + around})
+
+    def to_dict(entry):
+        return {'rank': entry[0], 'user_id': entry[1], 'username': names.get(entry[1]), 'xp_points': entry[2]}
+    return {
+        'top': [to_dict(entry) for entry in top],
+        'rank': mine[1] if mine else None,
+        'around': [to_dict(entry) for entry in around],
+    }